@@ -7,31 +7,51 @@ import json
 import re
 # from .model import PlacementProcedure, BRKGA
 from .model_testing import PlacementProcedure, BRKGA
+from .multi_container import ContainerChoicePlacement
+from .constructive import LAYOUT_FAST_PATH_ENABLED, constructive_layout, fast_path_stats
 
 container_options = {
     "BLIND_VAN": (255, 146, 130),
     "CDE": (350, 160, 160)
 }
 
-def run_layouting_algorithm(shipment_data, selected_container, shipment_id, shipment_num):
-    base_container = selected_container
-    print("[Layouting][Algo] START shipment_id=", shipment_id, "container=", selected_container)
-    try:
-        do_count = len(shipment_data.keys()) if isinstance(shipment_data, dict) else -1
-        total_boxes = sum(sum(v[-1] for v in do_map.values()) for do_map in shipment_data.values()) if isinstance(shipment_data, dict) else -1
-        print("[Layouting][Algo] INPUT DOs=", do_count, "boxes=", total_boxes)
-    except Exception as e:
-        print("[Layouting][Algo] INPUT summary error:", str(e))
+# "sequential": BRKGA pada container awal, lalu ulang pada CDE (1 bin, lalu beberapa bin)
+# "single": satu BRKGA yang sekaligus memilih container dan jumlah bin (lihat multi_container)
+LAYOUTING_MODES = ("sequential", "single")
+MAX_CDE_BINS = 10
+# Parameter BRKGA untuk semua step (juga bagian dari key layout_cache)
+BRKGA_PARAMS = {
+    'num_generations': 20,
+    'num_individuals': 30,
+    'num_elites': 5,
+    'num_mutants': 5,
+    'eliteCProb': 0.8,
+}
 
-    # Mulai menghitung waktu
-    start_time = time.time()
+def run_single_search(inputs, selected_container, seed=None, warm_start=None, deadline=None):
+    """One BRKGA run over container choice, bin count and placement; returns (container, decoder, model)."""
+    containers = [(selected_container, container_options[selected_container], 1)]
+    if selected_container == "BLIND_VAN":
+        containers.append(("CDE", container_options["CDE"], MAX_CDE_BINS))
+    search_inputs = dict(inputs, containers=containers)
 
+    model = BRKGA(search_inputs,
+             **BRKGA_PARAMS,
+             multiProcess=True,
+             seed=seed,
+             decoder_cls=ContainerChoicePlacement,
+             initial_solutions=warm_start
+        )
+    model.fit(patient=10, verbose=False, deadline=deadline)
+    choice = ContainerChoicePlacement(search_inputs, model.solution)
+    return choice.container, choice.placement, model
+
+def shipment_inputs(shipment_data, selected_container):
+    """Decoder inputs: one box per unit of quantity, DOs in reverse shipment_data order."""
     boxes = []
     box_DO_map = []
     sorted_DOs = list(shipment_data.keys())[::-1]
 
-    print("[Layouting][Algo] Sorted DOs:", sorted_DOs)
-
     for do_idx, do in enumerate(sorted_DOs):
         for box_id, dims in shipment_data[do].items():
             length, width, height, quantity = dims
@@ -39,9 +59,7 @@ def run_layouting_algorithm(shipment_data, selected_container, shipment_id, ship
                 boxes.append((length, width, height))
                 box_DO_map.append(do_idx)
 
-    print("[Layouting][Algo] Boxes count:", len(boxes))
-
-    inputs = {
+    return {
         'v': boxes,
         'V': [container_options[selected_container]],
         'box_DO_map': box_DO_map,
@@ -49,17 +67,99 @@ def run_layouting_algorithm(shipment_data, selected_container, shipment_id, ship
         'DOs_num': sorted_DOs
     }
 
+def stage_summary(container, bins, model):
+    """Convergence of one BRKGA run for the anytime response."""
+    return {
+        "container": container,
+        "bins": bins,
+        "generations": model.generations,
+        "stop_reason": model.stop_reason,
+        "min_fitness": [float(f) for f in model.history['min']],
+        "mean_fitness": [float(f) for f in model.history['mean']],
+    }
+
+def run_layouting_algorithm(shipment_data, selected_container, shipment_id, shipment_num, seed=None,
+                            mode="sequential", warm_start=None, time_budget_ms=None, lazy_layout=False):
+    result, _, _ = run_layouting_search(shipment_data, selected_container, shipment_id, shipment_num, seed, mode,
+                                        warm_start, time_budget_ms, lazy_layout)
+    return result
+
+def run_layouting_search(shipment_data, selected_container, shipment_id, shipment_num, seed=None,
+                         mode="sequential", warm_start=None, time_budget_ms=None, lazy_layout=False):
+    """
+    run_layouting_algorithm that also returns the decoder inputs and the best BRKGA keys.
+
+    With time_budget_ms the search is anytime: each BRKGA run stops at its share of
+    the budget, and the result also reports the generations completed and the
+    convergence history of every run.
+
+    A deterministic constructive layout is tried first (see constructive). When it is
+    good enough it is returned without running BRKGA, otherwise it seeds BRKGA.
+
+    With lazy_layout the result's layout is a LayoutBoxes that formats boxes as
+    they are read, for a response streamed straight from the decoder.
+    """
+    base_container = selected_container
+    print("[Layouting][Algo] START shipment_id=", shipment_id, "container=", selected_container, "mode=", mode, "budgetMs=", time_budget_ms)
+    try:
+        do_count = len(shipment_data.keys()) if isinstance(shipment_data, dict) else -1
+        total_boxes = sum(sum(v[-1] for v in do_map.values()) for do_map in shipment_data.values()) if isinstance(shipment_data, dict) else -1
+        print("[Layouting][Algo] INPUT DOs=", do_count, "boxes=", total_boxes)
+    except Exception as e:
+        print("[Layouting][Algo] INPUT summary error:", str(e))
+
+    # Mulai menghitung waktu
+    start_time = time.time()
+    budget_end = None if time_budget_ms is None else time.monotonic() + time_budget_ms / 1000
+    stages = []
+
+    def stage_deadline(stages_left):
+        # Sisa budget dibagi rata ke step yang mungkin masih berjalan
+        if budget_end is None:
+            return None
+        return time.monotonic() + max(0.0, budget_end - time.monotonic()) / stages_left
+
+    inputs = shipment_inputs(shipment_data, selected_container)
+    print("[Layouting][Algo] Sorted DOs:", inputs['DOs_num'])
+    print("[Layouting][Algo] Boxes count:", len(inputs['v']))
+
+    if LAYOUT_FAST_PATH_ENABLED:
+        decoder, constructive_solutions, accepted, stats = constructive_layout(inputs)
+        skipped = fast_path_stats()
+        if accepted:
+            fitness = decoder.evaluate()
+            utilization = decoder.get_utilization()
+            print("[Layouting][Algo] Fast path container=", selected_container, "fitness=", fitness, "util=", f"{utilization*100:.2f}%", "skippedGA=", f"{skipped['skipped']}/{skipped['requests']}")
+            result = format_result(decoder, inputs, shipment_id, shipment_num, fitness, utilization, start_time, base_container, selected_container,
+                                   lazy_layout)
+            return with_convergence(result, stages, time_budget_ms), inputs, constructive_solutions[0]
+        print("[Layouting][Algo] Fast path rejected", stats, "skippedGA=", f"{skipped['skipped']}/{skipped['requests']}")
+        # Layout konstruktif menjadi individu awal BRKGA, setelah warm start (bila ada)
+        warm_start = list(warm_start or []) + constructive_solutions
+
+    if mode == "single":
+        search_start = time.time()
+        selected_container, decoder, model = run_single_search(inputs, selected_container, seed, warm_start,
+                                                               stage_deadline(1))
+        stages.append(stage_summary(selected_container, decoder.num_opend_bins, model))
+        fitness = decoder.evaluate()
+        utilization = decoder.get_utilization()
+        search_ms = (time.time() - search_start) * 1000
+        print("[Layouting][Algo] Single search container=", selected_container, "bins=", decoder.num_opend_bins, "fitness=", fitness, "util=", f"{utilization*100:.2f}%", "durMs=", int(search_ms))
+        result = format_result(decoder, inputs, shipment_id, shipment_num, fitness, utilization, start_time, base_container, selected_container,
+                               lazy_layout)
+        return with_convergence(result, stages, time_budget_ms), inputs, model.solution
+
     # Step 1: Jalankan algoritma untuk container awal
     step1_start = time.time()
     model = BRKGA(inputs, 
-             num_generations=20,
-             num_individuals=30,
-             num_elites=5, 
-             num_mutants=5, 
-             eliteCProb=0.8,
-             multiProcess=True
+             **BRKGA_PARAMS,
+             multiProcess=True,
+             seed=seed,
+             initial_solutions=warm_start
         )
-    model.fit(patient=10, verbose=False)
+    model.fit(patient=10, verbose=False, deadline=stage_deadline(3 if selected_container == "BLIND_VAN" else 1))
+    stages.append(stage_summary(selected_container, len(inputs['V']), model))
     decoder = PlacementProcedure(inputs, model.solution)
     fitness = decoder.evaluate()
     utilization = decoder.get_utilization()  # Dapatkan utilization
@@ -73,15 +173,15 @@ def run_layouting_algorithm(shipment_data, selected_container, shipment_id, ship
         inputs['V'] = [container_options[selected_container]]
         
         step2_start = time.time()
+        # Warm start dari key terbaik step sebelumnya
         model = BRKGA(inputs, 
-                    num_generations=20,
-                    num_individuals=30,
-                    num_elites=5, 
-                    num_mutants=5, 
-                    eliteCProb=0.8,
-                    multiProcess=True
+                    **BRKGA_PARAMS,
+                    multiProcess=True,
+                    seed=seed,
+                    initial_solutions=[model.solution]
              )
-        model.fit(patient=15, verbose=False)
+        model.fit(patient=15, verbose=False, deadline=stage_deadline(2))
+        stages.append(stage_summary(selected_container, len(inputs['V']), model))
         decoder = PlacementProcedure(inputs, model.solution)
         fitness = decoder.evaluate()
         utilization = decoder.get_utilization()  # Update utilization
@@ -90,47 +190,86 @@ def run_layouting_algorithm(shipment_data, selected_container, shipment_id, ship
         
         if math.floor(fitness) > 1:
             required_bins = math.ceil(fitness)
-            if required_bins > 10 or required_bins >= 10000:
-                print("[Layouting][Algo] Capping required bins:", required_bins, "-> 10")
-                required_bins = 10
+            if required_bins > MAX_CDE_BINS or required_bins >= 10000:
+                print("[Layouting][Algo] Capping required bins:", required_bins, "->", MAX_CDE_BINS)
+                required_bins = MAX_CDE_BINS
             inputs['V'] = [container_options[selected_container]] * required_bins
 
             step3_start = time.time()
             model = BRKGA(inputs, 
-                    num_generations=20,
-                    num_individuals=30,
-                    num_elites=5, 
-                    num_mutants=5, 
-                    eliteCProb=0.8,
-                    multiProcess=True
+                    **BRKGA_PARAMS,
+                    multiProcess=True,
+                    seed=seed,
+                    initial_solutions=[model.solution]
                     )
-            model.fit(patient=10, verbose=False)
+            model.fit(patient=10, verbose=False, deadline=stage_deadline(1))
+            stages.append(stage_summary(selected_container, len(inputs['V']), model))
             decoder = PlacementProcedure(inputs, model.solution)
             fitness = decoder.evaluate()
             utilization = decoder.get_utilization()  # Update utilization
             step3_ms = (time.time() - step3_start) * 1000
             print("[Layouting][Algo] Step3 container=", selected_container, "fitness=", fitness, "util=", f"{utilization*100:.2f}%", "durMs=", int(step3_ms))
 
+    result = format_result(decoder, inputs, shipment_id, shipment_num, fitness, utilization, start_time, base_container, selected_container,
+                           lazy_layout)
+    return with_convergence(result, stages, time_budget_ms), inputs, model.solution
+
+def with_convergence(result, stages, time_budget_ms):
+    """Add the anytime fields to a result when the request had a time budget."""
+    if time_budget_ms is None:
+        return result
+    return {
+        **result,
+        "time_budget_ms": time_budget_ms,
+        "generations": sum(stage["generations"] for stage in stages),
+        "history": stages,
+    }
+
+class LayoutBoxes:
+    """
+    Boxes of the opened bins in do_index order (stable, like sorting format_result's
+    dicts by do_priority), each formatted only when read. Supports len(),
+    iteration and slicing, so response_stream can encode it chunk by chunk.
+    """
+
+    def __init__(self, decoder, inputs):
+        self.DOs_num = inputs['DOs_num']
+        self.items = [(i + 1, box_data) for bin in decoder.Bins[:decoder.num_opend_bins]
+                      for i, box_data in enumerate(bin.load_items)]
+        self.items.sort(key=lambda item: item[1][2])
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return (self.box(*item) for item in self.items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.box(*item) for item in self.items[index]]
+        return self.box(*self.items[index])
+
+    def box(self, box_id, box_data):
+        min_corner, max_corner, do_index = box_data
+        return {
+            "do_num": self.DOs_num[do_index],
+            "box_id": box_id,
+            "do_index": int(do_index),
+            "min_corner": [float(coord) for coord in min_corner],
+            "max_corner": [float(coord) for coord in max_corner],
+            "do_priority": do_index
+        }
+
+def format_result(decoder, inputs, shipment_id, shipment_num, fitness, utilization, start_time, base_container, selected_container,
+                  lazy_layout=False):
     # Hitung total waktu eksekusi
     running_time = time.time() - start_time
     print("[Layouting][Algo] DONE totalSec=", f"{running_time:.2f}")
 
-    # Format output
-    output_layout = []
-    for bin in decoder.Bins[:decoder.num_opend_bins]:
-        for i, box_data in enumerate(bin.load_items):
-            min_corner, max_corner, do_index = box_data
-            do_num = inputs['DOs_num'][do_index]
-            output_layout.append({
-                "do_num": do_num,
-                "box_id": i + 1,
-                "do_index": int(do_index),
-                "min_corner": [float(coord) for coord in min_corner],
-                "max_corner": [float(coord) for coord in max_corner],
-                "do_priority": do_index
-            })
-
-    output_layout.sort(key=lambda x: x["do_priority"])
+    # Format output, urut do_priority
+    output_layout = LayoutBoxes(decoder, inputs)
+    if not lazy_layout:
+        output_layout = list(output_layout)
 
     return {
         "shipment_id": shipment_id,
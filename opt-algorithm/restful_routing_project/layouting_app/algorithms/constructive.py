@@ -0,0 +1,102 @@
+"""
+Deterministic constructive layout, tried before BRKGA.
+
+PlacementProcedure already places boxes DO by DO in delivery order, largest volume
+first, each into the deepest EMS of its DO partition. Decoding one fixed chromosome
+therefore gives a deterministic greedy layout: order keys that follow the box index
+(ties keep input order) and one orientation key for every box. Two such layouts are
+built, taking the first orientation that fits (the box as given) or the last one,
+and the better is kept.
+
+The layout is accepted without running BRKGA when it uses one container and
+- its utilization is within LAYOUT_FAST_PATH_MIN_UTILIZATION_RATIO of the best any
+  one-container layout can reach: utilization only counts volume below the height
+  limit, so the bound is min(1, box volume / usable volume);
+- every box rests on at least LAYOUT_FAST_PATH_MIN_SUPPORT of its base area
+  (floor or tops of boxes ending at its bottom face).
+Otherwise the keys of both layouts seed the BRKGA population.
+"""
+
+import threading
+
+import numpy as np
+
+from routing_app.cache_store import env_flag, env_number
+
+from .model_testing import PlacementProcedure
+
+LAYOUT_FAST_PATH_ENABLED = env_flag('LAYOUT_FAST_PATH_ENABLED', True)
+LAYOUT_FAST_PATH_MIN_UTILIZATION_RATIO = env_number('LAYOUT_FAST_PATH_MIN_UTILIZATION_RATIO', 0.98, cast=float)
+LAYOUT_FAST_PATH_MIN_SUPPORT = env_number('LAYOUT_FAST_PATH_MIN_SUPPORT', 0.5, cast=float)
+
+# Kunci orientasi untuk orientasi pertama dan terakhir yang muat (lihat select_box_orientation)
+ORIENTATION_KEYS = (1e-9, 1.0)
+
+_stats = {'requests': 0, 'skipped': 0}
+_stats_lock = threading.Lock()
+
+
+def constructive_chromosome(n_boxes, orientation_key):
+    order_keys = (np.arange(n_boxes) + 0.5) / max(n_boxes, 1)
+    return np.concatenate((order_keys, np.full(n_boxes, orientation_key)))
+
+
+def min_support(bin):
+    """
+    Smallest share of a box's base area that rests on the floor or on boxes below it.
+
+    EMS placement can leave a box hovering a little above the boxes under it; such
+    a box is taken to rest on the highest tops below it, where it would settle.
+    """
+    if not bin.load_items:
+        return 1.0
+    lo = np.array([item[0] for item in bin.load_items], dtype=float)
+    hi = np.array([item[1] for item in bin.load_items], dtype=float)
+    raised = np.flatnonzero(lo[:, 2] > 0)
+    if len(raised) == 0:
+        return 1.0
+    # Overlap di bidang xy antara setiap box terangkat dan semua box di bawahnya
+    dx = np.clip(np.minimum(hi[raised, None, 0], hi[None, :, 0]) - np.maximum(lo[raised, None, 0], lo[None, :, 0]), 0, None)
+    dy = np.clip(np.minimum(hi[raised, None, 1], hi[None, :, 1]) - np.maximum(lo[raised, None, 1], lo[None, :, 1]), 0, None)
+    below = (dx * dy > 0) & (hi[None, :, 2] <= lo[raised, None, 2])
+    rest_z = np.max(np.where(below, hi[None, :, 2], -1.0), axis=1, keepdims=True)
+    supported = np.sum(dx * dy * (below & (hi[None, :, 2] == rest_z)), axis=1)
+    base = (hi[raised, 0] - lo[raised, 0]) * (hi[raised, 1] - lo[raised, 1])
+    return float(np.min(np.minimum(supported / base, 1.0)))
+
+
+def utilization_bound(decoder):
+    """Highest utilization any one-container layout of the decoder's boxes can reach."""
+    return min(1.0, float(np.sum(decoder.tables.volumes)) / decoder.Bins[0].calculate_usable_volume())
+
+
+def constructive_layout(inputs):
+    """
+    Best constructive layout in one container of inputs['V'][0].
+
+    Returns (decoder, solutions, accepted, stats): the decoder of the better layout,
+    the keys of all candidates (better first) and whether it skips BRKGA.
+    """
+    one_bin = dict(inputs, V=list(inputs['V'][:1]))
+    solutions = [constructive_chromosome(len(inputs['v']), key) for key in ORIENTATION_KEYS]
+    decoders = [PlacementProcedure(one_bin, solution) for solution in solutions]
+    best = min(range(len(decoders)), key=lambda i: decoders[i].evaluate())
+    decoder = decoders[best]
+    solutions.insert(0, solutions.pop(best))
+
+    stats = {'fits': not decoder.infisible and decoder.num_opend_bins == 1}
+    if stats['fits']:
+        stats['utilization_ratio'] = decoder.get_utilization() / utilization_bound(decoder)
+        stats['min_support'] = min_support(decoder.Bins[0])
+    accepted = (stats['fits'] and stats['utilization_ratio'] >= LAYOUT_FAST_PATH_MIN_UTILIZATION_RATIO
+                and stats['min_support'] >= LAYOUT_FAST_PATH_MIN_SUPPORT)
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['skipped'] += int(accepted)
+    return decoder, solutions, accepted, stats
+
+
+def fast_path_stats():
+    """Constructive layouts tried and accepted (BRKGA skipped) in this process."""
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,50 @@
+"""
+Per-shipment lookup tables for PlacementProcedure.
+
+Everything here depends only on the decoder inputs, not on the chromosome, so a
+BRKGA run builds the tables once (inputs['decoding_tables']) and every decode of
+that run, including the ones on the fitness pool, reuses them. A decoder given
+inputs without tables builds its own.
+"""
+
+import numpy as np
+
+# Batas awal elimination_rule saat mencari minimum
+ELIMINATION_MAX_VOL = 999999999
+ELIMINATION_MAX_DIM = 9999
+
+
+class DecodingTables():
+    def __init__(self, inputs):
+        boxes = np.asarray(inputs['v']).reshape(-1, 3)
+
+        # Urutan DO asli: posisi nama DO di DOs_num (kemunculan pertama, seperti list.index)
+        first_position = {}
+        for position, name in enumerate(inputs['DOs_num']):
+            first_position.setdefault(name, position)
+        self.DO_rank = np.array([first_position[name] for name in inputs['DOs_num']], dtype=np.int64)
+        self.box_DO_rank = self.DO_rank[np.asarray(inputs['box_DO_map'], dtype=np.int64)]
+
+        self.volumes = np.prod(boxes, axis=1)
+        self.volume_list = self.volumes.tolist()
+
+        # elimination_rule setelah box i melihat box dengan indeks > i, jadi cukup
+        # suffix-minimum volume dan dimensi terkecil; box terakhir tidak punya sisa -> (0, 0)
+        suffix_vol = np.minimum.accumulate(self.volumes[::-1])[::-1]
+        suffix_dim = np.minimum.accumulate(boxes.min(axis=1)[::-1])[::-1]
+        self.remaining_min_vol = np.append(np.minimum(suffix_vol[1:], ELIMINATION_MAX_VOL), 0)
+        self.remaining_min_dim = np.append(np.minimum(suffix_dim[1:], ELIMINATION_MAX_DIM), 0)
+
+    def box_order(self, keys):
+        """Box indices sorted by original DO order, then by random key (stable)."""
+        return np.lexsort((np.asarray(keys[:len(self.box_DO_rank)]), self.box_DO_rank))
+
+    def elimination_limits(self, box_idx):
+        """(min_vol, min_dim) of elimination_rule over the boxes after box_idx."""
+        return self.remaining_min_vol[box_idx], self.remaining_min_dim[box_idx]
+
+
+def decoding_tables(inputs):
+    """The tables attached to ``inputs`` by BRKGA, or new ones."""
+    tables = inputs.get('decoding_tables')
+    return tables if tables is not None else DecodingTables(inputs)
@@ -0,0 +1,87 @@
+"""
+Process pool for BRKGA fitness evaluation.
+
+Decoding a chromosome (PlacementProcedure) is pure Python and dominates a layouting
+run, so BRKGA(multiProcess=True) spreads each population over worker processes.
+The pool is created once per server process and reused by every request. The
+population is split into contiguous chunks, a few per worker, so each task carries
+several chromosomes and results come back in population order. Decoding is
+deterministic, so the fitness list does not depend on the number of workers.
+
+For the same reason BRKGA memoizes fitness per chromosome (chromosome_key), so
+elites carried over and offspring identical to an earlier chromosome are not
+decoded again.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import numpy as np
+
+from routing_app.cache_store import env_number
+
+LAYOUT_FITNESS_WORKERS = env_number('LAYOUT_FITNESS_WORKERS', min(8, os.cpu_count() or 1))
+# More chunks than workers evens out chromosomes that decode slower than others
+LAYOUT_FITNESS_CHUNKS_PER_WORKER = env_number('LAYOUT_FITNESS_CHUNKS_PER_WORKER', 2)
+# Random keys are quantized to this many steps per unit before hashing, so keys that
+# differ only by floating-point noise share a memo entry
+FITNESS_MEMO_STEPS = 2 ** 32
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers):
+    """The process-wide pool, restarted only when the requested size changes."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # Spawned rather than forked: the server process runs threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+            print(f"[Layouting][FitnessPool] Started {workers} workers")
+        return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _pool_workers = None, 0
+
+
+def decode_chunk(decoder_cls, inputs, chunk):
+    return [decoder_cls(inputs, solution).evaluate() for solution in chunk]
+
+
+def chromosome_key(solution):
+    """Memo key of a chromosome: a hash of its quantized random keys."""
+    quantized = np.rint(np.asarray(solution, dtype=float) * FITNESS_MEMO_STEPS).astype(np.int64)
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).digest()
+
+
+def evaluate_population(decoder_cls, inputs, population, workers=None):
+    """Fitness of every chromosome in ``population``, decoded by ``decoder_cls`` over the pool."""
+    workers = LAYOUT_FITNESS_WORKERS if workers is None else workers
+    if workers <= 1 or len(population) <= 1:
+        return decode_chunk(decoder_cls, inputs, population)
+
+    num_chunks = min(len(population), workers * LAYOUT_FITNESS_CHUNKS_PER_WORKER)
+    chunks = np.array_split(np.asarray(population), num_chunks)
+    try:
+        results = get_pool(workers).map(partial(decode_chunk, decoder_cls, inputs), chunks)
+        return [fitness for chunk in results for fitness in chunk]
+    except BrokenProcessPool as e:
+        # A worker died (e.g. out of memory); decode here and start a new pool next time
+        print(f"[Layouting][FitnessPool] Pool broken, decoding serially: {e}")
+        shutdown_pool()
+        return decode_chunk(decoder_cls, inputs, population)
@@ -1,8 +1,12 @@
 import math
 import copy
 import random
+import time
 import numpy as np
 
+from .decoding_tables import DecodingTables, decoding_tables
+from .fitness_pool import chromosome_key, evaluate_population
+
 INFEASIBLE = 100000
 
 def generateInstances(N=20, m=10, V=(100,100,100)):
@@ -32,6 +36,9 @@ class Bin():
         self.dimensions = V
         self.EMSs = [[np.array((0,0,0)), np.array(V)]]
         self.load_items = []  # (min_corner, max_corner, DO_index)
+        # Statistik berjalan, diperbarui di update() agar scoring EMS tidak memindai load_items
+        self.used_volume = 0
+        self.DO_items = {}  # DO_index -> posisi box di load_items
 
         if verbose:
             print('Init EMSs:', self.EMSs)
@@ -46,7 +53,9 @@ class Bin():
         boxToPlace = np.array(box)
         selected_min = np.array(selected_EMS[0])
         ems = [selected_min, selected_min + boxToPlace]
+        self.DO_items.setdefault(current_DO, []).append(len(self.load_items))
         self.load_items.append((ems[0], ems[1], current_DO))
+        self.used_volume += np.prod(ems[1] - ems[0])
 
         if verbose:
             print('------------\n*Place Box*:\nEMS:', list(map(tuple, ems)))
@@ -95,7 +104,7 @@ class Bin():
         return list(map(lambda x: list(map(tuple, x)), self.EMSs))
 
     def load(self):
-        return np.sum([np.product(item[1] - item[0]) for item in self.load_items]) / np.product(self.dimensions)
+        return self.used_volume / np.product(self.dimensions)
 
 class PlacementProcedure():
     def __init__(self, inputs, solution, verbose=False):
@@ -107,6 +116,7 @@ class PlacementProcedure():
 
         # Simpan urutan DO asli dari inputs
         self.original_DO_order = inputs['DOs_num']
+        self.tables = decoding_tables(inputs)
 
         # # Urutkan BPS berdasarkan DO terlebih dahulu, baru random key
         # indices = list(range(len(self.boxes)))
@@ -117,12 +127,7 @@ class PlacementProcedure():
         # Urutkan BPS berdasarkan: 
         # 1. Urutan DO asli (bukan berdasarkan volume)
         # 2. Random key dari solution
-        indices = list(range(len(self.boxes)))
-        indices.sort(key=lambda i: (
-            self.original_DO_order.index(self.DOs_num[self.box_DO_map[i]]),  # Urutan DO asli
-            solution[i]  # Random key
-        ))
-        self.BPS = np.array(indices)
+        self.BPS = self.tables.box_order(solution)
         self.VBO = solution[len(self.boxes):]
 
         self.num_opend_bins = 1
@@ -144,11 +149,11 @@ class PlacementProcedure():
         # sorted_DOs = sorted(do_groups.keys(), 
         #                 key=lambda do: -sum(np.product(self.boxes[i]) for i in do_groups[do]))
         sorted_DOs = sorted(do_groups.keys(), 
-                    key=lambda do: self.original_DO_order.index(self.DOs_num[do]))
+                    key=lambda do: self.tables.DO_rank[do])
         
         for do in sorted_DOs:
             # Urutkan box dalam DO berdasarkan volume (descending)
-            do_boxes = sorted(do_groups[do], key=lambda i: -np.product(self.boxes[i]))
+            do_boxes = sorted(do_groups[do], key=lambda i: -self.tables.volume_list[i])
             
             for box_idx in do_boxes:
                 box = self.boxes[box_idx]
@@ -157,7 +162,7 @@ class PlacementProcedure():
                 # Cari EMS di semua bin yang ada
                 for k in range(self.num_opend_bins):
                     # Prioritaskan bin yang sudah ada box dari DO yang sama
-                    if any(b[2] == do for b in self.Bins[k].load_items):
+                    if do in self.Bins[k].DO_items:
                         EMS = self.find_ems_for_do_cluster(box, k, do)
                         if EMS:
                             BO = self.select_box_orientation(self.VBO[box_idx], box, EMS)
@@ -189,7 +194,14 @@ class PlacementProcedure():
         best_ems = None
         best_score = -1
 
-        for EMS in self.Bins[bin_idx].EMSs:
+        # Volume terpakai dan keberadaan DO sama konstan untuk satu bin, ambil dari statistik berjalan
+        bin = self.Bins[bin_idx]
+        used_vol = bin.used_volume
+        total_vol = np.prod(bin.dimensions)
+        # Beri bonus sedang untuk DO sama, tapi tetap izinkan DO berbeda
+        do_match_score = 0.5 if current_do in bin.DO_items else 0
+
+        for EMS in bin.EMSs:
             for rot in [1, 2, 3, 4, 5, 6]:
                 d, w, h = self.orient(box, rot)
                 if not self.fitin((d, w, h), EMS):
@@ -210,13 +222,8 @@ class PlacementProcedure():
                 #     best_ems = EMS
 
                 # Hitung skor dengan prioritas DO sama tapi tidak eksklusif
-                used_vol = sum(np.prod(b[1]-b[0]) for b in self.Bins[bin_idx].load_items)
-                total_vol = np.prod(self.Bins[bin_idx].dimensions)
                 util_score = (used_vol + d*w*h) / total_vol
 
-                # Beri bonus sedang untuk DO sama, tapi tetap izinkan DO berbeda
-                do_match_score = 0.5 if any(b[2] == current_do for b in self.Bins[bin_idx].load_items) else 0
-                
                 # Prioritas utama ke utilisasi ruang
                 score = 0.7*util_score + 0.3*do_match_score
 
@@ -330,7 +337,7 @@ class PlacementProcedure():
         base_fitness = self.num_opend_bins
         
         # Hitung utilisasi ruang
-        total_used = sum(np.prod(b[1]-b[0]) for bin in self.Bins[:self.num_opend_bins] for b in bin.load_items)
+        total_used = sum(bin.used_volume for bin in self.Bins[:self.num_opend_bins])
         total_available = sum(np.prod(bin.dimensions) for bin in self.Bins[:self.num_opend_bins])
         utilization = total_used / total_available
         
@@ -338,13 +345,23 @@ class PlacementProcedure():
         return base_fitness + (1 - utilization)
 
 class BRKGA():
-    def __init__(self, inputs, num_generations=200, num_individuals=120, num_elites=12, num_mutants=18, eliteCProb=0.7, multiProcess=False):
+    def __init__(self, inputs, num_generations=200, num_individuals=120, num_elites=12, num_mutants=18, eliteCProb=0.7, multiProcess=False, workers=None, seed=None,
+                 decoder_cls=None, initial_solutions=None):
+        # multiProcess decodes populations on the shared process pool with `workers`
+        # processes (default LAYOUT_FITNESS_WORKERS); `seed` makes a run reproducible.
+        # decoder_cls replaces PlacementProcedure (its `extra_genes` follow the 2N box
+        # genes); initial_solutions warm-starts the first population with known keys
+        self.decoder_cls = decoder_cls or PlacementProcedure
+        self.initial_solutions = initial_solutions
         self.multiProcess = multiProcess
+        self.workers = workers
+        self.rng = np.random.default_rng(seed)
         self.inputs = copy.deepcopy(inputs)
+        self.inputs['decoding_tables'] = DecodingTables(self.inputs)
         self.N = len(inputs['v'])
         self.num_generations = num_generations
         self.num_individuals = int(num_individuals)
-        self.num_gene = 2*self.N
+        self.num_gene = 2*self.N + getattr(self.decoder_cls, 'extra_genes', 0)
         self.num_elites = int(num_elites)
         self.num_mutants = int(num_mutants)
         self.eliteCProb = eliteCProb
@@ -352,13 +369,31 @@ class BRKGA():
         self.solution = None
         self.best_fitness = -1
         self.history = {'mean': [], 'min': []}
+        self.generations = 0  # generasi yang selesai pada fit terakhir
+        self.stop_reason = None  # 'generations', 'patience' atau 'time_budget'
+        self.fitness_memo = {}  # chromosome_key -> fitness
+        self.memo_hits = 0
 
     def decoder(self, solution):
-        placement = PlacementProcedure(self.inputs, solution)
+        placement = self.decoder_cls(self.inputs, solution)
         return placement.evaluate()
 
     def cal_fitness(self, population):
-        return [self.decoder(solution) for solution in population]
+        # Decode hanya chromosome yang belum pernah dievaluasi (elite, anak yang identik)
+        keys = [chromosome_key(solution) for solution in population]
+        new = {}
+        for index, key in enumerate(keys):
+            if key not in self.fitness_memo and key not in new:
+                new[key] = index
+        if new:
+            chromosomes = np.asarray(population)[list(new.values())]
+            if self.multiProcess:
+                fitness_list = evaluate_population(self.decoder_cls, self.inputs, chromosomes, self.workers)
+            else:
+                fitness_list = [self.decoder(solution) for solution in chromosomes]
+            self.fitness_memo.update(zip(new, fitness_list))
+        self.memo_hits += len(keys) - len(new)
+        return [self.fitness_memo[key] for key in keys]
 
     def partition(self, population, fitness_list):
         sorted_indexes = np.argsort(fitness_list)
@@ -369,17 +404,35 @@ class BRKGA():
         return (population[elite_indexes].copy(), population[non_elite_indexes].copy(), [fitness_list[i] for i in elite_indexes])
 
     def crossover(self, elite, non_elite):
-        return [elite[gene] if np.random.uniform(0, 1) < self.eliteCProb else non_elite[gene] for gene in range(self.num_gene)]
+        # Biased crossover untuk satu pasangan atau satu baris per pasangan sekaligus
+        inherit = self.rng.uniform(0, 1, np.shape(elite)) < self.eliteCProb
+        return np.where(inherit, elite, non_elite)
 
     def mating(self, elites, non_elites):
-        num_offspring = self.num_individuals - self.num_elites - self.num_mutants
-        return [self.crossover(random.choice(elites), random.choice(non_elites)) for _ in range(num_offspring)]
+        num_offspring = max(0, self.num_individuals - self.num_elites - self.num_mutants)
+        elite_parents = elites[self.rng.integers(len(elites), size=num_offspring)]
+        non_elite_parents = non_elites[self.rng.integers(len(non_elites), size=num_offspring)]
+        return self.crossover(elite_parents, non_elite_parents)
 
     def mutants(self):
-        return np.random.uniform(0, 1, size=(self.num_mutants, self.num_gene))
-
-    def fit(self, patient=4, verbose=False):
-        population = np.random.uniform(0,1,(self.num_individuals, self.num_gene))
+        return self.rng.uniform(0, 1, size=(self.num_mutants, self.num_gene))
+
+    def warm_start(self, population):
+        """Replace the first rows of the initial population with initial_solutions."""
+        if self.initial_solutions is None or len(self.initial_solutions) == 0:
+            return population
+        for row, solution in enumerate(self.initial_solutions[:len(population)]):
+            # Keys dari run lain bisa lebih pendek/panjang (mis. tanpa gen container); sisanya tetap acak
+            solution = np.clip(np.asarray(solution, dtype=float)[:self.num_gene], 0, 1)
+            population[row, :len(solution)] = solution
+        return population
+
+    def fit(self, patient=4, verbose=False, deadline=None):
+        # deadline (time.monotonic()) membuat fit anytime: generasi baru hanya dimulai bila
+        # diperkirakan (dari durasi generasi sebelumnya) selesai sebelum deadline. Populasi
+        # awal selalu dievaluasi, jadi selalu ada solusi.
+        population = self.rng.uniform(0,1,(self.num_individuals, self.num_gene))
+        population = self.warm_start(population)
         fitness_list = self.cal_fitness(population)
 
         best_fitness = np.min(fitness_list)
@@ -388,15 +441,25 @@ class BRKGA():
         self.history['mean'].append(np.mean(fitness_list))
 
         best_iter = 0
+        self.generations = 0
+        self.stop_reason = 'generations'
+        generation_time = 0
         for g in range(self.num_generations):
             if g - best_iter > patient:
                 self.used_bins = math.floor(best_fitness)
                 self.best_fitness = best_fitness
                 self.solution = best_solution
+                self.stop_reason = 'patience'
                 if verbose:
                     print('Early stop at iter', g)
                 return 'feasible'
+            if deadline is not None and time.monotonic() + generation_time > deadline:
+                self.stop_reason = 'time_budget'
+                if verbose:
+                    print('Time budget reached at iter', g)
+                break
 
+            generation_start = time.monotonic()
             elites, non_elites, elite_fitness_list = self.partition(population, fitness_list)
             offsprings = self.mating(elites, non_elites)
             mutants = self.mutants()
@@ -415,6 +478,8 @@ class BRKGA():
 
             self.history['min'].append(np.min(fitness_list))
             self.history['mean'].append(np.mean(fitness_list))
+            self.generations = g + 1
+            generation_time = time.monotonic() - generation_start
 
             if verbose:
                 print("Generation:", g, "(Best Fitness:", best_fitness,")")
@@ -1,8 +1,12 @@
 import math
 import copy
 import random
+import time
 import numpy as np
 
+from .decoding_tables import DecodingTables, decoding_tables
+from .fitness_pool import chromosome_key, evaluate_population
+
 INFEASIBLE = 100000
 
 def generateInstances(N=20, m=10, V=(100,100,100)):
@@ -27,39 +31,124 @@ def generateInputs(N, m, V):
     inputs = {'v': list(zip(p, q, r)), 'V': list(zip(L, W, H))}
     return inputs
 
+ORIENTATIONS = ((0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0))  # BO 1..6, see orient
+
+class EMSStore():
+    """
+    Empty maximal spaces of a bin as rows (x1, y1, z1, x2, y2, z2) of one contiguous array.
+
+    Rows are removed by moving the last row into the gap, so row order is not
+    insertion order. `seq` keeps the insertion number of each row, because EMS
+    selection breaks ties by taking the oldest EMS.
+    """
+    def __init__(self, capacity=32):
+        self.rows = np.empty((capacity, 6))
+        self.seq = np.empty(capacity, dtype=np.int64)
+        self.n = 0
+        self.next_seq = 0
+
+    def __len__(self):
+        return self.n
+
+    def append(self, lo, hi):
+        if self.n == len(self.rows):
+            self.rows = np.concatenate((self.rows, np.empty_like(self.rows)))
+            self.seq = np.concatenate((self.seq, np.empty_like(self.seq)))
+        self.rows[self.n, :3] = lo
+        self.rows[self.n, 3:] = hi
+        self.seq[self.n] = self.next_seq
+        self.next_seq += 1
+        self.n += 1
+
+    def remove(self, index):
+        last = self.n - 1
+        if index != last:
+            self.rows[index] = self.rows[last]
+            self.seq[index] = self.seq[last]
+        self.n = last
+
+    def active(self):
+        return self.rows[:self.n]
+
+    def order(self):
+        """Row indices in insertion order."""
+        return np.argsort(self.seq[:self.n], kind='stable')
+
+    def overlapping(self, lo, hi):
+        rows = self.active()
+        return np.all(hi > rows[:, :3], axis=1) & np.all(lo < rows[:, 3:], axis=1)
+
+    def containing(self, lo, hi):
+        rows = self.active()
+        return np.all(rows[:, :3] <= lo, axis=1) & np.all(hi <= rows[:, 3:], axis=1)
+
+    def fitting(self, box):
+        """Rows the box fits in with at least one orientation."""
+        rows = self.active()
+        sizes = rows[:, 3:] - rows[:, :3]
+        oriented = np.asarray(box)[list(ORIENTATIONS)]
+        return np.any(np.all(oriented[None, :, :] <= sizes[:, None, :], axis=2), axis=1)
+
+class LoadedBoxIndex():
+    """
+    Loaded boxes of one DO as rows (x1, y1, z1, x2, y2, z2), kept sorted by x1.
+
+    A box inside an EMS has its x1 within the EMS's x range, so a containment query
+    binary-searches that range and only checks the boxes in it.
+    """
+    def __init__(self):
+        self.x = np.empty(0)
+        self.rows = np.empty((0, 6))
+
+    def __len__(self):
+        return len(self.x)
+
+    def add(self, lo, hi):
+        index = np.searchsorted(self.x, lo[0], side='right')
+        self.x = np.insert(self.x, index, lo[0])
+        self.rows = np.insert(self.rows, index, np.concatenate((lo, hi)), axis=0)
+
+    def any_inside(self, lo, hi):
+        """Whether any box lies completely inside the space lo..hi."""
+        start, stop = np.searchsorted(self.x, lo[0], side='left'), np.searchsorted(self.x, hi[0], side='right')
+        if start == stop:
+            return False
+        rows = self.rows[start:stop]
+        return bool(np.any(np.all(lo <= rows[:, :3], axis=1) & np.all(rows[:, 3:] <= hi, axis=1)))
+
 class Bin():
     def __init__(self, V, verbose=False):
         self.dimensions = V
         self.max_height = V[2] / 2  # Tambahkan batas tinggi maksimal (setengah tinggi container)
-        self.EMSs = [[np.array((0,0,0)), np.array(V)]]
+        self.ems_store = EMSStore()
+        self.ems_store.append((0, 0, 0), V)
         self.load_items = []  # (min_corner, max_corner, DO_index)
+        # Statistik berjalan, diperbarui di update() agar pemilihan EMS tidak memindai load_items
+        self.used_volume = 0
+        self.used_volume_in_height = 0  # seperti calculate_used_volume
+        self.DO_boxes = {}  # DO_index -> LoadedBoxIndex
         
         if verbose:
             print('Init EMSs:', self.EMSs)
 
-    def calculate_usable_volume(self):
-        """Hitung volume yang bisa digunakan (dalam batas tinggi)"""
-        usable_height = self.max_height
-        return self.dimensions[0] * self.dimensions[1] * usable_height
+    @property
+    def EMSs(self):
+        """EMSs as [min_corner, max_corner] pairs in insertion order."""
+        rows = self.ems_store.active()[self.ems_store.order()]
+        return [[row[:3], row[3:]] for row in rows]
 
-    def calculate_used_volume(self):
-        """Hitung volume yang sudah terisi (dalam batas tinggi)"""
-        used = 0
-        for item in self.load_items:
-            min_c, max_c = item[0], item[1]
-            if max_c[2] <= self.max_height:
-                used += np.prod(max_c - min_c)
-            elif min_c[2] < self.max_height:
-                # Hitung partial volume jika box melewati batas
-                adjusted_max = np.array([max_c[0], max_c[1], self.max_height])
-                used += np.prod(adjusted_max - min_c)
-        return used
+    def fitting_EMSs(self, box):
+        """EMSs the box fits in with at least one orientation, in insertion order."""
+        store = self.ems_store
+        order = store.order()
+        rows = store.active()[order][store.fitting(box)[order]]
+        return [[row[:3], row[3:]] for row in rows]
 
     def __getitem__(self, index):
         return self.EMSs[index]
 
     def __len__(self):
-        return len(self.EMSs)
+        return len(self.ems_store)
 
     def update(self, box, selected_EMS, min_vol=1, min_dim=1, current_DO=None, verbose=False):
         boxToPlace = np.array(box)
@@ -77,41 +166,54 @@ class Bin():
         ems = [selected_min, selected_min + boxToPlace]
         
         self.load_items.append((ems[0], ems[1], current_DO))
+        self.add_to_statistics(ems[0], ems[1], current_DO)
 
         if verbose:
             print('------------\n*Place Box*:\nEMS:', list(map(tuple, ems)))
 
-        for EMS in self.EMSs.copy():
-            if self.overlapped(ems, EMS):
-                self.eliminate(EMS)
-                
-                x1, y1, z1 = EMS[0]; x2, y2, z2 = EMS[1]
-                x3, y3, z3 = ems[0]; x4, y4, z4 = ems[1]
-                new_EMSs = [
-                    [np.array((x4, y1, z1)), np.array((x2, y2, z2))],
-                    [np.array((x1, y4, z1)), np.array((x2, y2, z2))],
-                    [np.array((x1, y1, z4)), np.array((x2, y2, z2))]
-                ]
-
-                for new_EMS in new_EMSs:
-                    new_box = new_EMS[1] - new_EMS[0]
-                    isValid = True
-
-                    for other_EMS in self.EMSs:
-                        if self.inscribed(new_EMS, other_EMS):
-                            isValid = False
-                    if np.min(new_box) < min_dim:
-                        isValid = False
-                    if np.product(new_box) < min_vol:
-                        isValid = False
-                    # Tambahkan pengecekan tinggi maksimal untuk EMS baru
-                    if new_EMS[0][2] >= self.max_height:
-                        isValid = False
-
-                    if isValid:
-                        self.EMSs.append(new_EMS)
+        # Split every overlapped EMS, oldest first. An overlapped EMS is gone before its
+        # new EMSs are checked for inscription, the ones not split yet still count.
+        store = self.ems_store
+        overlapped = np.flatnonzero(store.overlapping(ems[0], ems[1]))
+        overlapped = overlapped[np.argsort(store.seq[overlapped], kind='stable')]
+        alive = np.ones(store.n, dtype=bool)
+        x3, y3, z3 = ems[0]; x4, y4, z4 = ems[1]
+        for index in overlapped:
+            alive[index] = False
+            x1, y1, z1, x2, y2, z2 = store.rows[index]
+            for new_min in ((x4, y1, z1), (x1, y4, z1), (x1, y1, z4)):
+                new_box = (x2 - new_min[0], y2 - new_min[1], z2 - new_min[2])
+                if min(new_box) < min_dim or new_box[0] * new_box[1] * new_box[2] < min_vol:
+                    continue
+                # Tambahkan pengecekan tinggi maksimal untuk EMS baru
+                if new_min[2] >= self.max_height:
+                    continue
+                if np.any(store.containing(new_min, (x2, y2, z2)) & alive[:store.n]):
+                    continue
+                store.append(new_min, (x2, y2, z2))
+                alive = np.append(alive, True)
+
+        for index in np.sort(overlapped)[::-1]:
+            store.remove(index)
         
         return True  # Return True jika berhasil ditempatkan
+
+    def add_to_statistics(self, min_c, max_c, DO):
+        self.used_volume += np.prod(max_c - min_c)
+        if max_c[2] <= self.max_height:
+            self.used_volume_in_height += np.prod(max_c - min_c)
+        elif min_c[2] < self.max_height:
+            # Hitung partial volume jika box melewati batas
+            adjusted_max = np.array([max_c[0], max_c[1], self.max_height])
+            self.used_volume_in_height += np.prod(adjusted_max - min_c)
+        if DO not in self.DO_boxes:
+            self.DO_boxes[DO] = LoadedBoxIndex()
+        self.DO_boxes[DO].add(min_c, max_c)
+
+    def has_DO_box_inside(self, DO, ems_min, ems_max):
+        """Whether a loaded box of this DO lies completely inside the EMS."""
+        index = self.DO_boxes.get(DO)
+        return index is not None and index.any_inside(ems_min, ems_max)
     
     def calculate_usable_volume(self):
         """Hitung volume yang bisa digunakan (dalam batas tinggi)"""
@@ -120,16 +222,7 @@ class Bin():
 
     def calculate_used_volume(self):
         """Hitung volume yang sudah terisi (dalam batas tinggi)"""
-        used = 0
-        for item in self.load_items:
-            min_c, max_c = item[0], item[1]
-            if max_c[2] <= self.max_height:
-                used += np.prod(max_c - min_c)
-            elif min_c[2] < self.max_height:
-                # Hitung partial volume jika box melewati batas
-                adjusted_max = np.array([max_c[0], max_c[1], self.max_height])
-                used += np.prod(adjusted_max - min_c)
-        return used
+        return self.used_volume_in_height
 
     def overlapped(self, ems, EMS):
         return np.all(ems[1] > EMS[0]) and np.all(ems[0] < EMS[1])
@@ -138,17 +231,15 @@ class Bin():
         return np.all(EMS[0] <= ems[0]) and np.all(ems[1] <= EMS[1])
 
     def eliminate(self, ems):
-        ems = list(map(tuple, ems))
-        for index, EMS in enumerate(self.EMSs):
-            if ems == list(map(tuple, EMS)):
-                self.EMSs.pop(index)
-                return
+        matches = np.flatnonzero(np.all(self.ems_store.active() == np.concatenate(ems), axis=1))
+        if len(matches):
+            self.ems_store.remove(matches[np.argmin(self.ems_store.seq[matches])])
 
     def get_EMSs(self):
         return list(map(lambda x: list(map(tuple, x)), self.EMSs))
 
     def load(self):
-        return np.sum([np.product(item[1] - item[0]) for item in self.load_items]) / np.product(self.dimensions)
+        return self.used_volume / np.product(self.dimensions)
 
 class PlacementProcedure():
     def __init__(self, inputs, solution, verbose=False):
@@ -158,6 +249,7 @@ class PlacementProcedure():
         self.DO_count = inputs['DO_count']
         self.DOs_num = inputs['DOs_num']
         self.original_DO_order = inputs['DOs_num']
+        self.tables = decoding_tables(inputs)
 
         # Tambahkan variabel untuk partisi DO
         self.DO_partitions = {}  # {do_index: (start_x, end_x)}
@@ -165,12 +257,7 @@ class PlacementProcedure():
         self.partition_width = 0.2  # 20% lebar container untuk partisi awal
 
         # Urutkan berdasarkan: 1. Urutan DO asli 2. Random key
-        indices = list(range(len(self.boxes)))
-        indices.sort(key=lambda i: (
-            self.original_DO_order.index(self.DOs_num[self.box_DO_map[i]]),
-            solution[i]
-        ))
-        self.BPS = np.array(indices)
+        self.BPS = self.tables.box_order(solution)
         self.VBO = solution[len(self.boxes):]
 
         self.num_opend_bins = 1
@@ -190,11 +277,12 @@ class PlacementProcedure():
         
         # Urutkan DO berdasarkan urutan pengiriman asli
         sorted_DOs = sorted(do_groups.keys(), 
-                          key=lambda do: self.original_DO_order.index(self.DOs_num[do]))
+                          key=lambda do: self.tables.DO_rank[do])
         
         # Hitung total volume per DO untuk menentukan alokasi partisi
-        total_volume = sum(np.product(b) for b in self.boxes)
-        do_volumes = {do: sum(np.product(self.boxes[i]) for i in do_groups[do]) 
+        volumes = self.tables.volume_list
+        total_volume = sum(volumes)
+        do_volumes = {do: sum(volumes[i] for i in do_groups[do]) 
                       for do in do_groups.keys()}
         
         # Buat partisi untuk setiap DO berdasarkan proporsi volume
@@ -208,7 +296,7 @@ class PlacementProcedure():
         
         # Lakukan penempatan untuk setiap DO dalam partisinya
         for do in sorted_DOs:
-            do_boxes = sorted(do_groups[do], key=lambda i: -np.product(self.boxes[i]))
+            do_boxes = sorted(do_groups[do], key=lambda i: -volumes[i])
             start_x, end_x = self.DO_partitions[do]
             
             for box_idx in do_boxes:
@@ -220,7 +308,7 @@ class PlacementProcedure():
                     EMS = self.find_EMS_in_partition(box, k, do, start_x, end_x)
                     if EMS:
                         BO = self.select_box_orientation(self.VBO[box_idx], box, EMS)
-                        min_vol, min_dim = self.elimination_rule([self.boxes[i] for i in self.BPS[self.BPS > box_idx]])
+                        min_vol, min_dim = self.tables.elimination_limits(box_idx)
                         success = self.Bins[k].update(self.orient(box, BO), EMS, min_vol, min_dim, do)
                         if success:
                             placed = True
@@ -232,7 +320,7 @@ class PlacementProcedure():
                         EMS = self.DFTRC_2_with_priority(box, k, do)
                         if EMS:
                             BO = self.select_box_orientation(self.VBO[box_idx], box, EMS)
-                            min_vol, min_dim = self.elimination_rule([self.boxes[i] for i in self.BPS[self.BPS > box_idx]])
+                            min_vol, min_dim = self.tables.elimination_limits(box_idx)
                             success = self.Bins[k].update(self.orient(box, BO), EMS, min_vol, min_dim, do)
                             if success:
                                 placed = True
@@ -246,7 +334,7 @@ class PlacementProcedure():
                         return
                     EMS = self.Bins[self.num_opend_bins-1].EMSs[0]
                     BO = self.select_box_orientation(self.VBO[box_idx], box, EMS)
-                    min_vol, min_dim = self.elimination_rule([self.boxes[i] for i in self.BPS[self.BPS > box_idx]])
+                    min_vol, min_dim = self.tables.elimination_limits(box_idx)
                     self.Bins[self.num_opend_bins-1].update(self.orient(box, BO), EMS, min_vol, min_dim, do)
 
     def find_EMS_in_partition(self, box, bin_idx, do, start_x, end_x):
@@ -254,7 +342,7 @@ class PlacementProcedure():
         best_EMS = None
         max_distance = -1
         
-        for EMS in self.Bins[bin_idx].EMSs:
+        for EMS in self.Bins[bin_idx].fitting_EMSs(box):
             ems_min, ems_max = EMS
             
             # Pastikan EMS berada dalam partisi DO ini
@@ -265,19 +353,14 @@ class PlacementProcedure():
             distance = (self.Bins[bin_idx].dimensions[0] - ems_min[0])**2
             
             # Prioritaskan EMS dengan DO yang sama
-            ems_boxes = [b for b in self.Bins[bin_idx].load_items 
-                         if self.is_inside(b[0], b[1], ems_min, ems_max)]
-            same_do = any(b[2] == do for b in ems_boxes)
+            same_do = self.Bins[bin_idx].has_DO_box_inside(do, ems_min, ems_max)
             
             if same_do:
                 distance *= 2  # Beri bonus untuk EMS dengan DO sama
                 
             if distance > max_distance:
-                for direction in [1,2,3,4,5,6]:
-                    if self.fitin(self.orient(box, direction), EMS):
-                        best_EMS = EMS
-                        max_distance = distance
-                        break
+                best_EMS = EMS
+                max_distance = distance
                         
         return best_EMS
 
@@ -286,26 +369,21 @@ class PlacementProcedure():
         best_EMS = None
         max_distance = -1
         
-        for EMS in self.Bins[bin_idx].EMSs:
+        for EMS in self.Bins[bin_idx].fitting_EMSs(box):
             ems_min, ems_max = EMS
             
             # Hitung jarak ke dinding belakang (DFTRC original)
             distance = (self.Bins[bin_idx].dimensions[0] - ems_min[0])**2
             
             # Prioritaskan EMS dengan DO yang sama
-            ems_boxes = [b for b in self.Bins[bin_idx].load_items 
-                         if self.is_inside(b[0], b[1], ems_min, ems_max)]
-            same_do = any(b[2] == current_DO for b in ems_boxes)
+            same_do = self.Bins[bin_idx].has_DO_box_inside(current_DO, ems_min, ems_max)
             
             if same_do:
                 distance *= 2  # Beri bonus untuk EMS dengan DO sama
                 
             if distance > max_distance:
-                for direction in [1,2,3,4,5,6]:
-                    if self.fitin(self.orient(box, direction), EMS):
-                        best_EMS = EMS
-                        max_distance = distance
-                        break
+                best_EMS = EMS
+                max_distance = distance
                         
         return best_EMS
 
@@ -402,13 +480,23 @@ class PlacementProcedure():
     
 
 class BRKGA():
-    def __init__(self, inputs, num_generations=200, num_individuals=120, num_elites=12, num_mutants=18, eliteCProb=0.7, multiProcess=False):
+    def __init__(self, inputs, num_generations=200, num_individuals=120, num_elites=12, num_mutants=18, eliteCProb=0.7, multiProcess=False, workers=None, seed=None,
+                 decoder_cls=None, initial_solutions=None):
+        # multiProcess decodes populations on the shared process pool with `workers`
+        # processes (default LAYOUT_FITNESS_WORKERS); `seed` makes a run reproducible.
+        # decoder_cls replaces PlacementProcedure (its `extra_genes` follow the 2N box
+        # genes); initial_solutions warm-starts the first population with known keys
+        self.decoder_cls = decoder_cls or PlacementProcedure
+        self.initial_solutions = initial_solutions
         self.multiProcess = multiProcess
+        self.workers = workers
+        self.rng = np.random.default_rng(seed)
         self.inputs = copy.deepcopy(inputs)
+        self.inputs['decoding_tables'] = DecodingTables(self.inputs)
         self.N = len(inputs['v'])
         self.num_generations = num_generations
         self.num_individuals = int(num_individuals)
-        self.num_gene = 2*self.N
+        self.num_gene = 2*self.N + getattr(self.decoder_cls, 'extra_genes', 0)
         self.num_elites = int(num_elites)
         self.num_mutants = int(num_mutants)
         self.eliteCProb = eliteCProb
@@ -416,13 +504,31 @@ class BRKGA():
         self.solution = None
         self.best_fitness = -1
         self.history = {'mean': [], 'min': []}
+        self.generations = 0  # generasi yang selesai pada fit terakhir
+        self.stop_reason = None  # 'generations', 'patience' atau 'time_budget'
+        self.fitness_memo = {}  # chromosome_key -> fitness
+        self.memo_hits = 0
 
     def decoder(self, solution):
-        placement = PlacementProcedure(self.inputs, solution)
+        placement = self.decoder_cls(self.inputs, solution)
         return placement.evaluate()
 
     def cal_fitness(self, population):
-        return [self.decoder(solution) for solution in population]
+        # Decode hanya chromosome yang belum pernah dievaluasi (elite, anak yang identik)
+        keys = [chromosome_key(solution) for solution in population]
+        new = {}
+        for index, key in enumerate(keys):
+            if key not in self.fitness_memo and key not in new:
+                new[key] = index
+        if new:
+            chromosomes = np.asarray(population)[list(new.values())]
+            if self.multiProcess:
+                fitness_list = evaluate_population(self.decoder_cls, self.inputs, chromosomes, self.workers)
+            else:
+                fitness_list = [self.decoder(solution) for solution in chromosomes]
+            self.fitness_memo.update(zip(new, fitness_list))
+        self.memo_hits += len(keys) - len(new)
+        return [self.fitness_memo[key] for key in keys]
 
     def partition(self, population, fitness_list):
         sorted_indexes = np.argsort(fitness_list)
@@ -433,21 +539,39 @@ class BRKGA():
         return (population[elite_indexes].copy(), population[non_elite_indexes].copy(), [fitness_list[i] for i in elite_indexes])
 
     def crossover(self, elite, non_elite):
-        return [elite[gene] if np.random.uniform(0, 1) < self.eliteCProb else non_elite[gene] for gene in range(self.num_gene)]
+        # Biased crossover untuk satu pasangan atau satu baris per pasangan sekaligus
+        inherit = self.rng.uniform(0, 1, np.shape(elite)) < self.eliteCProb
+        return np.where(inherit, elite, non_elite)
 
     def mating(self, elites, non_elites):
-        num_offspring = self.num_individuals - self.num_elites - self.num_mutants
-        return [self.crossover(random.choice(elites), random.choice(non_elites)) for _ in range(num_offspring)]
+        num_offspring = max(0, self.num_individuals - self.num_elites - self.num_mutants)
+        elite_parents = elites[self.rng.integers(len(elites), size=num_offspring)]
+        non_elite_parents = non_elites[self.rng.integers(len(non_elites), size=num_offspring)]
+        return self.crossover(elite_parents, non_elite_parents)
 
     def mutants(self):
-        return np.random.uniform(0, 1, size=(self.num_mutants, self.num_gene))
-
-    def fit(self, patient=4, verbose=False):
+        return self.rng.uniform(0, 1, size=(self.num_mutants, self.num_gene))
+
+    def warm_start(self, population):
+        """Replace the first rows of the initial population with initial_solutions."""
+        if self.initial_solutions is None or len(self.initial_solutions) == 0:
+            return population
+        for row, solution in enumerate(self.initial_solutions[:len(population)]):
+            # Keys dari run lain bisa lebih pendek/panjang (mis. tanpa gen container); sisanya tetap acak
+            solution = np.clip(np.asarray(solution, dtype=float)[:self.num_gene], 0, 1)
+            population[row, :len(solution)] = solution
+        return population
+
+    def fit(self, patient=4, verbose=False, deadline=None):
+        # deadline (time.monotonic()) membuat fit anytime: generasi baru hanya dimulai bila
+        # diperkirakan (dari durasi generasi sebelumnya) selesai sebelum deadline. Populasi
+        # awal selalu dievaluasi, jadi selalu ada solusi.
         # Adaptasi parameter berdasarkan jumlah box
         adaptive_individuals = min(30, max(10, int(self.N/3)))  # 10-30 individu
         adaptive_generations = min(30, max(10, int(self.N/5)))  # 10-30 generasi
         
-        population = np.random.uniform(0,1,(adaptive_individuals, self.num_gene))
+        population = self.rng.uniform(0,1,(adaptive_individuals, self.num_gene))
+        population = self.warm_start(population)
         fitness_list = self.cal_fitness(population)
 
         best_fitness = np.min(fitness_list)
@@ -456,15 +580,25 @@ class BRKGA():
         self.history['mean'].append(np.mean(fitness_list))
 
         best_iter = 0
+        self.generations = 0
+        self.stop_reason = 'generations'
+        generation_time = 0
         for g in range(self.num_generations):
             if g - best_iter > patient:
                 self.used_bins = math.floor(best_fitness)
                 self.best_fitness = best_fitness
                 self.solution = best_solution
+                self.stop_reason = 'patience'
                 if verbose:
                     print('Early stop at iter', g)
                 return 'feasible'
+            if deadline is not None and time.monotonic() + generation_time > deadline:
+                self.stop_reason = 'time_budget'
+                if verbose:
+                    print('Time budget reached at iter', g)
+                break
 
+            generation_start = time.monotonic()
             elites, non_elites, elite_fitness_list = self.partition(population, fitness_list)
             offsprings = self.mating(elites, non_elites)
             mutants = self.mutants()
@@ -483,6 +617,8 @@ class BRKGA():
 
             self.history['min'].append(np.min(fitness_list))
             self.history['mean'].append(np.mean(fitness_list))
+            self.generations = g + 1
+            generation_time = time.monotonic() - generation_start
 
             if verbose:
                 print("Generation:", g, "(Best Fitness:", best_fitness,")")
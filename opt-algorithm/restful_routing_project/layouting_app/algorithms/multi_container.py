@@ -0,0 +1,36 @@
+"""
+Decoder for single-search layouting: one BRKGA run chooses the container too.
+
+The sequential mode runs BRKGA on BLIND_VAN, reruns it on one CDE when the shipment
+does not fit, then on several CDEs. Here the chromosome has one extra gene after
+the 2N box genes that picks an entry of inputs['containers'], a list of
+(container name, dimensions, max bins) in order of preference. Bins are opened
+by PlacementProcedure as boxes need them, up to max bins, so the bin count comes
+out of the decode.
+
+The search fitness adds the position of the container in the list to the
+PlacementProcedure fitness. A feasible layout in an earlier container
+(fitness < 2 in one bin) therefore always ranks before any layout in a later
+one, which is the order the sequential mode falls back in. Multi-bin CDE
+layouts (10 per bin) and infeasible ones still rank after every single-bin layout.
+"""
+
+from .model_testing import PlacementProcedure
+
+
+class ContainerChoicePlacement():
+    extra_genes = 1
+
+    def __init__(self, inputs, solution, verbose=False):
+        containers = inputs['containers']
+        choice = min(int(solution[-1] * len(containers)), len(containers) - 1)
+        self.container_rank = choice
+        self.container, dimensions, max_bins = containers[choice]
+        self.placement = PlacementProcedure({**inputs, 'V': [dimensions] * max_bins}, solution[:-1], verbose)
+
+    def layout_fitness(self):
+        """Fitness of the layout itself, as the sequential mode reports it."""
+        return self.placement.evaluate()
+
+    def evaluate(self):
+        return self.layout_fitness() + self.container_rank
@@ -0,0 +1,93 @@
+"""
+Benchmark BRKGA per-generation overhead: crossover, mutants and fitness memo lookups.
+Run this from the project root: python -m layouting_app.benchmarks.bench_brkga_operators [--individuals 120] [--genes 2000]
+
+Compares the per-gene Python crossover and mating loop with the population-level
+operators in model_testing.BRKGA, timing everything a generation does besides
+decoding. A short seeded run on a small shipment then reports how many fitness
+evaluations the memo answered without decoding.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from layouting_app.algorithms.fitness_pool import chromosome_key
+from layouting_app.algorithms.model_testing import BRKGA
+from layouting_app.benchmarks.bench_decode import decoder_inputs
+from layouting_app.benchmarks.bench_fitness_pool import random_shipment
+
+
+def legacy_generation(model, elites, non_elites):
+    """Offspring and mutants as BRKGA built them before, one uniform draw per gene."""
+    def crossover(elite, non_elite):
+        return [elite[gene] if model.rng.uniform(0, 1) < model.eliteCProb else non_elite[gene]
+                for gene in range(model.num_gene)]
+
+    num_offspring = model.num_individuals - model.num_elites - model.num_mutants
+    offsprings = [crossover(elites[model.rng.integers(len(elites))], non_elites[model.rng.integers(len(non_elites))])
+                  for _ in range(num_offspring)]
+    return np.concatenate((model.mutants(), offsprings), axis=0)
+
+
+def generation(model, elites, non_elites):
+    offspring = np.concatenate((model.mutants(), model.mating(elites, non_elites)), axis=0)
+    # What cal_fitness does for every chromosome before deciding what to decode
+    keys = [chromosome_key(solution) for solution in offspring]
+    return offspring, keys
+
+
+def timed_generations(fn, model, elites, non_elites, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(model, elites, non_elites)
+    return (time.perf_counter() - start) / repeats
+
+
+def operator_overhead(individuals, genes, repeats, seed):
+    inputs = {'v': [(10, 10, 10)] * (genes // 2), 'V': [(100, 100, 100)], 'box_DO_map': [0] * (genes // 2),
+              'DO_count': 1, 'DOs_num': ['DO']}
+    model = BRKGA(inputs, num_individuals=individuals, seed=seed)
+    population = model.rng.uniform(0, 1, (individuals, model.num_gene))
+    elites, non_elites = population[:model.num_elites], population[model.num_elites:]
+
+    legacy_t = timed_generations(legacy_generation, model, elites, non_elites, repeats)
+    new_t = timed_generations(generation, model, elites, non_elites, repeats)
+    print(f"population {individuals} x {model.num_gene} genes, per generation (excluding decoding):")
+    print(f"  legacy operators   {legacy_t * 1000:9.1f} ms")
+    print(f"  vectorized + memo  {new_t * 1000:9.1f} ms   {legacy_t / new_t:.0f}x")
+
+
+def memo_hits(n_boxes, generations, seed):
+    inputs = decoder_inputs(random_shipment(n_boxes, max(2, n_boxes // 25), seed), 'BLIND_VAN', 2)
+    model = BRKGA(inputs, num_generations=generations, num_individuals=30, num_elites=6, num_mutants=6, seed=seed)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        model.fit(patient=generations)
+    elapsed = time.perf_counter() - start
+    evaluations = model.memo_hits + len(model.fitness_memo)
+    print(f"{n_boxes} boxes, {len(model.history['min']) - 1} generations: {len(model.fitness_memo)} decoded, "
+          f"{model.memo_hits}/{evaluations} evaluations from the memo, {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--individuals', type=int, default=120)
+    parser.add_argument('--genes', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=5)
+    # Offspring repeat whole chromosomes mostly on small shipments (few genes)
+    parser.add_argument('--memo-boxes', type=int, default=8, help="shipment size of the memo run, 0 to skip it")
+    parser.add_argument('--memo-generations', type=int, default=15)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    operator_overhead(args.individuals, args.genes, args.repeats, args.seed)
+    if args.memo_boxes:
+        memo_hits(args.memo_boxes, args.memo_generations, args.seed)
@@ -0,0 +1,74 @@
+"""
+Benchmark decode throughput (chromosomes per second) of the layouting placement decoders.
+Run this from the project root: python -m layouting_app.benchmarks.bench_decode [--boxes 100 300 1000] [--decoders testing model]
+
+Decoding is what every BRKGA generation spends its time on, so chromosomes/second
+bounds how many generations a request can afford. Inputs are built like
+run_layouting_algorithm builds them; the chromosomes are seeded random keys.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from layouting_app.algorithms import model, model_testing
+from layouting_app.algorithms.brkga import container_options
+from layouting_app.benchmarks.bench_fitness_pool import random_shipment
+
+DECODERS = {'testing': model_testing.PlacementProcedure, 'model': model.PlacementProcedure}
+
+
+def decoder_inputs(shipment, container, n_bins):
+    boxes, box_DO_map = [], []
+    sorted_DOs = list(shipment.keys())[::-1]
+    for do_idx, do in enumerate(sorted_DOs):
+        for length, width, height, quantity in shipment[do].values():
+            boxes.extend([(length, width, height)] * quantity)
+            box_DO_map.extend([do_idx] * quantity)
+    return {'v': boxes, 'V': [container_options[container]] * n_bins, 'box_DO_map': box_DO_map,
+            'DO_count': len(sorted_DOs), 'DOs_num': sorted_DOs}
+
+
+def throughput(decoder_cls, inputs, chromosomes, min_seconds):
+    """Chromosomes decoded per second, repeating the set until ``min_seconds`` have passed."""
+    decoded = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while True:
+            for chromosome in chromosomes:
+                decoder_cls(inputs, chromosome).evaluate()
+            decoded += len(chromosomes)
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_seconds:
+                return decoded / elapsed
+
+
+def run(box_counts, decoders, container, n_bins, chromosomes, min_seconds, seed):
+    print(f"{'boxes':>6} {'decoder':>8} {'chromosomes/s':>14} {'ms/chromosome':>14}")
+    for n_boxes in box_counts:
+        inputs = decoder_inputs(random_shipment(n_boxes, max(2, n_boxes // 25), seed), container, n_bins)
+        population = np.random.default_rng(seed).random((chromosomes, 2 * len(inputs['v'])))
+        for name in decoders:
+            rate = throughput(DECODERS[name], inputs, population, min_seconds)
+            print(f"{n_boxes:>6} {name:>8} {rate:14.2f} {1000 / rate:14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--boxes', type=int, nargs='+', default=[100, 300, 1000])
+    parser.add_argument('--decoders', nargs='+', default=['testing', 'model'], choices=list(DECODERS))
+    parser.add_argument('--container', default='BLIND_VAN', choices=list(container_options))
+    parser.add_argument('--bins', type=int, default=3, help="containers available to the decoder")
+    parser.add_argument('--chromosomes', type=int, default=4)
+    parser.add_argument('--min-seconds', type=float, default=2.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.boxes, args.decoders, args.container, args.bins, args.chromosomes, args.min_seconds, args.seed)
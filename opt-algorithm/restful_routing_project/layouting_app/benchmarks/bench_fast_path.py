@@ -0,0 +1,72 @@
+"""
+Report how many /api/layouting requests the constructive fast path answers without BRKGA.
+Run this from the project root: python -m layouting_app.benchmarks.bench_fast_path [--boxes 10 60 120 200] [--compare-ga]
+
+For every box count and starting container, builds --shipments random shipments
+and counts those whose constructive layout is accepted (one container, utilization
+and support above the LAYOUT_FAST_PATH_* thresholds). With --compare-ga the
+accepted ones are also laid out by BRKGA (fast path off) to show the fitness given up.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from layouting_app.algorithms import brkga, fitness_pool
+from layouting_app.algorithms.brkga import shipment_inputs
+from layouting_app.algorithms.constructive import constructive_layout
+from layouting_app.benchmarks.bench_fitness_pool import random_shipment
+
+CONTAINERS = ("BLIND_VAN", "CDE")
+
+
+def ga_fitness(shipment, container, seed):
+    brkga.LAYOUT_FAST_PATH_ENABLED = False
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = brkga.run_layouting_algorithm(shipment, container, None, None, seed=seed)
+    finally:
+        brkga.LAYOUT_FAST_PATH_ENABLED = True
+    return result['fitness']
+
+
+def run(box_counts, shipments, compare_ga):
+    print(f"{'boxes':>6} {'container':>10} {'skipped':>9} {'share':>6} {'ms':>7}"
+          + (f" {'fitness gap':>12}" if compare_ga else ""))
+    total = skipped_total = 0
+    for n_boxes in box_counts:
+        for container in CONTAINERS:
+            skipped, elapsed, gaps = 0, 0.0, []
+            for seed in range(shipments):
+                shipment = random_shipment(n_boxes, max(2, n_boxes // 25), seed)
+                start = time.perf_counter()
+                decoder, _, accepted, _ = constructive_layout(shipment_inputs(shipment, container))
+                elapsed += time.perf_counter() - start
+                if accepted:
+                    skipped += 1
+                    if compare_ga:
+                        gaps.append(decoder.evaluate() - ga_fitness(shipment, container, seed))
+            total += shipments
+            skipped_total += skipped
+            line = (f"{n_boxes:>6} {container:>10} {skipped:>4}/{shipments:<4} {skipped / shipments:6.0%} "
+                    f"{elapsed / shipments * 1000:7.1f}")
+            if compare_ga:
+                line += f" {max(gaps):12.4f}" if gaps else f" {'-':>12}"
+            print(line)
+    print(f"GA skipped for {skipped_total}/{total} requests ({skipped_total / total:.0%})")
+    fitness_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--boxes', type=int, nargs='+', default=[5, 10, 20, 40, 60, 120, 200])
+    parser.add_argument('--shipments', type=int, default=20)
+    parser.add_argument('--compare-ga', action='store_true')
+    args = parser.parse_args()
+    run(args.boxes, args.shipments, args.compare_ga)
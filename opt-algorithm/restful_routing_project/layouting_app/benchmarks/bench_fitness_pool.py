@@ -0,0 +1,95 @@
+"""
+Benchmark /api/layouting latency with the BRKGA fitness pool at different worker counts.
+Run this from the project root: python -m layouting_app.benchmarks.bench_fitness_pool [--boxes 100 300 1000] [--workers 1 4 8]
+
+Every request uses the same seed, so the layout must not change with the number of
+workers. Pools are started and warmed up before timing, like a long-running server.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restful_routing_project.settings')
+# Every request is timed in full, not answered from the layout cache
+os.environ['LAYOUT_CACHE_ENABLED'] = 'false'
+
+import django
+
+django.setup()
+
+from django.test import Client
+
+from layouting_app.algorithms import fitness_pool
+from layouting_app.algorithms.model_testing import PlacementProcedure
+
+
+def random_shipment(n_boxes, n_dos, seed=0):
+    """shipment_data with ``n_boxes`` boxes spread over ``n_dos`` delivery orders."""
+    rng = np.random.default_rng(seed)
+    shipment = {}
+    remaining = n_boxes
+    for d in range(n_dos):
+        boxes = {}
+        n_here = remaining if d == n_dos - 1 else max(1, remaining // (n_dos - d))
+        remaining -= n_here
+        while n_here > 0:
+            quantity = int(min(n_here, rng.integers(1, 6)))
+            boxes[f"B{len(boxes)}"] = [int(rng.integers(10, 48)), int(rng.integers(10, 42)),
+                                       int(rng.integers(8, 36)), quantity]
+            n_here -= quantity
+        shipment[f"DO-{d:03d}"] = boxes
+    return shipment
+
+
+def post(payload):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = Client().post('/api/layouting', data=json.dumps(payload), content_type='application/json')
+    assert response.status_code == 200, response.content[:500]
+    return time.perf_counter() - start, response.json()
+
+
+def warm_up(workers):
+    """Start the pool's processes and import the decoder in each of them."""
+    fitness_pool.LAYOUT_FITNESS_WORKERS = workers
+    if workers > 1:
+        inputs = {'v': [(10, 10, 10)] * 2, 'V': [(100, 100, 100)], 'box_DO_map': [0, 0], 'DO_count': 1, 'DOs_num': ['DO']}
+        with contextlib.redirect_stdout(io.StringIO()):
+            fitness_pool.evaluate_population(PlacementProcedure, inputs, np.full((workers * 4, 4), 0.5), workers)
+
+
+def run(box_counts, worker_counts, container, seed):
+    print(f"{'boxes':>6} {'workers':>8} {'latency (s)':>12} {'speedup':>8} {'fitness':>9} {'container':>10}")
+    for n_boxes in box_counts:
+        payload = {"shipment_data": random_shipment(n_boxes, max(2, n_boxes // 25), seed), "container": container,
+                   "shipment_id": n_boxes, "shipment_num": f"BENCH-{n_boxes}", "seed": seed}
+        baseline_t, baseline = None, None
+        for workers in worker_counts:
+            warm_up(workers)
+            latency, result = post(payload)
+            if baseline is None:
+                baseline_t, baseline = latency, result
+            assert result['layout'] == baseline['layout'], f"layout changed with {workers} workers"
+            print(f"{n_boxes:>6} {workers:>8} {latency:12.2f} {baseline_t / latency:7.2f}x "
+                  f"{result['fitness']:9.4f} {result['selected_container']:>10}")
+    fitness_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--boxes', type=int, nargs='+', default=[100, 300, 1000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--container', default='BLIND_VAN', choices=['BLIND_VAN', 'CDE'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} CPUs")
+    run(args.boxes, args.workers, args.container, args.seed)
@@ -0,0 +1,43 @@
+"""
+Benchmark /api/layouting latency of the sequential and single-search modes.
+Run this from the project root: python -m layouting_app.benchmarks.bench_multi_container [--boxes 60 120 200]
+
+Shipments start in BLIND_VAN. Those that do not fit trigger the sequential
+fallback (rerun on one CDE, then on several), which the single search replaces
+with one BRKGA run choosing the container and bin count itself. Both modes use
+the same seed; the table shows where each ended up and how long it took.
+"""
+
+import argparse
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from layouting_app.algorithms import fitness_pool
+from layouting_app.benchmarks.bench_fitness_pool import post, random_shipment
+
+MODES = ("sequential", "single")
+
+
+def run(box_counts, seed):
+    print(f"{'boxes':>6} {'mode':>11} {'latency (s)':>12} {'speedup':>8} {'container':>10} {'fitness':>9} {'placed':>7}")
+    for n_boxes in box_counts:
+        payload = {"shipment_data": random_shipment(n_boxes, max(2, n_boxes // 25), seed), "container": "BLIND_VAN",
+                   "shipment_id": n_boxes, "shipment_num": f"BENCH-{n_boxes}", "seed": seed}
+        baseline_t = None
+        for mode in MODES:
+            latency, result = post(dict(payload, mode=mode))
+            baseline_t = baseline_t or latency
+            print(f"{n_boxes:>6} {mode:>11} {latency:12.2f} {baseline_t / latency:7.2f}x "
+                  f"{result['selected_container']:>10} {result['fitness']:9.4f} {len(result['layout']):>7}")
+    fitness_pool.shutdown_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--boxes', type=int, nargs='+', default=[60, 120, 200])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.boxes, args.seed)
@@ -0,0 +1,176 @@
+"""
+Benchmark layouting speed and quality and fail on regressions against a stored baseline.
+Run this from the project root: python -m layouting_app.benchmarks.bench_regression [--quick] [--save-baseline]
+
+Every case lays out a generate_shipment shipment (see shipments.py) in BLIND_VAN
+and in CDE, with fixed seeds:
+- decode: PlacementProcedure on DECODE_CHROMOSOMES random keys, with enough bins
+  for every box, timed per decode;
+- fit: BRKGA.fit with BRKGA_PARAMS, serial, as one layouting step runs it;
+- end_to_end: run_layouting_algorithm (no layout cache).
+Each case records seconds, fitness and utilization. The run exits with status 1
+when a case got slower than the baseline by more than --time-tolerance or its
+fitness got worse by more than --fitness-tolerance. Fitness is deterministic, so
+any change in it means the algorithm changed; times depend on the machine, so
+save a baseline (--save-baseline) on the machine that runs the check.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from layouting_app.algorithms import brkga, fitness_pool
+from layouting_app.algorithms.model_testing import BRKGA, PlacementProcedure
+from layouting_app.benchmarks.shipments import generate_shipment
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline_layouting.json'
+CONTAINERS = ("BLIND_VAN", "CDE")
+DECODE_SIZES = (10, 50, 200, 500, 1000, 2000)
+SEARCH_SIZES = (10, 50, 200)
+QUICK_DECODE_SIZES = (10, 50, 200)
+QUICK_SEARCH_SIZES = (10, 50)
+DECODE_CHROMOSOMES = 5
+# Selisih waktu di bawah ini dianggap noise, berapa pun persentasenya
+MIN_TIME_DELTA = 0.05
+
+
+def decode_inputs(shipment, container):
+    """Decoder inputs with about four times the bins the box volume needs."""
+    inputs = brkga.shipment_inputs(shipment, container)
+    volume_ratio = sum(np.prod(box) for box in inputs['v']) / np.prod(inputs['V'][0])
+    inputs['V'] = inputs['V'] * (math.ceil(4 * volume_ratio) + 1)
+    return inputs
+
+
+def bench_decode(shipment, container, seed):
+    inputs = decode_inputs(shipment, container)
+    keys = np.random.default_rng(seed).random((DECODE_CHROMOSOMES, 2 * len(inputs['v'])))
+    start = time.perf_counter()
+    decoders = [PlacementProcedure(inputs, solution) for solution in keys]
+    seconds = (time.perf_counter() - start) / len(decoders)
+    return {
+        'seconds': seconds,
+        'fitness': float(np.mean([decoder.evaluate() for decoder in decoders])),
+        'utilization': float(np.mean([decoder.get_utilization() for decoder in decoders])),
+    }
+
+
+def bench_fit(shipment, container, seed):
+    inputs = brkga.shipment_inputs(shipment, container)
+    start = time.perf_counter()
+    model = BRKGA(inputs, **brkga.BRKGA_PARAMS, seed=seed)
+    model.fit(patient=10)
+    seconds = time.perf_counter() - start
+    decoder = PlacementProcedure(inputs, model.solution)
+    return {'seconds': seconds, 'fitness': float(decoder.evaluate()), 'utilization': float(decoder.get_utilization())}
+
+
+def bench_end_to_end(shipment, container, seed):
+    start = time.perf_counter()
+    result = brkga.run_layouting_algorithm(shipment, container, None, None, seed=seed)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'fitness': float(result['fitness']), 'utilization': float(result['utilization'])}
+
+
+STAGES = {
+    'decode': bench_decode,
+    'fit': bench_fit,
+    'end_to_end': bench_end_to_end,
+}
+
+
+def cases(quick=False):
+    """(name, stage, n_boxes, container) of every case in the suite."""
+    sizes = {
+        'decode': QUICK_DECODE_SIZES if quick else DECODE_SIZES,
+        'fit': QUICK_SEARCH_SIZES if quick else SEARCH_SIZES,
+        'end_to_end': QUICK_SEARCH_SIZES if quick else SEARCH_SIZES,
+    }
+    for stage in STAGES:
+        for n_boxes in sizes[stage]:
+            for container in CONTAINERS:
+                yield f"{stage}/{container}/{n_boxes}", stage, n_boxes, container
+
+
+def run_suite(quick=False):
+    results = {}
+    for name, stage, n_boxes, container in cases(quick):
+        shipment = generate_shipment(n_boxes, seed=n_boxes)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = STAGES[stage](shipment, container, seed=0)
+        metrics = results[name]
+        print(f"{name:>26} {metrics['seconds']:9.3f}s fitness {metrics['fitness']:12.4f} "
+              f"util {metrics['utilization'] * 100:6.2f}%", flush=True)
+    fitness_pool.shutdown_pool()
+    return results
+
+
+def compare(results, baseline, time_tolerance, fitness_tolerance):
+    """Regressions of ``results`` against ``baseline`` cases, as messages."""
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if (metrics['seconds'] > base['seconds'] * (1 + time_tolerance)
+                and metrics['seconds'] - base['seconds'] > MIN_TIME_DELTA):
+            regressions.append(f"{name}: {metrics['seconds']:.3f}s, baseline {base['seconds']:.3f}s")
+        if metrics['fitness'] > base['fitness'] * (1 + fitness_tolerance):
+            regressions.append(f"{name}: fitness {metrics['fitness']:.4f}, baseline {base['fitness']:.4f}")
+    return regressions
+
+
+def machine():
+    return {'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': np.__version__}
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Merge ``results`` into the baseline file, so a quick run keeps the other cases."""
+    stored = json.loads(path.read_text()) if path.exists() else {'cases': {}}
+    stored['machine'] = machine()
+    stored['cases'].update(results)
+    stored['cases'] = dict(sorted(stored['cases'].items()))
+    path.write_text(json.dumps(stored, indent=2) + '\n')
+
+
+def main(args):
+    results = run_suite(args.quick)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        return 1
+    stored = json.loads(args.baseline.read_text())
+    if stored.get('machine') != machine():
+        print(f"Warning: baseline was recorded on {stored.get('machine')}, times may not compare")
+    regressions = compare(results, stored['cases'], args.time_tolerance, args.fitness_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(results)} cases, {len(regressions)} regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="smaller sizes only")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--time-tolerance', type=float, default=0.3)
+    parser.add_argument('--fitness-tolerance', type=float, default=0.01)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,40 @@
+"""
+Reproducible synthetic shipments for the layouting benchmarks.
+
+A shipment has ``n_dos`` delivery orders of uneven size (Dirichlet shares, at
+least one box each). Every DO holds a few box types drawn from BOX_DIMS_CM with
+quantities summing to its share, like the shipment_data the gateway sends.
+"""
+
+import numpy as np
+
+# Rentang dimensi box (cm): panjang, lebar, tinggi
+BOX_DIMS_CM = ((10, 48), (10, 42), (8, 36))
+MAX_QUANTITY = 6
+
+
+def default_dos(n_boxes):
+    return max(2, n_boxes // 25)
+
+
+def generate_shipment(n_boxes, n_dos=None, seed=0):
+    """shipment_data with ``n_boxes`` boxes in ``n_dos`` DOs, the same for the same arguments."""
+    rng = np.random.default_rng(seed)
+    n_dos = min(n_dos or default_dos(n_boxes), n_boxes)
+    shares = rng.dirichlet(np.full(n_dos, 2.0))
+    counts = 1 + rng.multinomial(n_boxes - n_dos, shares)
+
+    shipment = {}
+    for d, n_here in enumerate(counts):
+        boxes = {}
+        while n_here > 0:
+            quantity = int(min(n_here, rng.integers(1, MAX_QUANTITY + 1)))
+            dims = [int(rng.integers(low, high + 1)) for low, high in BOX_DIMS_CM]
+            boxes[str(len(boxes) + 1)] = [*dims, quantity]
+            n_here -= quantity
+        shipment[f"DO-{d:04d}"] = boxes
+    return shipment
+
+
+def box_count(shipment):
+    return sum(quantity for boxes in shipment.values() for *_, quantity in boxes.values())
@@ -0,0 +1,209 @@
+"""
+Layout result cache keyed by the canonical content of a shipment.
+
+The gateway calls /api/layouting again for shipments it already planned, often
+after edits that do not touch the boxes. The key hashes each DO's boxes (dims with
+summed quantities, sorted, box ids ignored) in DO order, together with the
+container, mode, seed, time budget and BRKGA parameters, so such a call is answered from the
+cache. Entries live in a small in-process LRU in front of a SQLite table
+(routing_app.cache_store), which survives restarts and is shared by workers.
+
+On a miss, the last layout of the same shipment (shipment_id/shipment_num) is
+used as a warm start when only a few of its boxes changed: boxes that are still
+there keep their BRKGA keys, new ones get random keys.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+import numpy as np
+
+from routing_app.cache_store import CACHE_DIR, SqliteCache, env_flag, env_number
+
+from .algorithms.brkga import BRKGA_PARAMS, run_layouting_search, shipment_inputs
+
+LAYOUT_CACHE_ENABLED = env_flag('LAYOUT_CACHE_ENABLED', True)
+LAYOUT_CACHE_PATH = os.getenv('LAYOUT_CACHE_PATH', str(CACHE_DIR / 'layout_cache.sqlite3'))
+LAYOUT_CACHE_TTL_SECONDS = env_number('LAYOUT_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+LAYOUT_CACHE_MAX_ENTRIES = env_number('LAYOUT_CACHE_MAX_ENTRIES', 5000)
+LAYOUT_CACHE_MEMORY_ENTRIES = env_number('LAYOUT_CACHE_MEMORY_ENTRIES', 64)
+# Warm-start from the shipment's previous layout when at most this share of its boxes changed
+LAYOUT_CACHE_WARM_START_MAX_CHANGED = env_number('LAYOUT_CACHE_WARM_START_MAX_CHANGED', 0.2, float)
+# Bump when a decoder change makes cached layouts stale
+LAYOUT_ALGORITHM_VERSION = 2
+
+_layout_cache = None
+_layout_cache_lock = threading.Lock()
+
+
+def shipment_signature(shipment_data):
+    """Per DO, in DO order: its box dims with summed quantities, sorted."""
+    signature = []
+    for do, boxes in shipment_data.items():
+        quantities = defaultdict(int)
+        for length, width, height, quantity in boxes.values():
+            quantities[(float(length), float(width), float(height))] += int(quantity)
+        signature.append([do, sorted([*dims, quantity] for dims, quantity in quantities.items() if quantity > 0)])
+    return signature
+
+
+def layout_key(shipment_data, container, mode, seed, time_budget_ms=None):
+    content = {
+        'shipment': shipment_signature(shipment_data),
+        'container': container,
+        'mode': mode,
+        'seed': seed,
+        'time_budget_ms': time_budget_ms,
+        'brkga': BRKGA_PARAMS,
+        'version': LAYOUT_ALGORITHM_VERSION,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def box_list(inputs):
+    """[do_num, length, width, height] of every decoder box, in decoder order."""
+    return [[inputs['DOs_num'][do], *map(float, dims)] for dims, do in zip(inputs['v'], inputs['box_DO_map'])]
+
+
+def warm_start_keys(old_boxes, old_solution, new_boxes, seed=None):
+    """
+    BRKGA keys for ``new_boxes`` taken from a previous run on ``old_boxes``.
+
+    Returns (keys, changed): boxes matched by DO and dims keep their order and
+    orientation keys, the others get random ones; genes after the 2N box genes
+    (the container gene) are carried over. ``changed`` counts added plus removed boxes.
+    """
+    n_old, n_new = len(old_boxes), len(new_boxes)
+    old_solution = np.asarray(old_solution, dtype=float)
+    positions = defaultdict(deque)
+    for i, box in enumerate(old_boxes):
+        positions[tuple(box)].append(i)
+
+    keys = np.random.default_rng(seed).random(2 * n_new)
+    matched = 0
+    for j, box in enumerate(new_boxes):
+        queue = positions.get(tuple(box))
+        if queue:
+            i = queue.popleft()
+            keys[j], keys[n_new + j] = old_solution[i], old_solution[n_old + i]
+            matched += 1
+    changed = (n_new - matched) + (n_old - matched)
+    return np.concatenate((keys, old_solution[2 * n_old:])), changed
+
+
+class LayoutCache:
+    """
+    Layout results by layout_key: a bounded in-memory LRU over a SqliteCache.
+
+    Each entry stores the result (without shipment_id/shipment_num), the decoder
+    boxes and the best keys. A second row per shipment points to its latest entry.
+    """
+
+    def __init__(self, store, memory_entries=LAYOUT_CACHE_MEMORY_ENTRIES,
+                 warm_start_max_changed=LAYOUT_CACHE_WARM_START_MAX_CHANGED):
+        self.store = store
+        self.memory_entries = memory_entries
+        self.warm_start_max_changed = warm_start_max_changed
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.warm_starts = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def shipment_key(shipment_id, shipment_num, container, mode):
+        """Key of the pointer to a shipment's latest entry, None for anonymous requests."""
+        if shipment_id is None and shipment_num is None:
+            return None
+        return f"shipment:{container}:{mode}:{shipment_id}:{shipment_num}"
+
+    def get(self, key):
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+        value = self.store.get(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self._remember(key, value)
+        self.store.set(key, value)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def layout(self, shipment_data, selected_container, shipment_id, shipment_num, seed=None, mode="sequential",
+               time_budget_ms=None):
+        """run_layouting_algorithm through the cache."""
+        start_time = time.time()
+        key = layout_key(shipment_data, selected_container, mode, seed, time_budget_ms)
+        shipment_key = self.shipment_key(shipment_id, shipment_num, selected_container, mode)
+
+        entry = self.get(key)
+        if entry is not None:
+            print(f"[Layouting][Cache] HIT key={key[:12]} shipment_id={shipment_id}")
+            if shipment_key:
+                self.store.set(shipment_key, key)
+            return dict(entry['result'], shipment_id=shipment_id, shipment_num=shipment_num,
+                        running_time=time.time() - start_time)
+
+        warm_start = self.previous_keys(shipment_key, shipment_data, selected_container)
+        result, inputs, solution = run_layouting_search(shipment_data, selected_container, shipment_id, shipment_num,
+                                                        seed=seed, mode=mode, warm_start=warm_start,
+                                                        time_budget_ms=time_budget_ms)
+        stored_result = {k: v for k, v in result.items() if k not in ('shipment_id', 'shipment_num')}
+        # Through JSON once, so memory hits return what a disk hit would
+        entry = json.loads(json.dumps({'result': stored_result, 'boxes': box_list(inputs),
+                                       'solution': np.asarray(solution, dtype=float).tolist()}))
+        self.put(key, entry)
+        if shipment_key:
+            self.store.set(shipment_key, key)
+        print(f"[Layouting][Cache] MISS key={key[:12]} stored, warm_start={warm_start is not None}")
+        return result
+
+    def previous_keys(self, shipment_key, shipment_data, selected_container):
+        """Warm-start keys from the shipment's previous layout, or None."""
+        if shipment_key is None:
+            return None
+        previous_key = self.store.get(shipment_key)
+        previous = self.get(previous_key) if previous_key else None
+        if previous is None:
+            return None
+
+        new_boxes = box_list(shipment_inputs(shipment_data, selected_container))
+        keys, changed = warm_start_keys(previous['boxes'], previous['solution'], new_boxes)
+        if changed > self.warm_start_max_changed * max(len(new_boxes), 1):
+            print(f"[Layouting][Cache] {changed} boxes changed since the previous layout, no warm start")
+            return None
+        self.warm_starts += 1
+        print(f"[Layouting][Cache] Warm start from previous layout, {changed} boxes changed")
+        return [keys]
+
+    def stats(self):
+        return {**self.store.stats(), 'memory_hits': self.memory_hits, 'memory_entries': len(self.memory),
+                'warm_starts': self.warm_starts}
+
+
+def get_layout_cache():
+    """Process-wide layout cache, or None when disabled with LAYOUT_CACHE_ENABLED=false."""
+    global _layout_cache
+    if not LAYOUT_CACHE_ENABLED:
+        return None
+    with _layout_cache_lock:
+        if _layout_cache is None:
+            store = SqliteCache(LAYOUT_CACHE_PATH, 'layouts',
+                                ttl_seconds=LAYOUT_CACHE_TTL_SECONDS, max_entries=LAYOUT_CACHE_MAX_ENTRIES)
+            _layout_cache = LayoutCache(store)
+            print(f"[Layouting][Cache] Using {LAYOUT_CACHE_PATH} (ttl={LAYOUT_CACHE_TTL_SECONDS}s, "
+                  f"max_entries={LAYOUT_CACHE_MAX_ENTRIES}, memory_entries={LAYOUT_CACHE_MEMORY_ENTRIES})")
+        return _layout_cache
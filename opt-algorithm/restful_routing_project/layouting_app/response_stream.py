@@ -0,0 +1,85 @@
+"""
+Chunked JSON encoding of /api/layouting results.
+
+The result is encoded field by field and its layout LAYOUT_STREAM_CHUNK_BOXES
+boxes at a time, so a large layout is never held as one JSON string. The view
+either streams the chunks (stream=true) or joins them once into the response
+body; both count the bytes on the way out instead of dumping the result again.
+
+A streamed response computed without the layout cache gets its layout as
+brkga.LayoutBoxes, which formats each box from the decoder's bins when its chunk
+is encoded, so neither every box dict nor the whole body is held at once. Cached
+results (layout_cache keeps the formatted layout) and the joined body of a
+non-streamed response still hold the full layout.
+
+Layout formats:
+- "objects" (default): the per-box dicts of format_result.
+- "columnar": one array per field, corners flattened to [x, y, z, x, y, z, ...].
+  do_priority is left out, it always equals do_index.
+"""
+
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from routing_app.cache_store import env_number
+
+LAYOUT_FORMATS = ("objects", "columnar")
+LAYOUT_STREAM_CHUNK_BOXES = env_number('LAYOUT_STREAM_CHUNK_BOXES', 500)
+COLUMNAR_FIELDS = ("do_num", "box_id", "do_index")
+COLUMNAR_CORNERS = ("min_corner", "max_corner")
+
+
+def dumps(value):
+    # Sama dengan JSONRenderer DRF: compact, tanpa escape non-ASCII, dan encoder DRF
+    # untuk nilai numpy, Decimal dan datetime
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+
+
+def iter_array(values, chunk_boxes):
+    """JSON array of ``values`` in chunks of ``chunk_boxes`` items."""
+    yield '['
+    for start in range(0, len(values), chunk_boxes):
+        chunk = dumps(values[start:start + chunk_boxes])[1:-1]
+        yield chunk if start == 0 else ',' + chunk
+    yield ']'
+
+
+def iter_columnar(layout, chunk_boxes):
+    yield '{'
+    for i, field in enumerate(COLUMNAR_FIELDS + COLUMNAR_CORNERS):
+        yield ('' if i == 0 else ',') + dumps(field) + ':['
+        for start in range(0, len(layout), chunk_boxes):
+            boxes = layout[start:start + chunk_boxes]
+            if field in COLUMNAR_CORNERS:
+                chunk = [coord for box in boxes for coord in box[field]]
+            else:
+                chunk = [box[field] for box in boxes]
+            yield ('' if start == 0 else ',') + dumps(chunk)[1:-1]
+        yield ']'
+    yield '}'
+
+
+def iter_result_json(result, layout_format="objects", chunk_boxes=None):
+    """UTF-8 chunks of ``result`` as JSON, with its layout in ``layout_format``."""
+    chunk_boxes = chunk_boxes or LAYOUT_STREAM_CHUNK_BOXES
+    yield b'{'
+    for i, (key, value) in enumerate(result.items()):
+        prefix = ('' if i == 0 else ',') + dumps(key) + ':'
+        if key != 'layout':
+            yield (prefix + dumps(value)).encode('utf-8')
+            continue
+        yield prefix.encode('utf-8')
+        parts = iter_columnar(value, chunk_boxes) if layout_format == "columnar" else iter_array(value, chunk_boxes)
+        for part in parts:
+            yield part.encode('utf-8')
+    yield b'}'
+
+
+def counted(chunks, on_done):
+    """Pass ``chunks`` through and call ``on_done(total_bytes)`` once they are all sent."""
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        yield chunk
+    on_done(size)
@@ -1,3 +1,366 @@
-from django.test import TestCase
+import hashlib
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+from rest_framework.test import APIClient
+from routing_app.cache_store import SqliteCache
+
+from .algorithms import brkga, fitness_pool, model
+from .algorithms.brkga import container_options
+from .algorithms.constructive import constructive_layout, fast_path_stats, min_support
+from .algorithms.decoding_tables import DecodingTables
+from .algorithms.model_testing import BRKGA, EMSStore, LoadedBoxIndex, PlacementProcedure
+from .algorithms.multi_container import ContainerChoicePlacement
+from .layout_cache import LayoutCache, layout_key, warm_start_keys
+from .benchmarks.bench_regression import compare
+from .benchmarks.shipments import box_count, generate_shipment
+from .response_stream import LAYOUT_FORMATS, iter_result_json
+
+PLACEMENT_CORPUS = Path(__file__).resolve().parent / 'testdata' / 'placement_corpus.json'
+
+
+def random_inputs(n_boxes, n_dos, container=(255, 146, 130), n_bins=2, seed=0):
+    rng = np.random.default_rng(seed)
+    box_DO_map = sorted(rng.integers(0, n_dos, n_boxes).tolist())
+    return {
+        'v': [tuple(int(d) for d in rng.integers(10, 48, 3)) for _ in range(n_boxes)],
+        'V': [container] * n_bins,
+        'box_DO_map': box_DO_map,
+        'DO_count': n_dos,
+        'DOs_num': [f"DO-{i}" for i in range(n_dos)],
+    }
+
+
+class FitnessPoolTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        fitness_pool.shutdown_pool()
+        super().tearDownClass()
+
+    def test_pool_matches_serial_decoding(self):
+        inputs = random_inputs(30, 3)
+        population = np.random.default_rng(1).random((7, 60))
+        serial = [PlacementProcedure(inputs, solution).evaluate() for solution in population]
+        self.assertEqual(fitness_pool.evaluate_population(PlacementProcedure, inputs, population, workers=2), serial)
+
+    def test_seeded_runs_do_not_depend_on_workers(self):
+        inputs = random_inputs(24, 3)
+        runs = []
+        for multi_process, workers in ((False, None), (True, 2)):
+            model = BRKGA(inputs, num_generations=3, num_individuals=12, num_elites=2, num_mutants=2,
+                          multiProcess=multi_process, workers=workers, seed=7)
+            model.fit(patient=3)
+            runs.append((model.solution.tolist(), model.history))
+        self.assertEqual(runs[0], runs[1])
+
+    def test_fitness_memo_skips_known_chromosomes(self):
+        inputs = random_inputs(12, 2)
+        model = BRKGA(inputs, seed=0)
+        population = np.random.default_rng(2).random((3, 24))
+        fitness = model.cal_fitness(population)
+        repeated = np.concatenate((population[[2, 0]], population[[2]], np.random.default_rng(3).random((1, 24))))
+        self.assertEqual(model.cal_fitness(repeated)[:3], [fitness[2], fitness[0], fitness[2]])
+        self.assertEqual((len(model.fitness_memo), model.memo_hits), (4, 3))
+
+
+def corpus_inputs(case):
+    """Decoder inputs for a corpus shipment, built like run_layouting_algorithm does."""
+    boxes, box_DO_map = [], []
+    sorted_DOs = list(case['shipment'].keys())[::-1]
+    for do_idx, do in enumerate(sorted_DOs):
+        for length, width, height, quantity in case['shipment'][do].values():
+            boxes.extend([(length, width, height)] * quantity)
+            box_DO_map.extend([do_idx] * quantity)
+    return {'v': boxes, 'V': [container_options[case['container']]] * case['n_bins'], 'box_DO_map': box_DO_map,
+            'DO_count': len(sorted_DOs), 'DOs_num': sorted_DOs}
+
+
+def placement_digest(decoder):
+    digest = hashlib.sha256()
+    for bin in decoder.Bins[:decoder.num_opend_bins]:
+        for min_corner, max_corner, do_index in bin.load_items:
+            digest.update(json.dumps([[float(x) for x in min_corner], [float(x) for x in max_corner],
+                                      int(do_index)]).encode())
+        digest.update(b'|')
+    return digest.hexdigest()
+
+
+class PlacementCorpusTests(SimpleTestCase):
+    """Decoder changes must reproduce the recorded placements exactly."""
+    max_boxes = 150
+
+    def assert_placements(self, decoder_cls, key):
+        for case in json.loads(PLACEMENT_CORPUS.read_text())['cases']:
+            inputs = corpus_inputs(case)
+            if len(inputs['v']) > self.max_boxes:
+                continue
+            for expected in case.get(key, []):
+                chromosome = np.random.default_rng(expected['chromosome_seed']).random(2 * len(inputs['v']))
+                decoder = decoder_cls(inputs, chromosome)
+                with self.subTest(seed=case['seed'], chromosome_seed=expected['chromosome_seed']):
+                    self.assertEqual(decoder.num_opend_bins, expected['num_opend_bins'])
+                    self.assertEqual(float(decoder.evaluate()), expected['fitness'])
+                    self.assertEqual(placement_digest(decoder), expected['digest'])
+
+    def test_model_testing_placements(self):
+        self.assert_placements(PlacementProcedure, 'decodes')
+
+    def test_model_placements(self):
+        self.assert_placements(model.PlacementProcedure, 'model_decodes')
+
+
+class EMSStoreTests(SimpleTestCase):
+    def test_swap_remove_keeps_insertion_order(self):
+        store = EMSStore(capacity=2)
+        for i in range(5):
+            store.append((i, 0, 0), (10, 10, 10))
+        store.remove(1)
+        store.remove(0)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.active()[store.order(), 0].tolist(), [2, 3, 4])
+        self.assertEqual(store.overlapping((3.5, 1, 1), (5, 2, 2))[store.order()].tolist(), [True, True, True])
+        self.assertEqual(store.containing((3, 1, 1), (5, 2, 2))[store.order()].tolist(), [True, True, False])
+        self.assertEqual(store.fitting((9, 7, 8))[store.order()].tolist(), [True, True, False])
+
+
+class LoadedBoxIndexTests(SimpleTestCase):
+    def test_any_inside(self):
+        index = LoadedBoxIndex()
+        for lo, hi in (((50, 0, 0), (60, 10, 10)), ((0, 0, 0), (10, 10, 10)), ((20, 20, 0), (30, 30, 10))):
+            index.add(np.array(lo, dtype=float), np.array(hi, dtype=float))
+        self.assertEqual(index.x.tolist(), [0, 20, 50])
+        self.assertTrue(index.any_inside(np.array((0, 0, 0)), np.array((10, 10, 10))))
+        self.assertTrue(index.any_inside(np.array((15, 15, 0)), np.array((55, 30, 20))))
+        self.assertFalse(index.any_inside(np.array((1, 0, 0)), np.array((55, 10, 10))))
+        self.assertFalse(index.any_inside(np.array((61, 0, 0)), np.array((100, 100, 100))))
+
+
+class DecodingTablesTests(SimpleTestCase):
+    def test_tables_match_per_box_computation(self):
+        inputs = random_inputs(40, 4, seed=3)
+        inputs['DOs_num'] = ['DO-1', 'DO-0', 'DO-1', 'DO-3']
+        tables = DecodingTables(inputs)
+        keys = np.random.default_rng(3).random(80)
+        expected_order = sorted(range(40), key=lambda i: (inputs['DOs_num'].index(inputs['DOs_num'][inputs['box_DO_map'][i]]),
+                                                          keys[i]))
+        self.assertEqual(tables.box_order(keys).tolist(), expected_order)
+
+        decoder = PlacementProcedure(inputs, keys)
+        for box_idx in (0, 17, 38, 39):
+            remaining = [inputs['v'][i] for i in range(40) if i > box_idx]
+            self.assertEqual(tables.elimination_limits(box_idx), decoder.elimination_rule(remaining))
+
+
+class SingleSearchTests(SimpleTestCase):
+    def test_container_gene_picks_container(self):
+        inputs = random_inputs(20, 2, n_bins=1)
+        inputs['containers'] = [('BLIND_VAN', container_options['BLIND_VAN'], 1), ('CDE', container_options['CDE'], 3)]
+        keys = np.random.default_rng(5).random(40)
+        for gene, rank in ((0.2, 0), (0.9, 1)):
+            container, dimensions, max_bins = inputs['containers'][rank]
+            decoder = ContainerChoicePlacement(inputs, np.append(keys, gene))
+            expected = PlacementProcedure(dict(inputs, V=[dimensions] * max_bins), keys)
+            self.assertEqual(decoder.container, container)
+            self.assertEqual(placement_digest(decoder.placement), placement_digest(expected))
+            self.assertEqual(decoder.evaluate(), expected.evaluate() + rank)
+
+    def test_warm_start_replaces_first_rows(self):
+        inputs = random_inputs(5, 1)
+        model = BRKGA(inputs, decoder_cls=ContainerChoicePlacement, initial_solutions=[np.full(10, 0.25)], seed=0)
+        population = np.full((3, 11), 0.5)
+        population = model.warm_start(population)
+        self.assertEqual(population[0].tolist(), [0.25] * 10 + [0.5])
+        self.assertEqual(population[1:].tolist(), [[0.5] * 11] * 2)
+
+    def test_unknown_mode_is_rejected(self):
+        response = APIClient().post('/api/layouting', {'shipment_data': {'DO-1': {'B1': [10, 10, 10, 1]}},
+                                                       'container': 'CDE', 'mode': 'parallel'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class LayoutCacheTests(SimpleTestCase):
+    shipment = {'DO-A': {'B1': [40, 30, 20, 2], 'B2': [25, 25, 25, 1]}, 'DO-B': {'B1': [30, 20, 10, 3]}}
+
+    @classmethod
+    def tearDownClass(cls):
+        fitness_pool.shutdown_pool()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = LayoutCache(SqliteCache(':memory:', 'layouts'), memory_entries=1, warm_start_max_changed=0.5)
+        self.search = mock.patch('layouting_app.layout_cache.run_layouting_search',
+                                 side_effect=brkga.run_layouting_search).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_key_is_canonical_shipment_content(self):
+        regrouped = {'DO-A': {'X': [25, 25, 25, 1], 'Y': [40, 30, 20, 1], 'Z': [40.0, 30, 20, 1]},
+                     'DO-B': {'B9': [30, 20, 10, 3]}}
+        key = layout_key(self.shipment, 'BLIND_VAN', 'sequential', 1)
+        self.assertEqual(layout_key(regrouped, 'BLIND_VAN', 'sequential', 1), key)
+        reordered = {'DO-B': self.shipment['DO-B'], 'DO-A': self.shipment['DO-A']}
+        self.assertNotEqual(layout_key(reordered, 'BLIND_VAN', 'sequential', 1), key)
+        self.assertNotEqual(layout_key(self.shipment, 'CDE', 'sequential', 1), key)
+        self.assertNotEqual(layout_key(self.shipment, 'BLIND_VAN', 'single', 1), key)
+
+    def test_hit_returns_stored_layout_without_search(self):
+        first = self.cache.layout(self.shipment, 'BLIND_VAN', 1, 'S-1', seed=1)
+        self.cache.layout({'DO-C': {'B1': [10, 10, 10, 1]}}, 'BLIND_VAN', 2, 'S-2', seed=1)
+        self.assertEqual(len(self.cache.memory), 1)
+
+        again = self.cache.layout(self.shipment, 'BLIND_VAN', 3, 'S-3', seed=1)  # from the disk tier
+        self.assertEqual(self.search.call_count, 2)
+        self.assertEqual((again['shipment_id'], again['shipment_num']), (3, 'S-3'))
+        self.assertEqual(again['layout'], first['layout'])
+        self.assertEqual(again['fitness'], first['fitness'])
+
+    def test_small_change_warm_starts_from_previous_layout(self):
+        self.cache.layout(self.shipment, 'BLIND_VAN', 7, 'S-7', seed=1)
+        changed = {**self.shipment, 'DO-B': {'B1': [30, 20, 10, 4]}}
+        self.cache.layout(changed, 'BLIND_VAN', 7, 'S-7', seed=1)
+        warm_start = self.search.call_args.kwargs['warm_start']
+        self.assertEqual(len(warm_start[0]), 2 * 7)
+        self.assertEqual(self.cache.warm_starts, 1)
+
+    def test_warm_start_keys_follow_matching_boxes(self):
+        old_boxes = [['A', 1, 1, 1], ['A', 2, 2, 2], ['B', 3, 3, 3]]
+        old_solution = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.9]
+        keys, changed = warm_start_keys(old_boxes, old_solution, [['B', 3, 3, 3], ['A', 1, 1, 1], ['C', 4, 4, 4]])
+        self.assertEqual(changed, 2)
+        self.assertEqual(keys[[0, 1, 3, 4, 6]].tolist(), [0.3, 0.1, 0.6, 0.4, 0.9])
+
+
+class TimeBudgetTests(SimpleTestCase):
+    shipment = {'DO-A': {'B1': [40, 30, 20, 3]}, 'DO-B': {'B1': [30, 20, 10, 2]}}
+
+    @classmethod
+    def tearDownClass(cls):
+        fitness_pool.shutdown_pool()
+        super().tearDownClass()
+
+    def test_expired_deadline_keeps_best_of_initial_population(self):
+        model = BRKGA(random_inputs(10, 2), num_generations=50, num_individuals=8, num_elites=2, num_mutants=2, seed=0)
+        model.fit(patient=50, deadline=0)
+        self.assertEqual((model.generations, model.stop_reason), (0, 'time_budget'))
+        self.assertEqual(model.best_fitness, model.history['min'][0])
+        self.assertEqual(len(model.solution), 20)
+
+    @mock.patch.object(brkga, 'LAYOUT_FAST_PATH_ENABLED', False)
+    def test_budget_adds_convergence_to_result(self):
+        plain = brkga.run_layouting_algorithm(self.shipment, 'BLIND_VAN', 1, 'S-1', seed=0)
+        self.assertNotIn('history', plain)
+        result = brkga.run_layouting_algorithm(self.shipment, 'BLIND_VAN', 1, 'S-1', seed=0, time_budget_ms=60000)
+        self.assertEqual(result['layout'], plain['layout'])
+        stage, = result['history']
+        self.assertEqual((stage['container'], stage['bins']), ('BLIND_VAN', 1))
+        self.assertEqual(result['generations'], stage['generations'])
+        self.assertEqual(len(stage['min_fitness']), stage['generations'] + 1)
+
+    def test_invalid_budget_is_rejected(self):
+        for budget in (0, -5, 'fast', True):
+            response = APIClient().post('/api/layouting', {'shipment_data': self.shipment, 'container': 'CDE',
+                                                            'time_budget_ms': budget}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_invalid_seed_is_rejected(self):
+        for seed in ('7', 1.5, True, -1):
+            response = APIClient().post('/api/layouting', {'shipment_data': self.shipment, 'container': 'CDE',
+                                                            'seed': seed}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+
+class ConstructiveFastPathTests(SimpleTestCase):
+    def test_small_shipment_skips_brkga(self):
+        shipment = {'DO-A': {'B1': [40, 30, 20, 3]}, 'DO-B': {'B1': [30, 20, 10, 2]}}
+        before = fast_path_stats()
+        with mock.patch.object(brkga, 'BRKGA', side_effect=AssertionError('BRKGA should be skipped')):
+            result, _, solution = brkga.run_layouting_search(shipment, 'BLIND_VAN', 1, 'S-1', time_budget_ms=1000)
+        self.assertEqual((result['selected_container'], len(result['layout'])), ('BLIND_VAN', 5))
+        self.assertEqual((result['generations'], result['history']), (0, []))
+        self.assertEqual(len(solution), 10)
+        after = fast_path_stats()
+        self.assertEqual((after['requests'] - before['requests'], after['skipped'] - before['skipped']), (1, 1))
+
+    def test_rejected_layout_seeds_brkga(self):
+        inputs = random_inputs(120, 4, container=container_options['BLIND_VAN'], n_bins=1)
+        decoder, solutions, accepted, stats = constructive_layout(inputs)
+        self.assertFalse(accepted)
+        self.assertEqual([len(solution) for solution in solutions], [240, 240])
+        self.assertEqual(PlacementProcedure(inputs, solutions[0]).evaluate(), decoder.evaluate())
+
+    def test_min_support_lets_hovering_boxes_settle(self):
+        floor_box = (np.array([0, 0, 0]), np.array([10, 10, 8]), 0)
+        half_on_top = (np.array([5, 0, 10]), np.array([15, 10, 20]), 0)
+        self.assertEqual(min_support(SimpleNamespace(load_items=[floor_box])), 1.0)
+        self.assertEqual(min_support(SimpleNamespace(load_items=[floor_box, half_on_top])), 0.5)
+
+
+class ResponseStreamTests(SimpleTestCase):
+    shipment = {'DO-A': {'B1': [40, 30, 20, 3]}, 'DO-B': {'B1': [30, 20, 10, 2]}}
+
+    def setUp(self):
+        self.result = brkga.run_layouting_algorithm(self.shipment, 'BLIND_VAN', 1, 'S-1', seed=0)
+
+    def test_objects_chunks_decode_to_result(self):
+        chunks = list(iter_result_json(self.result, chunk_boxes=2))
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(json.loads(b''.join(chunks)), json.loads(json.dumps(self.result)))
+
+    def test_columnar_layout(self):
+        decoded = json.loads(b''.join(iter_result_json(self.result, 'columnar', chunk_boxes=2)))
+        layout = self.result['layout']
+        self.assertEqual(decoded['fitness'], self.result['fitness'])
+        self.assertEqual(decoded['layout']['do_index'], [box['do_index'] for box in layout])
+        self.assertEqual(decoded['layout']['max_corner'], [c for box in layout for c in box['max_corner']])
+
+    def test_numpy_values_are_encoded(self):
+        result = dict(self.result, bins=np.int64(2))
+        result['layout'] = [dict(box, do_index=np.int64(box['do_index']), max_corner=np.array(box['max_corner']))
+                            for box in self.result['layout']]
+        for layout_format in LAYOUT_FORMATS:
+            with self.subTest(layout_format=layout_format):
+                decoded = json.loads(b''.join(iter_result_json(result, layout_format, chunk_boxes=2)))
+                self.assertEqual(decoded['bins'], 2)
+                expected = json.loads(b''.join(iter_result_json(self.result, layout_format, chunk_boxes=2)))
+                self.assertEqual(decoded['layout'], expected['layout'])
+
+    def test_lazy_layout_encodes_like_formatted_layout(self):
+        lazy = brkga.run_layouting_algorithm(self.shipment, 'BLIND_VAN', 1, 'S-1', seed=0, lazy_layout=True)
+        self.assertIsInstance(lazy['layout'], brkga.LayoutBoxes)
+        self.assertEqual(list(lazy['layout']), self.result['layout'])
+        for layout_format in LAYOUT_FORMATS:
+            with self.subTest(layout_format=layout_format):
+                self.assertEqual(b''.join(iter_result_json({'layout': lazy['layout']}, layout_format, chunk_boxes=2)),
+                                 b''.join(iter_result_json({'layout': self.result['layout']}, layout_format, chunk_boxes=2)))
+
+    @mock.patch('layouting_app.views.get_layout_cache', return_value=None)
+    def test_streamed_response_matches_plain_response(self, _):
+        payload = {'shipment_data': self.shipment, 'container': 'BLIND_VAN', 'seed': 0, 'format': 'columnar'}
+        plain = APIClient().post('/api/layouting', payload, format='json')
+        streamed = APIClient().post('/api/layouting', dict(payload, stream=True), format='json')
+        self.assertTrue(streamed.streaming)
+        streamed_result = json.loads(b''.join(streamed.streaming_content))
+        self.assertEqual(streamed_result['layout'], plain.json()['layout'])
+        self.assertEqual(APIClient().post('/api/layouting', dict(payload, format='rows'), format='json').status_code, 400)
+
+
+class RegressionBenchmarkTests(SimpleTestCase):
+    def test_generated_shipments_are_reproducible(self):
+        shipment = generate_shipment(300, seed=3)
+        self.assertEqual(shipment, generate_shipment(300, seed=3))
+        self.assertEqual((box_count(shipment), len(shipment)), (300, 12))
+        self.assertTrue(all(boxes for boxes in shipment.values()))
+
+    def test_compare_flags_slower_or_worse_cases(self):
+        baseline = {'fit/CDE/50': {'seconds': 10.0, 'fitness': 1.80}, 'decode/CDE/10': {'seconds': 0.004, 'fitness': 1.9}}
+        results = {
+            'fit/CDE/50': {'seconds': 14.0, 'fitness': 1.90},
+            'decode/CDE/10': {'seconds': 0.008, 'fitness': 1.9},
+            'decode/CDE/2000': {'seconds': 9.0, 'fitness': 99.0},
+        }
+        regressions = compare(results, baseline, time_tolerance=0.3, fitness_tolerance=0.01)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(r.startswith('fit/CDE/50') for r in regressions))
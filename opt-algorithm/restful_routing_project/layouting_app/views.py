@@ -1,6 +1,10 @@
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .algorithms.brkga import run_layouting_algorithm
+from .algorithms.brkga import LAYOUTING_MODES, run_layouting_algorithm
+from .layout_cache import get_layout_cache
+from .response_stream import LAYOUT_FORMATS, counted, iter_result_json
+import sys
 import time
 
 @api_view(['POST'])
@@ -15,30 +19,63 @@ def layouting_boxes(request):
     selected_container = request.data.get("container")
     shipment_id = request.data.get("shipment_id")
     shipment_num = request.data.get("shipment_num")
+    # Optional, makes the layout reproducible
+    seed = request.data.get("seed")
+    if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+        print(f"[Layouting][View] ERROR: invalid seed {seed}")
+        return Response({"error": "seed must be a non-negative integer"}, status=400)
+    # "sequential" (default) or "single", see brkga.LAYOUTING_MODES
+    mode = request.data.get("mode", "sequential")
+    if mode not in LAYOUTING_MODES:
+        print(f"[Layouting][View] ERROR: unknown mode {mode}")
+        return Response({"error": f"mode must be one of {list(LAYOUTING_MODES)}"}, status=400)
+    # Optional anytime mode: return the best layout found within this many milliseconds
+    time_budget_ms = request.data.get("time_budget_ms")
+    if time_budget_ms is not None and (isinstance(time_budget_ms, bool) or not isinstance(time_budget_ms, (int, float))
+                                       or time_budget_ms <= 0):
+        print(f"[Layouting][View] ERROR: invalid time_budget_ms {time_budget_ms}")
+        return Response({"error": "time_budget_ms must be a positive number"}, status=400)
+    # "objects" (default) or "columnar", see response_stream
+    layout_format = request.data.get("format", "objects")
+    if layout_format not in LAYOUT_FORMATS:
+        print(f"[Layouting][View] ERROR: unknown format {layout_format}")
+        return Response({"error": f"format must be one of {list(LAYOUT_FORMATS)}"}, status=400)
+    # Optional: send the JSON in chunks as it is encoded
+    stream = request.data.get("stream", False)
+    if not isinstance(stream, bool):
+        print(f"[Layouting][View] ERROR: invalid stream {stream}")
+        return Response({"error": "stream must be a boolean"}, status=400)
 
     try:
         do_count = len(shipment_data.keys()) if isinstance(shipment_data, dict) else -1
         total_boxes = sum(sum(v[-1] for v in do_map.values()) for do_map in shipment_data.values()) if isinstance(shipment_data, dict) else -1
-        print(f"[Layouting][View] INPUT shipment_id={shipment_id} shipment_num={shipment_num} container={selected_container} DOs={do_count} boxes={total_boxes}")
+        print(f"[Layouting][View] INPUT shipment_id={shipment_id} shipment_num={shipment_num} container={selected_container} mode={mode} budgetMs={time_budget_ms} format={layout_format} stream={stream} DOs={do_count} boxes={total_boxes}")
     except Exception as e:
         print(f"[Layouting][View] INPUT summary error: {e}")
 
     algo_start = time.time()
-    result = run_layouting_algorithm(shipment_data, selected_container, shipment_id, shipment_num)
+    cache = get_layout_cache()
+    if cache is not None:
+        result = cache.layout(shipment_data, selected_container, shipment_id, shipment_num, seed=seed, mode=mode,
+                              time_budget_ms=time_budget_ms)
+    else:
+        # A streamed response formats the boxes while it is sent
+        result = run_layouting_algorithm(shipment_data, selected_container, shipment_id, shipment_num, seed=seed, mode=mode,
+                                         time_budget_ms=time_budget_ms, lazy_layout=stream)
     algo_dur = time.time() - algo_start
 
-    t_total = time.time() - t0
-    # Compute response size for observability
-    try:
-        import json
-        size_bytes = len(json.dumps(result).encode('utf-8'))
-    except Exception:
-        size_bytes = -1
-    print(f"[Layouting][View] DONE shipment_id={shipment_id} algoMs={algo_dur*1000:.0f} totalMs={t_total*1000:.0f} respBytes={size_bytes}")
-    try:
-        import sys
-        sys.stdout.flush()
-    except Exception:
-        pass
+    def done(size_bytes):
+        t_total = time.time() - t0
+        print(f"[Layouting][View] DONE shipment_id={shipment_id} algoMs={algo_dur*1000:.0f} totalMs={t_total*1000:.0f} respBytes={size_bytes}")
+        try:
+            sys.stdout.flush()
+        except Exception:
+            pass
 
-    return Response(result)
+    # Satu kali encode; ukuran response dihitung dari chunk yang dikirim
+    chunks = iter_result_json(result, layout_format)
+    if stream:
+        return StreamingHttpResponse(counted(chunks, done), content_type="application/json")
+    body = b"".join(chunks)
+    done(len(body))
+    return HttpResponse(body, content_type="application/json")
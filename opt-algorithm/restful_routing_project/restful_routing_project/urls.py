@@ -23,5 +23,9 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/load/testing', routing_app.views.testing),
     path('api/priority', routing_app.views.priority_optimization),
+    path('api/priority/jobs', routing_app.views.submit_priority_job),
+    path('api/priority/jobs/<str:job_id>', routing_app.views.priority_job),
+    path('api/priority/jobs/<str:job_id>/result', routing_app.views.priority_job_result),
+    path('api/cache/stats', routing_app.views.cache_stats),
     path('api/layouting', layouting_app.views.layouting_boxes), 
 ]
@@ -12,6 +12,10 @@ AIRFLOW_URL = os.getenv('AIRFLOW_URL', 'http://localhost:8080')
 AIRFLOW_USER = os.getenv('AIRFLOW_USER', 'admin')
 AIRFLOW_PASS = os.getenv('AIRFLOW_PASS', 'admin')
 DAG_ID = '03_inference_pipeline'
+# DAG that accepts conf {"pairs": [{"origin": ..., "dest": ...}, ...]} and writes
+# {dag_run_id}/emissions_batch.json (see minio_client.get_inference_result).
+# DAG_ID implements neither, so batch requests need this set explicitly.
+BATCH_DAG_ID = os.getenv('AIRFLOW_BATCH_DAG_ID')
 
 def get_auth_header():
     credentials = f"{AIRFLOW_USER}:{AIRFLOW_PASS}"
@@ -44,6 +48,65 @@ def trigger_inference(origin, dest):
         logger.error(f"[trigger_inference] Trigger failed for {origin}->{dest}: {e}")
         return None
 
+def trigger_batch_inference(pairs):
+    """
+    Triggers one inference DAG run for a list of (origin, dest) "lat, lon" string pairs.
+    Returns: dag_run_id or None if failed
+    """
+    logger.info(f"[trigger_batch_inference] Triggering DAG for {len(pairs)} OD pairs")
+    url = f"{AIRFLOW_URL}/api/v1/dags/{BATCH_DAG_ID}/dagRuns"
+    payload = {
+        "conf": {
+            "pairs": [{"origin": origin, "dest": dest} for origin, dest in pairs]
+        }
+    }
+
+    try:
+        response = requests.post(url, headers=get_auth_header(), json=payload)
+        response.raise_for_status()
+        dag_run_id = response.json()['dag_run_id']
+        logger.info(f"[trigger_batch_inference] Successfully triggered DAG run: {dag_run_id}")
+        return dag_run_id
+    except Exception as e:
+        logger.error(f"[trigger_batch_inference] Trigger failed for {len(pairs)} pairs: {e}")
+        return None
+
+def get_dag_run_state(dag_run_id, dag_id=DAG_ID):
+    """
+    Returns the Airflow state of a DAG run ('queued', 'running', 'success', 'failed', ...)
+    or None when the API call fails.
+    """
+    import urllib.parse
+    url = f"{AIRFLOW_URL}/api/v1/dags/{dag_id}/dagRuns/{urllib.parse.quote(dag_run_id)}"
+    try:
+        response = requests.get(url, headers=get_auth_header())
+        if response.status_code == 200:
+            return response.json()['state']
+        logger.warning(f"[get_dag_run_state] Poll failed status={response.status_code}")
+    except Exception as e:
+        logger.warning(f"[get_dag_run_state] Poll exception: {e}")
+    return None
+
+def wait_for_dag_run(dag_run_id, get_state=None, timeout=300, initial_delay=0.5, max_delay=10, backoff=1.5):
+    """
+    Polls a DAG run with exponential backoff until success or failure.
+    Returns: 'success', 'failed', or 'timeout'
+    """
+    get_state = get_state or get_dag_run_state
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        state = get_state(dag_run_id)
+        if state in ['success', 'failed']:
+            logger.info(f"[wait_for_dag_run] DAG run {dag_run_id} completed with state: {state}")
+            return state
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.error(f"[wait_for_dag_run] Timeout after {timeout}s for {dag_run_id}")
+            return 'timeout'
+        time.sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_delay)
+
 def poll_dag_run(dag_run_id, max_retries=60, delay=2):
     """
     Polls the DAG run status until success or failure.
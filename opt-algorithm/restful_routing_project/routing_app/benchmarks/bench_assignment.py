@@ -0,0 +1,112 @@
+"""
+Benchmark the prioritization and truck-assignment stage of /api/priority.
+Run this from the project root: python -m routing_app.benchmarks.bench_assignment [--orders 5000] [--trucks 50]
+
+Compares the row-wise pandas implementation (apply/iterrows with masked writes)
+with the array-based one in views, and checks both produce the same assignment.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restful_routing_project.settings')
+
+import django
+
+django.setup()
+
+from routing_app.benchmarks.bench_distance_matrix import timed
+from routing_app.helper import geodesic_distance
+from routing_app.models import Truck
+from routing_app.views import assign_orders_to_truck, prioritize_orders
+
+WAREHOUSE = [-6.2, 106.8]
+
+
+def random_orders(n_orders, seed=0):
+    """Orders over greater Jakarta, about two orders per destination."""
+    rng = np.random.default_rng(seed)
+    n_locations = max(1, n_orders // 2)
+    locations = rng.uniform([-6.6, 106.4], [-5.9, 107.2], size=(n_locations, 2))
+    dest = rng.integers(0, n_locations, n_orders)
+    return pd.DataFrame({
+        'id': np.arange(1, n_orders + 1),
+        'loc_dest_id': dest,
+        'latitude': locations[dest, 0],
+        'longitude': locations[dest, 1],
+        'demand': rng.uniform(0.01, 0.6, n_orders),
+    })
+
+
+def random_trucks(n_trucks, seed=0):
+    rng = np.random.default_rng(seed)
+    capacities = sorted(rng.uniform(5, 40, n_trucks).tolist(), reverse=True)
+    return [Truck(id=100 + i, max_individual_capacity_volume=capacity, current_volume=0.0)
+            for i, capacity in enumerate(capacities)]
+
+
+def legacy_prioritize(df, warehouse, priority):
+    """The row-wise implementation this stage replaced (balance priority only)."""
+    df['distance_from_origin'] = df.apply(lambda row: geodesic_distance((row['latitude'], row['longitude']), warehouse), axis=1)
+    df['relative_position'] = df['longitude'].apply(lambda x: '+' if x > warehouse[1] else '-')
+    df['truck_id'] = -1
+    df[['distance_from_origin', 'demand_scaled']] = MinMaxScaler().fit_transform(df[['distance_from_origin', 'demand']])
+
+    def balance(row):
+        priority_value = 0.5 * row['demand_scaled'] + 0.5 * row['distance_from_origin']
+        return priority_value if row['relative_position'] == '+' else -priority_value
+    df['priority'] = df.apply(balance, axis=1)
+    df_positive = df[df['priority'] >= 0].sort_values(by='priority', ascending=False)
+    df_negative = df[df['priority'] < 0].sort_values(by='priority', ascending=True)
+    return pd.concat([df_positive, df_negative])
+
+
+def legacy_assign(df_sorted, trucks):
+    for truck in trucks:
+        for _, order_location in df_sorted[df_sorted['truck_id'] == -1].iterrows():
+            order_total_volume = float(order_location['demand'])
+            if order_total_volume <= truck.get_avaiable_capacity():
+                df_sorted.loc[(df_sorted['id'] == order_location['id']), 'truck_id'] = truck.get_id()
+                truck.add_new_order(order_total_volume)
+    return df_sorted
+
+
+def vectorized_assign(df_sorted, trucks):
+    for truck in trucks:
+        if (df_sorted['truck_id'] == -1).any():
+            assign_orders_to_truck(df_sorted, truck)
+    return df_sorted
+
+
+def run(n_orders, n_trucks):
+    orders = random_orders(n_orders)
+    print(f"{n_orders} orders, {n_trucks} trucks")
+    print(f"{'stage':<14} {'legacy (s)':>11} {'vectorized (s)':>15} {'speedup':>8}")
+
+    legacy_prio_t, legacy_sorted = timed(legacy_prioritize, orders.copy(), WAREHOUSE, 'balance')
+    new_prio_t, new_sorted = timed(prioritize_orders, orders.copy(), WAREHOUSE, 'balance')
+    pd.testing.assert_frame_equal(legacy_sorted, new_sorted, check_exact=True)
+    print(f"{'prioritize':<14} {legacy_prio_t:11.3f} {new_prio_t:15.4f} {legacy_prio_t / new_prio_t:7.0f}x")
+
+    legacy_trucks, new_trucks = random_trucks(n_trucks), random_trucks(n_trucks)
+    legacy_assign_t, legacy_assigned = timed(legacy_assign, legacy_sorted.copy(), legacy_trucks)
+    new_assign_t, new_assigned = timed(vectorized_assign, new_sorted.copy(), new_trucks)
+    assert legacy_assigned['truck_id'].tolist() == new_assigned['truck_id'].tolist()
+    assert [t.get_current_capacity() for t in legacy_trucks] == [t.get_current_capacity() for t in new_trucks]
+    print(f"{'assign':<14} {legacy_assign_t:11.3f} {new_assign_t:15.4f} {legacy_assign_t / new_assign_t:7.0f}x")
+    print(f"assigned {int((new_assigned['truck_id'] != -1).sum())}/{n_orders} orders, identical to legacy")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=5000)
+    parser.add_argument('--trucks', type=int, default=50)
+    args = parser.parse_args()
+    run(args.orders, args.trucks)
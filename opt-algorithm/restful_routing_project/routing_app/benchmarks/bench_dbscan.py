@@ -0,0 +1,118 @@
+"""
+Benchmark the clustering pass of dbscan_cluster: legacy full scans vs the BallTree index.
+Run this from the project root: python -m routing_app.benchmarks.bench_dbscan [--sizes 500 2000 10000]
+
+The legacy pass scans every unvisited node for neighbors, recomputes the distance
+to the last cluster for all nodes on every iteration and re-sums the whole
+cluster's travel time (geopy) for every candidate. Both passes must give the same
+clusters and noise; the legacy one is skipped above --legacy-max points.
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import time as clock
+
+import numpy as np
+import pandas as pd
+from geopy.distance import geodesic
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routing_app.distance_matrix import distance_matrix, distances_from
+from routing_app.helper import available_delivery_times, density_clusters
+
+EPS, MIN_SAMPLES = 25000, 5
+
+
+def delivery_points(n, seed=0):
+    """Delivery points around Jakarta: 85% around n // 15 centers, the rest uniform."""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform([-6.5, 106.5], [-5.9, 107.1], size=(max(2, n // 15), 2))
+    clustered = rng.random(n) < 0.85
+    coords = np.where(clustered[:, None], centers[rng.integers(0, len(centers), n)] + rng.normal(0, 0.05, (n, 2)),
+                      rng.uniform([-7.0, 106.0], [-5.4, 107.6], size=(n, 2)))
+    return pd.DataFrame({
+        'latitude': coords[:, 0], 'longitude': coords[:, 1],
+        'quantity': rng.integers(1, 21, n), 'volume': rng.uniform(0.5, 40.0, n).round(2),
+        'service_time': rng.choice([10.0, 15.0, 20.0, 30.0], n),
+        'open_hour': [clock(int(h)) for h in rng.choice([7, 8, 9, 10], n)],
+        'close_hour': [clock(int(h)) for h in rng.choice([15, 16, 17, 18], n)],
+    })
+
+
+def legacy_travel_time(data, node1, node2):
+    distance = geodesic((data[node1][0], data[node1][1]), (data[node2][0], data[node2][1])).kilometers
+    speed = 15 if distance < 10 else 30 if distance < 50 else 40
+    return (distance / speed) * 60
+
+
+def legacy_can_add(cluster, node, service_times, available_times, data):
+    total_service_time = sum(service_times[c] for c in cluster) + service_times[node]
+    total_delivery_time = 0
+    if cluster:
+        total_delivery_time = sum(legacy_travel_time(data, cluster[i], cluster[i + 1]) for i in range(len(cluster) - 1))
+        total_delivery_time += legacy_travel_time(data, cluster[-1], node)
+    return total_service_time + total_delivery_time <= available_times[node]
+
+
+def legacy_density_clusters(coords, data, dist_to_warehouse, eps, min_samples, service_times, available_times):
+    """The clustering loop of dbscan_cluster before the spatial index."""
+    unvisited = set(range(len(coords)))
+    clusters, noise_nodes, core_points = [], [], []
+    while unvisited:
+        if not clusters:
+            X1 = max(unvisited, key=lambda i: dist_to_warehouse[i])
+        else:
+            dist_to_core = distance_matrix(coords, coords[core_points], method='vincenty', dtype=np.float64).min(axis=1)
+            X1 = max(unvisited, key=lambda i: dist_to_core[i])
+        dist = distances_from(coords[X1], coords)
+        neighbors = [i for i in unvisited if i != X1 and dist[i] <= eps]
+        if len(neighbors) >= min_samples:
+            current_cluster = []
+            unvisited.remove(X1)
+            for node in [X1] + neighbors:
+                if legacy_can_add(current_cluster, node, service_times, available_times, data):
+                    current_cluster.append(node)
+                    unvisited.discard(node)
+            clusters.append(current_cluster)
+            core_points = current_cluster
+        else:
+            noise_nodes.append(X1)
+            unvisited.remove(X1)
+    return clusters, noise_nodes
+
+
+def clustering_inputs(df, warehouse=(-6.2, 106.8)):
+    data = np.column_stack([df['latitude'], df['longitude'], df['quantity'] * df['volume']])
+    coords = data[:, :2]
+    return (coords, data, distances_from(np.array([warehouse]), coords), EPS, MIN_SAMPLES,
+            df['service_time'].to_numpy(), available_delivery_times(df))
+
+
+def run(sizes, legacy_max):
+    print(f"{'points':>7} {'legacy (s)':>11} {'indexed (s)':>12} {'speedup':>8} {'clusters':>9} {'noise':>6} {'same':>5}")
+    for n in sizes:
+        inputs = clustering_inputs(delivery_points(n, seed=n))
+        start = time.perf_counter()
+        clusters, _, noise_nodes, _ = density_clusters(*inputs)
+        indexed_t = time.perf_counter() - start
+        if n <= legacy_max:
+            start = time.perf_counter()
+            legacy = legacy_density_clusters(*inputs)
+            legacy_t = time.perf_counter() - start
+            legacy_str, speedup = f"{legacy_t:11.2f}", f"{legacy_t / indexed_t:7.0f}x"
+            same = str(legacy == (clusters, noise_nodes))
+        else:
+            legacy_str, speedup, same = f"{'skipped':>11}", f"{'-':>8}", '-'
+        print(f"{n:>7} {legacy_str} {indexed_t:12.2f} {speedup} {len(clusters):>9} {len(noise_nodes):>6} {same:>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 10000])
+    parser.add_argument('--legacy-max', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max)
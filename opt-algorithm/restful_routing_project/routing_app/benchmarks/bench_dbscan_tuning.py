@@ -0,0 +1,78 @@
+"""
+Benchmark DBSCAN parameter tuning: serial gp_minimize with per-fit distances vs tune_dbscan and the stored lookup.
+Run this from the project root: python -m routing_app.benchmarks.bench_dbscan_tuning [--sizes 500 2000 6000]
+
+The legacy search is get_eps_and_min_samples as it was, with DBSCAN on the
+vincenty distances (m) instead of raw degrees so both searches solve the same
+problem: every one of the 60 calls recomputes the distance matrix and scores a
+full silhouette. The stored lookup is dbscan_parameters for a DC tuned before.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.metrics import silhouette_score
+from skopt import gp_minimize
+from skopt.utils import use_named_args
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routing_app.benchmarks.bench_dbscan import delivery_points
+from routing_app.cache_store import SqliteCache
+from routing_app.dbscan_tuning import DbscanParameterStore, dbscan_parameters, search_space, tune_dbscan
+from routing_app.distance_matrix import distance_matrix
+
+
+def legacy_tuning(coords):
+    space = search_space()
+
+    @use_named_args(space)
+    def objective(eps, min_samples):
+        distances = distance_matrix(coords, method='vincenty', dtype=np.float32)
+        labels = DBSCAN(eps=eps, min_samples=min_samples, metric='precomputed').fit_predict(distances)
+        if len(set(labels)) < 2:
+            return 1
+        try:
+            return -silhouette_score(distances, labels, metric='precomputed')
+        except ValueError:
+            return 1
+
+    res = gp_minimize(objective, space, n_calls=60, random_state=0)
+    return res.x[0], res.x[1], res.fun
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, legacy_max):
+    print(f"{'points':>7} {'legacy (s)':>11} {'silhouette':>11} {'tuned (s)':>10} {'silhouette':>11} "
+          f"{'stored (ms)':>12} {'eps':>8} {'min_samples':>12}")
+    for n in sizes:
+        coords = delivery_points(n, seed=n)[['latitude', 'longitude']].to_numpy()
+        if n <= legacy_max:
+            legacy, legacy_t = timed(legacy_tuning, coords)
+            legacy_str = f"{legacy_t:11.2f} {-legacy[2]:11.3f}"
+        else:
+            legacy_str = f"{'skipped':>11} {'-':>11}"
+        (eps, min_samples, score), tuned_t = timed(tune_dbscan, coords)
+
+        store = DbscanParameterStore(SqliteCache(':memory:', 'dbscan_parameters'))
+        store.put('bench', coords, eps, min_samples, score)
+        _, stored_t = timed(dbscan_parameters, coords, 'bench', store)
+        print(f"{n:>7} {legacy_str} {tuned_t:10.2f} {-score:11.3f} {stored_t * 1000:12.1f} {eps:8.0f} {min_samples:>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 6000])
+    parser.add_argument('--legacy-max', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max)
@@ -0,0 +1,66 @@
+"""
+Benchmark distance-matrix construction: legacy geopy/cdist path vs the vectorized engine.
+Run this from the project root: python -m routing_app.benchmarks.bench_distance_matrix [--sizes 50 200 1000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routing_app.distance_matrix import distance_matrix
+from routing_app.helper import geodesic_distance
+
+
+def legacy_distance_matrix(coords, batch_size=10):
+    """The pre-vectorization path: cdist with a geopy lambda over 10-row batches."""
+    n = len(coords)
+    out = np.zeros((n, n))
+    for i in range(0, n, batch_size):
+        for j in range(0, n, batch_size):
+            out[i:i + batch_size, j:j + batch_size] = cdist(
+                coords[i:i + batch_size], coords[j:j + batch_size], lambda u, v: geodesic_distance(u, v))
+    return out.tolist()
+
+
+def random_stops(n, seed=0):
+    """Random stops spread over greater Jakarta."""
+    rng = np.random.default_rng(seed)
+    return rng.uniform([-6.6, 106.4], [-5.9, 107.2], size=(n, 2))
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run(sizes, legacy_max):
+    print(f"{'stops':>6} {'legacy (s)':>12} {'haversine (s)':>14} {'vincenty (s)':>13} {'speedup':>9} {'hav err %':>10}")
+    for n in sizes:
+        coords = random_stops(n)
+        hav_t, hav = timed(distance_matrix, coords, method='haversine')
+        vin_t, vin = timed(distance_matrix, coords, method='vincenty')
+        mask = vin > 0
+        hav_err = float(np.max(np.abs(hav[mask] - vin[mask]) / vin[mask]) * 100) if mask.any() else 0.0
+        if n <= legacy_max:
+            legacy_t, _ = timed(legacy_distance_matrix, coords)
+            legacy_str, speedup = f"{legacy_t:12.3f}", f"{legacy_t / hav_t:8.0f}x"
+        else:
+            legacy_str, speedup = f"{'skipped':>12}", f"{'-':>9}"
+        print(f"{n:>6} {legacy_str} {hav_t:14.4f} {vin_t:13.4f} {speedup} {hav_err:10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--legacy-max', type=int, default=1000,
+                        help='skip the legacy path above this many stops (it is O(n^2) geopy calls)')
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max)
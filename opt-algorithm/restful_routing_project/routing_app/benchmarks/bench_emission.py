@@ -0,0 +1,85 @@
+"""
+Benchmark emission-matrix computation against the local Airflow/MinIO stand-in.
+Run this from the project root: python -m routing_app.benchmarks.bench_emission [--stops 8 20] [--run-latency 0.2]
+
+Compares the legacy serial loop (trigger, fixed-interval poll, fetch for every pair)
+with concurrent per-pair DAG runs and batched DAG runs, and times a repeat request
+answered by a warm emission cache.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routing_app.benchmarks.bench_distance_matrix import random_stops, timed
+from routing_app.cache_store import SqliteCache
+from routing_app.emission_cache import EmissionCache
+from routing_app.emission_service import LocalEmissionBackend, compute_emissions
+
+
+def od_pairs(coords):
+    return [(f"{o[0]},{o[1]}", f"{d[0]},{d[1]}") for i, o in enumerate(coords) for j, d in enumerate(coords) if i != j]
+
+
+def legacy_serial(pairs, backend, poll_interval):
+    """The pre-batching loop: one DAG run per pair, each awaited before the next is triggered."""
+    rates = []
+    for pair in pairs:
+        dag_run_id = backend.submit([pair], False)
+        while backend.state(dag_run_id) not in ('success', 'failed'):
+            time.sleep(poll_interval)
+        rates.extend(backend.results(dag_run_id, [pair], False))
+    return rates
+
+
+def run(stops, run_latency, per_pair_latency, poll_interval, legacy_max, batch_size, workers):
+    print(f"simulated DAG run: {run_latency}s + {per_pair_latency}s/pair, legacy poll interval {poll_interval}s")
+    print(f"{'stops':>6} {'pairs':>6} {'legacy (s)':>11} {'pair x{0} (s)'.format(workers):>14} "
+          f"{'batch (s)':>10} {'runs':>5} {'speedup':>8} {'warm cache (s)':>15}")
+    for n in stops:
+        pairs = od_pairs(random_stops(n))
+
+        def backend():
+            return LocalEmissionBackend(run_latency=run_latency, per_pair_latency=per_pair_latency)
+
+        pair_t, pair_rates = timed(compute_emissions, pairs, backend=backend(), mode='pair', max_workers=workers,
+                                 cache=False)
+        batch_backend = backend()
+        batch_t, batch_rates = timed(compute_emissions, pairs, backend=batch_backend, mode='batch',
+                                     batch_size=batch_size, max_workers=workers, cache=False)
+        assert pair_rates == batch_rates
+        if n <= legacy_max:
+            legacy_t, legacy_rates = timed(legacy_serial, pairs, backend(), poll_interval)
+            assert legacy_rates == batch_rates
+            legacy_str, speedup = f"{legacy_t:11.2f}", f"{legacy_t / batch_t:7.0f}x"
+        else:
+            estimate = len(pairs) * (run_latency + per_pair_latency + poll_interval / 2)
+            legacy_str, speedup = f"{'~%.0f' % estimate:>11}", f"{'~%.0fx' % (estimate / batch_t):>8}"
+
+        cache = EmissionCache(SqliteCache(':memory:', 'emission_pairs'))
+        cached_backend = backend()
+        compute_emissions(pairs, backend=cached_backend, cache=cache)
+        cold_runs = cached_backend.runs_submitted
+        cached_t, _ = timed(compute_emissions, pairs, backend=cached_backend, cache=cache)
+        assert cached_backend.runs_submitted == cold_runs
+        print(f"{n:>6} {len(pairs):>6} {legacy_str} {pair_t:14.2f} {batch_t:10.2f} "
+              f"{batch_backend.runs_submitted:>5} {speedup} {cached_t:15.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--stops', type=int, nargs='+', default=[8, 20, 50])
+    parser.add_argument('--run-latency', type=float, default=0.2, help='simulated seconds per DAG run')
+    parser.add_argument('--per-pair-latency', type=float, default=0.001, help='simulated seconds per OD pair')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='legacy fixed poll interval')
+    parser.add_argument('--legacy-max', type=int, default=10,
+                        help='estimate instead of running the legacy loop above this many stops')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+    run(args.stops, args.run_latency, args.per_pair_latency, args.poll_interval,
+        args.legacy_max, args.batch_size, args.workers)
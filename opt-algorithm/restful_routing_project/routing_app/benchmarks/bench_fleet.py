@@ -0,0 +1,93 @@
+"""
+Benchmark /api/priority in per-truck mode against fleet mode (one OR-Tools model for all trucks).
+Run this from the project root: python -m routing_app.benchmarks.bench_fleet [--cases 50x3 150x8 300x12]
+
+Runs offline: caches are disabled, emissions come from the local stand-in and legs
+from the offline directions provider.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restful_routing_project.settings')
+for name in ('MATRIX_CACHE_ENABLED', 'EMISSION_CACHE_ENABLED', 'ROUTE_CACHE_ENABLED'):
+    os.environ[name] = 'false'
+os.environ['EMISSION_BACKEND'] = 'local'
+os.environ.pop('GOOGLE_MAPS_API_KEY', None)
+os.environ.pop('API_KEY', None)
+
+import django
+
+django.setup()
+
+from django.test import Client
+
+WAREHOUSE = (-6.2, 106.8)
+
+
+def random_payload(n_orders, n_trucks, seed=0, priority='balance'):
+    """/api/priority request body with about two orders per destination."""
+    rng = np.random.default_rng(seed)
+    n_locations = max(1, n_orders // 2)
+    locations = []
+    for i in range(n_locations):
+        open_hour, close_hour = int(rng.integers(7, 11)), int(rng.integers(14, 20))
+        locations.append({
+            "id": 1000 + i, "address": f"Customer {i}",
+            "latitude": float(rng.uniform(-6.4, -6.0)), "longitude": float(rng.uniform(106.6, 107.0)),
+            "open_hour": f"0001-01-01T{open_hour:02d}:00:00.000Z",
+            "close_hour": f"0001-01-01T{close_hour:02d}:00:00.000Z",
+            "service_time": float(rng.integers(5, 20)),
+        })
+    orders = []
+    for i in range(n_orders):
+        lines = [{"quantity": int(rng.integers(1, 10)), "volume": float(rng.uniform(0.001, 0.05))}
+                 for _ in range(int(rng.integers(1, 4)))]
+        orders.append({"id": i + 1, "delivery_order_num": f"DO-{i}", "ProductLine": lines,
+                       "loc_dest": {"id": locations[int(rng.integers(0, n_locations))]["id"]}})
+    trucks = [{"id": 500 + t, "plate_number": f"B {t}", "type_id": 1, "dc_id": 1, "truck_type": {"name": "CDE"},
+               "max_individual_capacity_volume": float(rng.uniform(1, 6)), "current_volume": 0}
+              for t in range(n_trucks)]
+    origin = [{"id": 1, "address": "DC", "latitude": WAREHOUSE[0], "longitude": WAREHOUSE[1],
+               "open_hour": "0001-01-01T08:00:00.000Z", "close_hour": "0001-01-01T20:00:00.000Z", "service_time": 0}]
+    return {"trucks": trucks, "dest_location": locations, "ori_location": origin,
+            "delivery_orders": orders, "priority": priority}
+
+
+def post(payload):
+    start = time.perf_counter()
+    response = Client().post('/api/priority', data=json.dumps(payload), content_type='application/json')
+    assert response.status_code == 200, response.content[:500]
+    return time.perf_counter() - start, response.json()
+
+
+def served(shipment):
+    return sum(len(entry['delivery_orders']) for entry in shipment if entry['id_truck'] != -1)
+
+
+def run(cases):
+    post(random_payload(10, 1))  # warm up imports and OR-Tools
+    print(f"{'orders':>6} {'trucks':>6} {'per-truck (s)':>14} {'served':>7} {'fleet (s)':>10} {'served':>7}")
+    for n_orders, n_trucks in cases:
+        payload = random_payload(n_orders, n_trucks)
+        per_truck_t, per_truck = post({**payload, "mode": "per_truck"})
+        fleet_t, fleet = post({**payload, "mode": "fleet"})
+        print(f"{n_orders:>6} {n_trucks:>6} {per_truck_t:14.2f} {served(per_truck):>7} "
+              f"{fleet_t:10.2f} {served(fleet):>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', nargs='+', default=['50x3', '150x8', '300x12'],
+                        help='ORDERSxTRUCKS')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    run([tuple(int(v) for v in case.split('x')) for case in args.cases])
@@ -0,0 +1,134 @@
+"""
+Benchmark nearest_neighbor_vrptw: the legacy per-candidate pandas scan vs the array version.
+Run this from the project root: python -m routing_app.benchmarks.bench_nearest_neighbor [--sizes 50 200 1000]
+
+The legacy scan reads every unvisited candidate's window with locations.iloc and
+builds datetimes for it at every step (its prints are discarded). Both versions
+must return the same route, ETAs and totals; the legacy one is skipped above
+--legacy-max locations.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from datetime import time as clock
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routing_app.distance_matrix import distance_matrix
+from routing_app.nearest_neighbor import nearest_neighbor_vrptw
+
+
+def stops(n, seed=0):
+    """Stops over greater Jakarta with 3-10 hour windows, matrices in meters and seconds."""
+    rng = np.random.default_rng(seed)
+    coords = rng.uniform([-6.6, 106.4], [-5.9, 107.2], size=(n, 2))
+    distances = distance_matrix(coords, method='haversine', dtype=np.float64)
+    times = distances / rng.uniform(8.0, 14.0, size=(n, n))
+    open_hours = rng.integers(7, 11, n)
+    locations = pd.DataFrame({
+        'loc_dest_id': np.arange(n) + 1000, 'address': [f"stop {i}" for i in range(n)],
+        'open_hour': [clock(int(h)) for h in open_hours],
+        'close_hour': [clock(int(h)) for h in np.minimum(open_hours + rng.integers(3, 11, n), 23)],
+        'service_time': rng.choice([2.0, 3.0, 5.0], n),
+    })
+    return locations, distances, times
+
+
+def legacy_nearest_neighbor_vrptw(locations, distance_matrix, time_matrix, initial_distance, initial_duration):
+    """nearest_neighbor_vrptw before the array rewrite, logging left out."""
+    location_dest_info = []
+    unvisited = set(range(len(locations)))
+    route, unreachable = [], []
+    total_time = timedelta(seconds=initial_duration)
+    total_time_waiting = total_time
+    total_distance = initial_distance
+    current_time = datetime.combine(datetime.today(), clock(8, 0))
+    service_time = timedelta(minutes=locations.iloc[0]['service_time'])
+
+    first_location = locations.iloc[0]
+    route.append(0)
+    unvisited.remove(0)
+    current_time += timedelta(seconds=initial_duration)
+    open_time = datetime.combine(datetime.today(), locations.iloc[0]['open_hour'])
+    if current_time < open_time:
+        waiting_duration = open_time - current_time
+        total_time_waiting += waiting_duration
+        current_time += waiting_duration
+        print(f"Arrived early at {locations.iloc[0]['address']}. Waiting for {waiting_duration}")
+    location_dest_info.append({"loc_dest_id": first_location['loc_dest_id'], "queue": 1,
+                               "eta": current_time.strftime('%H:%M:%S'), "travel_time": initial_duration / 60,
+                               "travel_distance": initial_distance})
+    current_time += service_time
+    total_time += service_time
+
+    while unvisited:
+        current_index = route[-1]
+        next_index = None
+        min_distance = float('inf')
+        for loc_index in unvisited:
+            travel_distance = distance_matrix[current_index][loc_index]
+            travel_time = timedelta(seconds=time_matrix[current_index][loc_index])
+            arrival_time = current_time + travel_time
+            open_time = datetime.combine(datetime.today(), locations.iloc[loc_index]['open_hour'])
+            close_time = datetime.combine(datetime.today(), locations.iloc[loc_index]['close_hour'])
+            if arrival_time <= close_time and travel_distance < min_distance:
+                if arrival_time < open_time:
+                    waiting_duration = open_time - arrival_time
+                    total_time_waiting += waiting_duration
+                    arrival_time = open_time
+                    print(f"Arrived early at {locations.iloc[loc_index]['address']}. Waiting for {waiting_duration}")
+                    next_index, min_time, min_travel_time, min_distance = loc_index, arrival_time, travel_time, travel_distance
+                if open_time <= arrival_time <= close_time:
+                    next_index, min_time, min_travel_time, min_distance = loc_index, arrival_time, travel_time, travel_distance
+        if next_index is None:
+            unreachable.extend(unvisited)
+            break
+        total_time += min_travel_time
+        total_time_waiting += min_travel_time
+        total_distance += min_distance
+        print(f"Next stop: {locations.iloc[next_index]['address']} at {min_time.strftime('%H:%M:%S')}")
+        location_dest_info.append({"loc_dest_id": locations.iloc[next_index]['loc_dest_id'],
+                                   "queue": len(location_dest_info) + 1, "eta": min_time.strftime('%H:%M:%S'),
+                                   "travel_time": min_travel_time.total_seconds() / 60, "travel_distance": min_distance})
+        current_time = min_time + timedelta(minutes=locations.iloc[next_index]['service_time'])
+        total_time += timedelta(minutes=locations.iloc[next_index]['service_time'])
+        route.append(next_index)
+        unvisited.remove(next_index)
+    return route, unreachable, total_time, total_time_waiting, total_distance, location_dest_info
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, legacy_max):
+    print(f"{'stops':>6} {'legacy (s)':>11} {'arrays (s)':>11} {'speedup':>8} {'routed':>7} {'same':>5}")
+    for n in sizes:
+        inputs = (*stops(n, seed=n), 5000.0, 900.0)
+        result, array_t = timed(nearest_neighbor_vrptw, *inputs)
+        if n <= legacy_max:
+            legacy, legacy_t = timed(legacy_nearest_neighbor_vrptw, *inputs)
+            legacy_str, speedup, same = f"{legacy_t:11.3f}", f"{legacy_t / array_t:7.0f}x", str(legacy == result)
+        else:
+            legacy_str, speedup, same = f"{'skipped':>11}", f"{'-':>8}", '-'
+        print(f"{n:>6} {legacy_str} {array_t:11.3f} {speedup} {len(result[0]):>7} {same:>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--legacy-max', type=int, default=1000)
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max)
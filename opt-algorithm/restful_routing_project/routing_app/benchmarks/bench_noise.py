@@ -0,0 +1,150 @@
+"""
+Benchmark the noise stages of dbscan_cluster: legacy per-pair scans vs the array versions.
+Run this from the project root: python -m routing_app.benchmarks.bench_noise [--sizes 500 2000 10000]
+
+The stages are calculate_gamma2, procenoiseP1, microcluster_fusion and
+procenoiseP2, run on the clusters and noise of density_clusters. The legacy
+stages average geopy distances to every cluster member through df.loc for every
+noise node and recompute centroids and loads for every comparison. Both must
+give the same labels; the legacy ones are skipped above --legacy-max points.
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routing_app.benchmarks.bench_dbscan import clustering_inputs, delivery_points
+from routing_app.helper import (NoiseDistances, available_delivery_times, calculate_gamma1,
+                                calculate_gamma2, density_clusters, microcluster_fusion, procenoiseP1, procenoiseP2)
+
+CAPACITY, MAX_DISTANCE = 1000000, 35000
+
+
+def legacy_distance(coords1, coords2):
+    return geodesic(coords1, coords2).meters
+
+
+def legacy_centroid(cluster, data):
+    return np.mean([data[node][0] for node in cluster]), np.mean([data[node][1] for node in cluster])
+
+
+def legacy_gamma2(noise_nodes, df, clusters):
+    dist_min_sum, dist_2ndmin_sum = 0, 0
+    for noise in noise_nodes:
+        distances = [np.mean([legacy_distance(df.loc[noise, ['latitude', 'longitude']], df.loc[node, ['latitude', 'longitude']])
+                     for node in cluster]) for cluster in clusters]
+        if len(distances) >= 2:
+            dist_min_sum += min(distances)
+            dist_2ndmin_sum += sorted(distances)[1]
+    return dist_2ndmin_sum / dist_min_sum if dist_min_sum > 0 else 1
+
+
+def legacy_p1(clusters, noise_nodes, df, Cnum, capacity, gamma1, gamma2, data, totals):
+    service_times = df['service_time'].to_numpy()
+    available_times = available_delivery_times(df)
+    for X in noise_nodes[:]:
+        min_dist, min_cluster, min_totals = float('inf'), None, None
+        for cluster, cluster_totals in zip(clusters, totals):
+            avg_distance = np.mean([legacy_distance(df.loc[X, ['latitude', 'longitude']], df.loc[node, ['latitude', 'longitude']])
+                                    for node in cluster])
+            if avg_distance < min_dist and cluster_totals.demand + df.at[X, 'demand'] <= capacity * gamma1 and avg_distance < gamma2 * min_dist:
+                if cluster_totals.can_add(X, cluster_totals.leg_time(X, data), service_times, available_times):
+                    min_dist, min_cluster, min_totals = avg_distance, cluster, cluster_totals
+        if min_cluster:
+            min_cluster.append(X)
+            min_totals.add(X, min_totals.leg_time(X, data), service_times, data)
+            df.at[X, 'cluster'] = Cnum
+            noise_nodes.remove(X)
+
+
+def legacy_fusion(clusters, data, capacity, max_distance):
+    fused_clusters = []
+    while clusters:
+        base_cluster = clusters.pop(0)
+        base_demand = sum(data[node][2] for node in base_cluster)
+        base_centroid = legacy_centroid(base_cluster, data)
+        for i, other_cluster in enumerate(clusters):
+            other_demand = sum(data[node][2] for node in other_cluster)
+            if legacy_distance(base_centroid, legacy_centroid(other_cluster, data)) <= max_distance and base_demand + other_demand <= capacity:
+                base_cluster += clusters.pop(i)
+                base_demand += other_demand
+                break
+        fused_clusters.append(base_cluster)
+    return fused_clusters
+
+
+def legacy_p2(fused_clusters, noise_nodes, df, capacity, max_distance, data):
+    for noise in noise_nodes[:]:
+        min_dist, best_cluster = float('inf'), None
+        for cluster in fused_clusters:
+            distance_to_centroid = legacy_distance(legacy_centroid(cluster, data), data[noise][:2])
+            if distance_to_centroid <= max_distance and sum(df.at[node, 'demand'] for node in cluster) + df.at[noise, 'demand'] <= capacity:
+                if distance_to_centroid < min_dist:
+                    min_dist, best_cluster = distance_to_centroid, cluster
+        if best_cluster:
+            best_cluster.append(noise)
+            df.at[noise, 'cluster'] = fused_clusters.index(best_cluster) + 1
+            noise_nodes.remove(noise)
+
+
+def legacy_stages(df, data, clusters, totals, noise_nodes, gamma1):
+    Cnum = len(clusters) + 1
+    gamma2 = legacy_gamma2(noise_nodes, df, clusters)
+    legacy_p1(clusters, noise_nodes, df, Cnum, CAPACITY, gamma1, gamma2, data, totals)
+    legacy_p2(legacy_fusion(clusters, data, CAPACITY, MAX_DISTANCE), noise_nodes, df, CAPACITY, MAX_DISTANCE, data)
+
+
+def array_stages(df, data, clusters, totals, noise_nodes, gamma1):
+    Cnum = len(clusters) + 1
+    distances = NoiseDistances(data[:, :2], noise_nodes, clusters)
+    gamma2 = calculate_gamma2(noise_nodes, df, clusters, distances)
+    procenoiseP1(clusters, noise_nodes, df, Cnum, CAPACITY, gamma1, gamma2, data, totals, distances)
+    procenoiseP2(microcluster_fusion(clusters, data, CAPACITY, MAX_DISTANCE), noise_nodes, df, CAPACITY, MAX_DISTANCE, data)
+
+
+def timed_stages(stages, df, inputs, clustered):
+    """Labels and seconds of ``stages`` on a copy of the density_clusters output."""
+    clusters, totals, noise_nodes, visited_nodes = copy.deepcopy(clustered)
+    df = df.copy()
+    df['cluster'] = np.nan
+    for Cnum, cluster in enumerate(clusters, start=1):
+        df.loc[cluster, 'cluster'] = Cnum
+    gamma1 = calculate_gamma1(visited_nodes, set(range(len(df))), df)
+    start = time.perf_counter()
+    stages(df, inputs[1], clusters, totals, noise_nodes, gamma1)
+    seconds = time.perf_counter() - start
+    df.loc[noise_nodes, 'cluster'] = -1
+    return df['cluster'].fillna(0).tolist(), seconds, len(noise_nodes)
+
+
+def run(sizes, legacy_max):
+    print(f"{'points':>7} {'noise in':>9} {'legacy (s)':>11} {'arrays (s)':>11} {'speedup':>8} {'noise out':>10} {'same':>5}")
+    for n in sizes:
+        df = delivery_points(n, seed=n)
+        df['demand'] = df['quantity'] * df['volume']
+        inputs = clustering_inputs(df)
+        clustered = density_clusters(*inputs)
+        labels, array_t, noise_left = timed_stages(array_stages, df, inputs, clustered)
+        if n <= legacy_max:
+            legacy_labels, legacy_t, _ = timed_stages(legacy_stages, df, inputs, clustered)
+            legacy_str, speedup = f"{legacy_t:11.2f}", f"{legacy_t / array_t:7.0f}x"
+            same = str(legacy_labels == labels)
+        else:
+            legacy_str, speedup, same = f"{'skipped':>11}", f"{'-':>8}", '-'
+        print(f"{n:>7} {len(clustered[2]):>9} {legacy_str} {array_t:11.2f} {speedup} {noise_left:>10} {same:>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 10000])
+    parser.add_argument('--legacy-max', type=int, default=500)
+    args = parser.parse_args()
+    run(args.sizes, args.legacy_max)
@@ -0,0 +1,78 @@
+"""
+Benchmark improve_route against OR-Tools' own local search on one truck's route.
+Run this from the project root: python -m routing_app.benchmarks.bench_route_improvement [--sizes 50 100 200]
+
+Every instance is a single truck with 1-10 hour windows around Jakarta-sized
+distances. Four routes are compared by arc cost (transit seconds, the model's
+objective) and the time it took to get them:
+- nn: nearest_neighbor_routes, the google_or fallback, then improve_route;
+- first: PATH_CHEAPEST_ARC stopped at its first solution, then improve_route;
+- descent: google_or with default parameters (local search to a local optimum);
+- gls: google_or with guided local search for --gls-seconds.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from routing_app.google_or import google_or, nearest_neighbor_routes, transit_seconds
+from routing_app.route_improvement import improve_route
+
+
+def routing_data(n, seed=0):
+    """Depot plus n - 1 stops, times in minutes and windows in minutes of the day."""
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 60, size=(n, 2))
+    times = np.linalg.norm(points[:, None] - points[None], axis=2) * rng.uniform(0.9, 1.3, (n, n))
+    opens = rng.integers(480, 720, n)
+    return {
+        'time_matrix': times,
+        'time_windows': [(480, 480)] + [(int(o), int(o) + int(w)) for o, w in zip(opens[1:], rng.integers(60, 600, n - 1))],
+        'service_times': [0] + rng.choice([2.0, 5.0, 10.0], n - 1).tolist(),
+        'depot': 0,
+        'num_vehicles': 1,
+    }
+
+
+def route_cost(transit, route):
+    """Arc cost and stop count, routes that skip stops are not comparable by cost alone."""
+    return f"{int(transit[[0] + route[:-1], route].sum())}/{len(route) - 1}"
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(sizes, gls_seconds, time_limit):
+    print("Route cost in transit seconds / stops routed, times in seconds")
+    print(f"{'stops':>6} | {'nn':>9} {'+improve':>9} {'s':>6} | {'first':>9} {'+improve':>9} {'s':>6} | "
+          f"{'descent':>9} {'s':>6} | {'gls':>9} {'s':>6}")
+    for n in sizes:
+        data = routing_data(n, seed=n)
+        transit = transit_seconds(data)
+        nn_route = nearest_neighbor_routes(data)[0][0]
+        (nn_improved, _), nn_t = timed(improve_route, data, nn_route, time_limit)
+        first, first_t = timed(google_or, {**data, 'search': {'solution_limit': 1}})
+        (first_improved, _), improve_t = timed(improve_route, data, first['routes'][0], time_limit)
+        descent, descent_t = timed(google_or, data)
+        gls, gls_t = timed(google_or, {**data, 'search': {'guided_local_search': True, 'time_limit_seconds': gls_seconds}})
+        print(f"{n - 1:>6} | {route_cost(transit, nn_route):>9} {route_cost(transit, nn_improved):>9} {nn_t:6.3f} | "
+              f"{route_cost(transit, first['routes'][0]):>9} {route_cost(transit, first_improved):>9} {first_t + improve_t:6.3f} | "
+              f"{route_cost(transit, descent['routes'][0]):>9} {descent_t:6.3f} | {route_cost(transit, gls['routes'][0]):>9} {gls_t:6.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--gls-seconds', type=float, default=2.0)
+    parser.add_argument('--time-limit', type=float, default=0.5, help="improve_route budget per route (s)")
+    args = parser.parse_args()
+    run(args.sizes, args.gls_seconds, args.time_limit)
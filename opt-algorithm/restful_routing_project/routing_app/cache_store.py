@@ -0,0 +1,148 @@
+"""
+Small persistent key/value store on SQLite with TTL, LRU eviction and hit/miss counters.
+Used by the routing caches (distance/time matrices, emissions, route legs).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from .logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / 'cache'
+CACHE_DIR = Path(os.getenv('ROUTING_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+# SQLite limits the number of bound parameters per statement
+_CHUNK = 900
+
+
+def env_flag(name, default=True):
+    return os.getenv(name, 'true' if default else 'false').lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_number(name, default, cast=int):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.warning(f"[cache_store] Invalid value for {name}={value!r}, using {default}")
+        return default
+
+
+class SqliteCache:
+    """
+    JSON values keyed by strings, persisted in one SQLite table.
+
+    Args:
+        path: database file, or ':memory:'
+        table: table name, several caches can share one file
+        ttl_seconds: entries older than this are treated as misses (None = never expire)
+        max_entries: least recently used entries are evicted above this size (None = unbounded)
+    """
+
+    def __init__(self, path, table, ttl_seconds=None, max_entries=None):
+        self.path = str(path)
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if self.path != ':memory:':
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            if self.path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table} ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)')
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)')
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys that are present and fresh."""
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        expired = []
+        with self._lock:
+            for start in range(0, len(keys), _CHUNK):
+                chunk = keys[start:start + _CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, value, created_at FROM {self.table} WHERE key IN ({placeholders})', chunk).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                        expired.append(key)
+                    else:
+                        found[key] = json.loads(value)
+            with self._conn:
+                self._executemany_keys(f'UPDATE {self.table} SET last_access = ? WHERE key IN', list(found), (now,))
+                self._executemany_keys(f'DELETE FROM {self.table} WHERE key IN', expired)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, key, value):
+        self.set_many({key: value})
+
+    def set_many(self, items):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(value), now, now) for key, value in items.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_access) VALUES (?, ?, ?, ?)', rows)
+            self._evict()
+
+    def delete_many(self, keys):
+        with self._lock, self._conn:
+            self._executemany_keys(f'DELETE FROM {self.table} WHERE key IN', list(keys))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f'DELETE FROM {self.table}')
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self),
+        }
+
+    def _executemany_keys(self, statement, keys, params=()):
+        for start in range(0, len(keys), _CHUNK):
+            chunk = keys[start:start + _CHUNK]
+            self._conn.execute(f"{statement} ({','.join('?' * len(chunk))})", (*params, *chunk))
+
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        count = self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN '
+                f'(SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?)', (overflow,))
+            self.evictions += overflow
+            logger.info(f"[SqliteCache] {self.table}: evicted {overflow} least recently used entries")
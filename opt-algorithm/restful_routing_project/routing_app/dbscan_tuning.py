@@ -0,0 +1,174 @@
+"""
+DBSCAN parameter search per distribution center, with the result persisted.
+
+get_eps_and_min_samples used to run 60 gp_minimize calls one after another, each
+fitting DBSCAN on raw latitude/longitude/demand (so eps in 500..25000 spanned
+the whole planet) and scoring a full silhouette. tune_dbscan instead:
+- computes the vincenty distance matrix (m) once and fits every candidate on it
+  with metric='precomputed', so eps is in meters like dbscan_cluster's eps;
+- asks skopt for DBSCAN_TUNING_BATCH candidates at a time and scores them on
+  DBSCAN_TUNING_WORKERS threads sharing that matrix;
+- scores silhouette on at most DBSCAN_SILHOUETTE_SAMPLE points;
+- tunes on a uniform sample of at most DBSCAN_TUNING_MAX_POINTS locations and
+  scales min_samples back up to the full location count.
+
+The best parameters are stored per DC together with the geohash cells of the
+locations they were tuned on, and reused until the Jaccard distance between
+those cells and the current ones exceeds DBSCAN_TUNING_DRIFT.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+from sklearn.metrics import silhouette_score
+from skopt import Optimizer
+from skopt.space import Integer, Real
+
+from .cache_store import CACHE_DIR, SqliteCache, env_flag, env_number
+from .distance_matrix import as_coords, distance_matrix
+from .emission_cache import geohash
+from .logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+DBSCAN_TUNING_ENABLED = env_flag('DBSCAN_TUNING_ENABLED', False)
+DBSCAN_TUNING_PATH = os.getenv('DBSCAN_TUNING_PATH', str(CACHE_DIR / 'routing_cache.sqlite3'))
+DBSCAN_TUNING_TTL_SECONDS = env_number('DBSCAN_TUNING_TTL_SECONDS', 30 * 24 * 3600)
+DBSCAN_TUNING_CALLS = env_number('DBSCAN_TUNING_CALLS', 60)
+DBSCAN_TUNING_BATCH = env_number('DBSCAN_TUNING_BATCH', 4)
+DBSCAN_TUNING_WORKERS = env_number('DBSCAN_TUNING_WORKERS', os.cpu_count() or 1)
+DBSCAN_TUNING_MAX_POINTS = env_number('DBSCAN_TUNING_MAX_POINTS', 3000)
+DBSCAN_SILHOUETTE_SAMPLE = env_number('DBSCAN_SILHOUETTE_SAMPLE', 2000)
+DBSCAN_TUNING_DRIFT = env_number('DBSCAN_TUNING_DRIFT', 0.2, cast=float)
+# Geohash length of the location cells compared for drift: 6 ~ 1.2 km x 0.6 km
+DBSCAN_TUNING_PRECISION = env_number('DBSCAN_TUNING_PRECISION', 6)
+
+ACQUISITION_POINTS = 1000
+
+# Parameters of dbscan_cluster when tuning is disabled
+DEFAULT_EPS, DEFAULT_MIN_SAMPLES = 25000, 5
+
+_parameter_store = None
+
+
+def search_space():
+    return [Real(500, 25000, name='eps'), Integer(1, 40, name='min_samples')]
+
+
+def silhouette_objective(distances, eps, min_samples, sample_size=None, seed=0):
+    """Negated silhouette of DBSCAN(eps, min_samples) on a precomputed distance matrix, 1 when undefined."""
+    labels = DBSCAN(eps=eps, min_samples=min_samples, metric='precomputed').fit_predict(distances)
+    if len(set(labels)) < 2:
+        return 1.0
+    sample_size = sample_size or DBSCAN_SILHOUETTE_SAMPLE
+    try:
+        return -float(silhouette_score(distances, labels, metric='precomputed',
+                                       sample_size=sample_size if len(labels) > sample_size else None,
+                                       random_state=seed))
+    except ValueError:
+        # Every point its own cluster, or a silhouette sample with a single label
+        return 1.0
+
+
+def tune_dbscan(coords, n_calls=None, batch=None, workers=None, max_points=None, sample_size=None, seed=0):
+    """
+    (eps in meters, min_samples, negated silhouette) of the best DBSCAN found for
+    ``coords``, min_samples counting the point itself as sklearn does.
+    """
+    coords = as_coords(coords)
+    n_calls = n_calls or DBSCAN_TUNING_CALLS
+    batch = batch or DBSCAN_TUNING_BATCH
+    max_points = max_points or DBSCAN_TUNING_MAX_POINTS
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(len(coords), max_points, replace=False)) if len(coords) > max_points else np.arange(len(coords))
+    distances = distance_matrix(coords[sample], method='vincenty', dtype=np.float32)
+
+    def objective(point):
+        return silhouette_objective(distances, point[0], point[1], sample_size, seed)
+
+    # On this 2-d space sampling the acquisition function at ACQUISITION_POINTS
+    # points finds as good candidates as lbfgs restarts, at a fraction of the cost
+    optimizer = Optimizer(search_space(), acq_optimizer='sampling',
+                          acq_optimizer_kwargs={'n_points': ACQUISITION_POINTS}, random_state=seed)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers or DBSCAN_TUNING_WORKERS, batch))) as executor:
+        evaluated = 0
+        while evaluated < n_calls:
+            points = optimizer.ask(n_points=min(batch, n_calls - evaluated))
+            optimizer.tell(points, list(executor.map(objective, points)))
+            evaluated += len(points)
+    result = optimizer.get_result()
+    eps, min_samples = result.x
+    # A uniform sample sees len(sample) / len(coords) of every neighborhood
+    return float(eps), max(1, round(int(min_samples) * len(coords) / len(sample))), float(result.fun)
+
+
+class DbscanParameterStore:
+    def __init__(self, store, drift=DBSCAN_TUNING_DRIFT, precision=DBSCAN_TUNING_PRECISION):
+        self.store = store
+        self.drift = drift
+        self.precision = precision
+        self.retuned = 0
+
+    @staticmethod
+    def key(dc_key):
+        return f"dbscan:{dc_key}"
+
+    def cells(self, coords):
+        return sorted({geohash(lat, lon, precision=self.precision) for lat, lon in as_coords(coords).tolist()})
+
+    def get(self, dc_key, coords):
+        """Stored (eps, min_samples) of ``dc_key``, None when missing or tuned on locations that drifted."""
+        entry = self.store.get(self.key(dc_key))
+        if entry is None:
+            return None
+        stored, current = set(entry['cells']), set(self.cells(coords))
+        drift = 1 - len(stored & current) / len(stored | current)
+        if drift > self.drift:
+            self.retuned += 1
+            logger.info(f"[DbscanTuning] {dc_key}: locations drifted {drift:.0%}, retuning")
+            return None
+        return entry['eps'], entry['min_samples']
+
+    def put(self, dc_key, coords, eps, min_samples, score):
+        self.store.set(self.key(dc_key), {'eps': eps, 'min_samples': min_samples, 'score': score,
+                                          'cells': self.cells(coords), 'tuned_at': time.time()})
+
+    def stats(self):
+        return {**self.store.stats(), 'drift': self.drift, 'precision': self.precision, 'retuned': self.retuned}
+
+
+def get_parameter_store():
+    """Process-wide DBSCAN parameter store, or None unless DBSCAN_TUNING_ENABLED=true."""
+    global _parameter_store
+    if not DBSCAN_TUNING_ENABLED:
+        return None
+    if _parameter_store is None:
+        store = SqliteCache(DBSCAN_TUNING_PATH, 'dbscan_parameters', ttl_seconds=DBSCAN_TUNING_TTL_SECONDS)
+        _parameter_store = DbscanParameterStore(store)
+        logger.info(f"[DbscanTuning] Using {DBSCAN_TUNING_PATH} (calls={DBSCAN_TUNING_CALLS}, batch={DBSCAN_TUNING_BATCH}, "
+                    f"workers={DBSCAN_TUNING_WORKERS}, drift={DBSCAN_TUNING_DRIFT}, ttl={DBSCAN_TUNING_TTL_SECONDS}s)")
+    return _parameter_store
+
+
+def dbscan_parameters(coords, dc_key, store=None):
+    """
+    (eps, min_samples) for dbscan_cluster: stored ones for ``dc_key``, tuned and
+    stored when missing or drifted, DEFAULT_EPS/DEFAULT_MIN_SAMPLES when tuning
+    is disabled. dbscan_cluster counts neighbors without the point itself.
+    """
+    store = store or get_parameter_store()
+    if store is None or len(coords) < 2:
+        return DEFAULT_EPS, DEFAULT_MIN_SAMPLES
+    found = store.get(dc_key, coords)
+    if found is not None:
+        return found
+    start = time.time()
+    eps, min_samples, score = tune_dbscan(coords)
+    eps, min_samples = round(eps, 1), max(0, min_samples - 1)
+    store.put(dc_key, coords, eps, min_samples, score)
+    logger.info(f"[DbscanTuning] {dc_key}: eps={eps}, min_samples={min_samples}, silhouette={-score:.3f} "
+                f"({len(coords)} locations, {time.time() - start:.1f}s)")
+    return eps, min_samples
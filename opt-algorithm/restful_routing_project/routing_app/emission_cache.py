@@ -0,0 +1,99 @@
+"""
+Persistent cache of Airflow emission results keyed by geohash-bucketed OD pairs.
+
+Deliveries repeat to the same customers, so an origin/destination pair whose
+endpoints fall in the same geohash cells as an earlier pair reuses that pair's
+"Emission Rate" instead of triggering another DAG run. With
+EMISSION_CACHE_SYMMETRIC (default) A->B and B->A share one entry; turn it off
+when direction matters for the emission model (gradients, one-way detours).
+"""
+
+import os
+
+from .cache_store import CACHE_DIR, SqliteCache, env_flag, env_number
+from .logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+EMISSION_CACHE_ENABLED = env_flag('EMISSION_CACHE_ENABLED', True)
+EMISSION_CACHE_PATH = os.getenv('EMISSION_CACHE_PATH', str(CACHE_DIR / 'routing_cache.sqlite3'))
+EMISSION_CACHE_TTL_SECONDS = env_number('EMISSION_CACHE_TTL_SECONDS', 30 * 24 * 3600)
+EMISSION_CACHE_MAX_ENTRIES = env_number('EMISSION_CACHE_MAX_ENTRIES', 1_000_000)
+# Geohash length: 7 ~ 153 m x 153 m cells, 8 ~ 38 m x 19 m, 9 ~ 5 m x 5 m
+EMISSION_CACHE_PRECISION = env_number('EMISSION_CACHE_PRECISION', 8)
+EMISSION_CACHE_SYMMETRIC = env_flag('EMISSION_CACHE_SYMMETRIC', True)
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+_emission_cache = None
+
+
+def geohash(lat, lon, precision=EMISSION_CACHE_PRECISION):
+    """Standard base32 geohash of a point."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            rng[0] = mid
+        else:
+            bits = bits * 2
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+class EmissionCache:
+    def __init__(self, store, precision=EMISSION_CACHE_PRECISION, symmetric=EMISSION_CACHE_SYMMETRIC):
+        self.store = store
+        self.precision = precision
+        self.symmetric = symmetric
+        self.dag_pairs_saved = 0
+
+    def key(self, origin, dest):
+        """Cache key of an (origin, dest) pair of "lat,lon" strings."""
+        cells = [geohash(*map(float, point.split(',')), precision=self.precision) for point in (origin, dest)]
+        if self.symmetric:
+            cells.sort()
+        return f"gh{self.precision}:{cells[0]}:{cells[1]}"
+
+    def get_many(self, pairs):
+        """'Emission Rate' dicts aligned with ``pairs``, None where not cached."""
+        keys = [self.key(*pair) for pair in pairs]
+        found = self.store.get_many(keys)
+        return [found.get(key) for key in keys]
+
+    def set_many(self, pairs, emission_rates):
+        """Store the resolved rates, None entries are skipped so failures are retried."""
+        items = {self.key(*pair): rate for pair, rate in zip(pairs, emission_rates) if rate is not None}
+        self.store.set_many(items)
+
+    def stats(self):
+        return {**self.store.stats(), 'precision': self.precision, 'symmetric': self.symmetric,
+                'dag_pairs_saved': self.dag_pairs_saved}
+
+
+def get_emission_cache():
+    """Process-wide emission cache, or None when disabled with EMISSION_CACHE_ENABLED=false."""
+    global _emission_cache
+    if not EMISSION_CACHE_ENABLED:
+        return None
+    if _emission_cache is None:
+        store = SqliteCache(EMISSION_CACHE_PATH, 'emission_pairs',
+                            ttl_seconds=EMISSION_CACHE_TTL_SECONDS, max_entries=EMISSION_CACHE_MAX_ENTRIES)
+        _emission_cache = EmissionCache(store)
+        logger.info(f"[EmissionCache] Using {EMISSION_CACHE_PATH} (precision={EMISSION_CACHE_PRECISION}, "
+                    f"symmetric={EMISSION_CACHE_SYMMETRIC}, ttl={EMISSION_CACHE_TTL_SECONDS}s, "
+                    f"max_entries={EMISSION_CACHE_MAX_ENTRIES})")
+    return _emission_cache
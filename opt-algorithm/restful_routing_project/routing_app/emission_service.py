@@ -0,0 +1,227 @@
+"""
+Emission inference for many origin/destination pairs.
+
+'batch' mode sends the OD pairs to Airflow in chunks of EMISSION_BATCH_SIZE, one DAG
+run per chunk, and reads each run's results back from a single MinIO object. It is
+the default only when AIRFLOW_BATCH_DAG_ID names a DAG implementing that contract;
+the pairs of a batch run that fails or returns the wrong number of results are
+retried one DAG run per pair. 'pair' mode keeps the original one-DAG-run-per-pair
+contract. In both modes the runs are triggered up front and polled concurrently
+with exponential backoff. Pairs already in the emission cache (see emission_cache)
+never reach Airflow.
+
+EMISSION_BACKEND=local swaps Airflow/MinIO for an in-process stand-in so the whole
+path can be exercised and benchmarked offline.
+"""
+
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import airflow_client, minio_client
+from .cache_store import env_number
+from .distance_matrix import haversine_matrix
+from .emission_cache import get_emission_cache
+from .logger_utils import get_logger, log_external_call
+
+logger = get_logger(__name__)
+
+EMISSION_BACKEND = os.getenv('EMISSION_BACKEND', 'airflow')
+EMISSION_REQUEST_MODE = os.getenv('EMISSION_REQUEST_MODE', 'batch' if airflow_client.BATCH_DAG_ID else 'pair')
+EMISSION_BATCH_SIZE = env_number('EMISSION_BATCH_SIZE', 500)
+EMISSION_MAX_WORKERS = env_number('EMISSION_MAX_WORKERS', 8)
+EMISSION_TIMEOUT_SECONDS = env_number('EMISSION_TIMEOUT_SECONDS', 600)
+
+
+class AirflowEmissionBackend:
+    """DAG runs on Airflow, results from MinIO."""
+
+    def __init__(self):
+        self._dag_ids = {}
+
+    def submit(self, pairs, batched):
+        if batched:
+            if not airflow_client.BATCH_DAG_ID:
+                logger.error("[AirflowEmissionBackend] Batch requested but AIRFLOW_BATCH_DAG_ID is not set")
+                return None
+            dag_run_id = airflow_client.trigger_batch_inference(pairs)
+            dag_id = airflow_client.BATCH_DAG_ID
+        else:
+            dag_run_id = airflow_client.trigger_inference(*pairs[0])
+            dag_id = airflow_client.DAG_ID
+        if dag_run_id:
+            self._dag_ids[dag_run_id] = dag_id
+        return dag_run_id
+
+    def state(self, dag_run_id):
+        return airflow_client.get_dag_run_state(dag_run_id, dag_id=self._dag_ids.get(dag_run_id, airflow_client.DAG_ID))
+
+    def results(self, dag_run_id, pairs, batched):
+        self._dag_ids.pop(dag_run_id, None)
+        if not batched:
+            return [emission_rate_of(minio_client.get_inference_result(dag_run_id))]
+        data = minio_client.get_inference_result(dag_run_id, filename=minio_client.BATCH_RESULT_FILE)
+        entries = (data or {}).get('results') or []
+        if len(entries) != len(pairs):
+            logger.error(f"[AirflowEmissionBackend] Batch {dag_run_id} returned {len(entries)} results for {len(pairs)} pairs")
+            return None
+        return [emission_rate_of(entry) for entry in entries]
+
+
+class LocalEmissionBackend:
+    """
+    In-process stand-in for Airflow + MinIO.
+
+    A run takes ``run_latency + per_pair_latency * len(pairs)`` seconds, which mimics
+    DAG scheduling overhead plus model time, and at most ``max_active_runs`` runs
+    execute at once like Airflow's per-DAG limit. Emissions are a deterministic
+    function of the haversine distance.
+    """
+
+    CO2_G_PER_KM = 180.0
+
+    def __init__(self, run_latency=0.0, per_pair_latency=0.0, max_active_runs=16, fail_every=0):
+        self.run_latency = run_latency
+        self.per_pair_latency = per_pair_latency
+        self.fail_every = fail_every
+        self.runs_submitted = 0
+        self._runs = {}
+        self._slots = [0.0] * max_active_runs
+        self._lock = threading.Lock()
+
+    def submit(self, pairs, batched):
+        with self._lock:
+            self.runs_submitted += 1
+            dag_run_id = f"local__{self.runs_submitted}"
+            started_at = max(time.monotonic(), heapq.heappop(self._slots))
+            ready_at = started_at + self.run_latency + self.per_pair_latency * len(pairs)
+            heapq.heappush(self._slots, ready_at)
+            failed = bool(self.fail_every) and self.runs_submitted % self.fail_every == 0
+            self._runs[dag_run_id] = (ready_at, failed)
+        return dag_run_id
+
+    def state(self, dag_run_id):
+        ready_at, failed = self._runs[dag_run_id]
+        if time.monotonic() < ready_at:
+            return 'running'
+        return 'failed' if failed else 'success'
+
+    def results(self, dag_run_id, pairs, batched):
+        km = [haversine_matrix(parse_point(origin), parse_point(dest), dtype=np.float64)[0, 0] / 1000
+              for origin, dest in pairs]
+        return [{
+            'CO2(g)': float(d * self.CO2_G_PER_KM),
+            'Fuel(g)': float(d * self.CO2_G_PER_KM / 3.15),
+            'TT(s)': float(d / 30 * 3600),
+        } for d in km]
+
+
+def parse_point(point):
+    """(lat, lon) floats of a "lat,lon" string."""
+    lat, lon = point.split(',')
+    return float(lat), float(lon)
+
+
+def emission_rate_of(result):
+    """'Emission Rate' dict of a DAG result, or None when missing."""
+    if result and 'Emission Rate' in result:
+        return result['Emission Rate']
+    logger.warning(f"[Emission] Result missing 'Emission Rate': {result}")
+    return None
+
+
+_default_backend = None
+
+
+def get_backend():
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = LocalEmissionBackend() if EMISSION_BACKEND == 'local' else AirflowEmissionBackend()
+    return _default_backend
+
+
+def compute_emissions(pairs, backend=None, mode=None, batch_size=None, max_workers=None, timeout=None, cache=None):
+    """
+    'Emission Rate' dicts for a list of (origin, dest) "lat,lon" string pairs.
+
+    The emission cache is consulted first; only pairs it cannot answer are sent to
+    Airflow, once per cache key. ``cache`` defaults to the process-wide
+    EmissionCache, pass False to bypass it.
+
+    Returns a list aligned with ``pairs``; entries are None where the DAG run failed,
+    timed out or returned no result.
+    """
+    if not pairs:
+        return []
+    cache = get_emission_cache() if cache is None else cache
+    if not cache:
+        return _request_emissions(pairs, backend, mode, batch_size, max_workers, timeout)
+
+    results = cache.get_many(pairs)
+    pending = {}
+    for i, (pair, rate) in enumerate(zip(pairs, results)):
+        if rate is None:
+            pending.setdefault(cache.key(*pair), []).append(i)
+    requested = [pairs[indices[0]] for indices in pending.values()]
+    cache.dag_pairs_saved += len(pairs) - len(requested)
+    logger.info(f"[Emission] {len(pairs) - len(requested)}/{len(pairs)} pairs answered by the emission cache")
+    if not requested:
+        return results
+
+    rates = _request_emissions(requested, backend, mode, batch_size, max_workers, timeout)
+    cache.set_many(requested, rates)
+    for indices, rate in zip(pending.values(), rates):
+        for i in indices:
+            results[i] = rate
+    return results
+
+
+def _request_emissions(pairs, backend, mode, batch_size, max_workers, timeout):
+    backend = backend or get_backend()
+    mode = mode or EMISSION_REQUEST_MODE
+    batch_size = batch_size or EMISSION_BATCH_SIZE
+    max_workers = max_workers or EMISSION_MAX_WORKERS
+    timeout = timeout or EMISSION_TIMEOUT_SECONDS
+    batched = mode == 'batch'
+
+    chunks = [pairs[i:i + batch_size] for i in range(0, len(pairs), batch_size)] if batched else [[p] for p in pairs]
+    log_external_call(logger, "Airflow", "compute_emissions", {"pairs": len(pairs), "mode": mode, "dag_runs": len(chunks)})
+
+    start = time.monotonic()
+    chunk_rates = _run_chunks(backend, chunks, batched, max_workers, timeout)
+    failed = [chunk for chunk, rates in zip(chunks, chunk_rates) if rates is None]
+    if batched and failed:
+        retried = [pair for chunk in failed for pair in chunk]
+        logger.error(f"[Emission] {len(failed)}/{len(chunks)} batch DAG runs failed, retrying their {len(retried)} pairs "
+                     f"one DAG run per pair")
+        pair_rates = iter(_run_chunks(backend, [[pair] for pair in retried], False, max_workers, timeout))
+        chunk_rates = [rates if rates is not None else [(next(pair_rates) or [None])[0] for _ in chunk]
+                       for chunk, rates in zip(chunks, chunk_rates)]
+    results = [rate for chunk, rates in zip(chunks, chunk_rates) for rate in (rates or [None] * len(chunk))]
+    resolved = sum(rate is not None for rate in results)
+    logger.info(f"[Emission] {resolved}/{len(pairs)} pairs resolved from {len(chunks)} DAG runs in {time.monotonic() - start:.2f}s")
+    return results
+
+
+def _run_chunks(backend, chunks, batched, max_workers, timeout):
+    """Rates of every chunk, None for a chunk whose DAG run failed, timed out or returned unusable results."""
+    # Trigger everything first so the DAG runs execute in parallel on Airflow
+    dag_run_ids = [backend.submit(chunk, batched) for chunk in chunks]
+
+    def collect(args):
+        dag_run_id, chunk = args
+        if not dag_run_id:
+            logger.error("[Emission] Failed to trigger DAG")
+            return None
+        status = airflow_client.wait_for_dag_run(dag_run_id, get_state=backend.state, timeout=timeout)
+        if status != 'success':
+            logger.warning(f"[Emission] DAG run failed or timed out: {status}")
+            return None
+        return backend.results(dag_run_id, chunk, batched)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        return list(executor.map(collect, zip(dag_run_ids, chunks)))
@@ -1,84 +1,228 @@
+import math
+import numpy as np
 from ortools.constraint_solver import pywrapcp
 from ortools.constraint_solver import routing_enums_pb2
+from .cache_store import env_flag
 from .logger_utils import get_logger
+from .nearest_neighbor import nearest_feasible
 
 logger = get_logger(__name__)
 
+# Time matrices and windows are in minutes, the model works in whole seconds
+TIME_SCALE = 60
+
+# Demands and capacities are volumes in m3 and OR-Tools needs integers, so they are
+# scaled to liters. Demands round up and capacities round down, so a route never
+# overloads a truck.
+CAPACITY_SCALE = 1000
+
+SEARCH_BUDGET_KEYS = ('time_limit_seconds', 'solution_limit', 'first_solution_strategy', 'guided_local_search',
+                      'nearest_neighbor_start')
+FIRST_SOLUTION_STRATEGIES = [name for name in routing_enums_pb2.FirstSolutionStrategy.Value.keys() if name != 'UNSET']
+# Used when guided local search is requested without a time or solution limit
+GLS_DEFAULT_TIME_LIMIT_SECONDS = 10
+# Waiting allowed at a stop before its window opens, and the route horizon
+MAX_WAIT = 30 * TIME_SCALE
+HORIZON = 100000 * TIME_SCALE
+# Return nearest-neighbor routes when the search ends without a solution
+NN_FALLBACK_ENABLED = env_flag('NN_FALLBACK_ENABLED', True)
+
 def print_solution(data, manager, routing, solution):
+    """Per-vehicle node sequences, each ending with the depot the vehicle returns to."""
     logger.info(f"[OR-Tools] Solution found with objective value: {solution.ObjectiveValue()}")
     time_dimension = routing.GetDimensionOrDie('Time')
     total_time = 0
-    location_index = []
+    routes = []
     for vehicle_id in range(data['num_vehicles']):
+        location_index = []
         index = routing.Start(vehicle_id)
         plan_output = f'Route for vehicle {vehicle_id}:\n'
         while not routing.IsEnd(index):
             time_var = time_dimension.CumulVar(index)
-            plan_output += f'{manager.IndexToNode(index)} Time({solution.Min(time_var)}, {solution.Max(time_var)}) -> '
+            plan_output += f'{manager.IndexToNode(index)} Time({solution.Min(time_var) / TIME_SCALE:.1f}, {solution.Max(time_var) / TIME_SCALE:.1f}) -> '
             index = solution.Value(routing.NextVar(index))
             location_index.append(manager.IndexToNode(index))
         time_var = time_dimension.CumulVar(index)
-        plan_output += f'{manager.IndexToNode(index)} Time({solution.Min(time_var)}, {solution.Max(time_var)})\n'
-        plan_output += 'Time of the route: {} min\n'.format(solution.Min(time_var))
+        plan_output += f'{manager.IndexToNode(index)} Time({solution.Min(time_var) / TIME_SCALE:.1f}, {solution.Max(time_var) / TIME_SCALE:.1f})\n'
+        plan_output += 'Time of the route: {:.1f} min\n'.format(solution.Min(time_var) / TIME_SCALE)
         logger.debug(plan_output)
-        total_time += solution.Min(time_var)
-    logger.info(f"[OR-Tools] Total time of all routes: {total_time} min")
-    return location_index
+        total_time += solution.Min(time_var) / TIME_SCALE
+        routes.append(location_index)
+    logger.info(f"[OR-Tools] Total time of all routes: {total_time:.1f} min")
+    return routes
+
+def search_parameters_from(search=None):
+    """
+    Routing search parameters from a per-request budget, all keys optional:
+        time_limit_seconds: stop the search after this long
+        solution_limit: stop after this many solutions
+        first_solution_strategy: name of a FirstSolutionStrategy, default PATH_CHEAPEST_ARC
+        guided_local_search: escape local optima with GLS, needs a time or solution limit
+        nearest_neighbor_start: start the search from nearest_neighbor_routes instead
+            of first_solution_strategy (used by google_or)
+    Raises ValueError on invalid values.
+    """
+    search = dict(search or {})
+    unknown = set(search) - set(SEARCH_BUDGET_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown search options {sorted(unknown)}, expected {list(SEARCH_BUDGET_KEYS)}")
+
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    strategy = search.get('first_solution_strategy') or 'PATH_CHEAPEST_ARC'
+    if strategy not in FIRST_SOLUTION_STRATEGIES:
+        raise ValueError(f"Unknown first_solution_strategy '{strategy}', expected one of {FIRST_SOLUTION_STRATEGIES}")
+    search_parameters.first_solution_strategy = getattr(routing_enums_pb2.FirstSolutionStrategy, strategy)
+
+    time_limit = search.get('time_limit_seconds')
+    if time_limit is not None:
+        if float(time_limit) <= 0:
+            raise ValueError("time_limit_seconds must be positive")
+        search_parameters.time_limit.FromMilliseconds(int(float(time_limit) * 1000))
+    solution_limit = search.get('solution_limit')
+    if solution_limit is not None:
+        if int(solution_limit) <= 0:
+            raise ValueError("solution_limit must be positive")
+        search_parameters.solution_limit = int(solution_limit)
+
+    if search.get('guided_local_search'):
+        search_parameters.local_search_metaheuristic = (
+            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
+        if time_limit is None and solution_limit is None:
+            # GLS never reaches a local optimum to stop at
+            search_parameters.time_limit.FromMilliseconds(GLS_DEFAULT_TIME_LIMIT_SECONDS * 1000)
+    return search_parameters
+
+def transit_seconds(data):
+    """Travel plus service time at the origin node between every pair of nodes, in whole seconds."""
+    time_matrix = np.asarray(data['time_matrix'], dtype=np.float64)
+    service_times = np.asarray(data['service_times'], dtype=np.float64)
+    return np.rint((time_matrix + service_times[:, None]) * TIME_SCALE).astype(np.int64)
+
+def arc_costs(data, transit_matrix):
+    if data.get('objective_type') == 'emission' and 'emission_matrix' in data:
+        # Multiply by 100 to keep precision as integers (OR-Tools requires integers)
+        return (np.asarray(data['emission_matrix'], dtype=np.float64) * 100).astype(np.int64)
+    return transit_matrix
+
+def nearest_neighbor_routes(data):
+    """
+    Routes for ``data`` built vehicle by vehicle: each leaves the depot when its
+    window opens and goes on to the cheapest stop (by the model's arc cost) it can
+    reach before the stop closes, within MAX_WAIT of its opening and within the
+    vehicle's capacity, until no stop is left for it. Every route satisfies the
+    google_or model. Returns (routes as google_or returns them, unvisited nodes).
+    """
+    transit_matrix = transit_seconds(data)
+    costs = arc_costs(data, transit_matrix)
+    windows = np.array([(int(start * TIME_SCALE), int(end * TIME_SCALE)) for start, end in data['time_windows']], dtype=np.int64)
+    depot = data['depot']
+    if 'vehicle_capacities' in data:
+        demands = np.array([math.ceil(demand * CAPACITY_SCALE) for demand in data['demands']], dtype=np.int64)
+        capacities = [math.floor(capacity * CAPACITY_SCALE) for capacity in data['vehicle_capacities']]
+    else:
+        demands = np.zeros(len(windows), dtype=np.int64)
+        capacities = [0] * data['num_vehicles']
+
+    unvisited = np.ones(len(windows), dtype=bool)
+    unvisited[depot] = False
+    routes = []
+    for capacity in capacities:
+        node, clock, load, route = depot, windows[depot, 0], 0, []
+        while unvisited.any():
+            candidates = np.flatnonzero(unvisited)
+            arrival = clock + transit_matrix[node, candidates]
+            feasible = ((arrival <= windows[candidates, 1]) & (windows[candidates, 0] - arrival <= MAX_WAIT)
+                        & (arrival <= HORIZON) & (load + demands[candidates] <= capacity))
+            pick = nearest_feasible(costs[node, candidates], feasible)
+            if pick is None:
+                break
+            node = int(candidates[pick])
+            clock = max(arrival[pick], windows[node, 0])
+            load += demands[node]
+            route.append(node)
+            unvisited[node] = False
+        routes.append(route + [depot])
+    return routes, np.flatnonzero(unvisited).tolist()
+
+def nearest_neighbor_result(data):
+    routes, unreachable = nearest_neighbor_routes(data)
+    reachable = [node for route in routes for node in route]
+    logger.info(f"[google_or] Nearest-neighbor routes: {len(reachable)} reachable, {len(unreachable)} unreachable")
+    return {"reachable": reachable, "routes": routes, "unreachable": unreachable, "solver": "nearest_neighbor"}
 
 def google_or(data):
+    """
+    Solve the routing model described by ``data``.
+
+    With ``demands`` (per node) and ``vehicle_capacities`` (per vehicle) in ``data`` a
+    capacity dimension is added, so several trucks can share one model.
+    ``search`` is the search budget, see search_parameters_from.
+    Returns {"reachable": visited nodes of all vehicles, "routes": per vehicle,
+    "unreachable": dropped nodes}.
+    """
     logger.info(f"[google_or] START - Optimizing {len(data['time_matrix'])} locations, objective={data.get('objective_type', 'time')}")
     manager = pywrapcp.RoutingIndexManager(len(data['time_matrix']), data['num_vehicles'], data['depot'])
     routing = pywrapcp.RoutingModel(manager)
-    
-    def time_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return data['time_matrix'][from_node][to_node] + data['service_times'][from_node]
 
-    transit_callback_index = routing.RegisterTransitCallback(time_callback)
+    # Arc costs are evaluated in C++ from precomputed integer matrices. Travel plus
+    # service time at the origin node, in seconds.
+    transit_matrix = transit_seconds(data)
+    transit_callback_index = routing.RegisterTransitMatrix(transit_matrix.tolist())
 
     # Define cost function based on objective
-    if data.get('objective_type') == 'emission' and 'emission_matrix' in data:
-        def emission_callback(from_index, to_index):
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            # Multiply by 100 to keep precision as integers (OR-Tools requires integers)
-            return int(data['emission_matrix'][from_node][to_node] * 100)
-        
-        emission_callback_index = routing.RegisterTransitCallback(emission_callback)
-        routing.SetArcCostEvaluatorOfAllVehicles(emission_callback_index)
-    else:
+    costs = arc_costs(data, transit_matrix)
+    if costs is transit_matrix:
         routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    else:
+        routing.SetArcCostEvaluatorOfAllVehicles(routing.RegisterTransitMatrix(costs.tolist()))
 
     time = 'Time'
     routing.AddDimension(
         transit_callback_index,
-        30,
-        100000,
+        MAX_WAIT,
+        HORIZON,
         False,
         time)
     time_dimension = routing.GetDimensionOrDie(time)
 
+    if 'vehicle_capacities' in data:
+        demands = [math.ceil(demand * CAPACITY_SCALE) for demand in data['demands']]
+        capacities = [math.floor(capacity * CAPACITY_SCALE) for capacity in data['vehicle_capacities']]
+        demand_callback_index = routing.RegisterUnaryTransitVector(demands)
+        routing.AddDimensionWithVehicleCapacity(demand_callback_index, 0, capacities, True, 'Capacity')
+
     for location_idx, time_window in enumerate(data['time_windows']):
+        window = (int(time_window[0] * TIME_SCALE), int(time_window[1] * TIME_SCALE))
         if location_idx == data['depot']:
-            index = manager.NodeToIndex(location_idx)
-            time_dimension.CumulVar(index).SetRange(time_window[0], time_window[1])
+            for vehicle_id in range(data['num_vehicles']):
+                index = routing.Start(vehicle_id)
+                time_dimension.CumulVar(index).SetRange(*window)
         else:
             index = manager.NodeToIndex(location_idx)
-            time_dimension.CumulVar(index).SetRange(time_window[0], time_window[1])
+            time_dimension.CumulVar(index).SetRange(*window)
             # Increased penalty to 10M to ensure locations are visited even in emission mode
             # where emission costs can be high (e.g., 1200g CO2 * 100 = 120,000)
             routing.AddDisjunction([index], 10000000)
 
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC)
-
-    solution = routing.SolveWithParameters(search_parameters)
+    search = data.get('search') or {}
+    search_parameters = search_parameters_from(search)
+    solution = None
+    if search.get('nearest_neighbor_start'):
+        routes, _ = nearest_neighbor_routes(data)
+        routing.CloseModelWithParameters(search_parameters)
+        initial = routing.ReadAssignmentFromRoutes(
+            [[manager.NodeToIndex(node) for node in route[:-1]] for route in routes], True)
+        if initial:
+            solution = routing.SolveFromAssignmentWithParameters(initial, search_parameters)
+        else:
+            logger.warning("[google_or] Nearest-neighbor routes rejected by the model, using first_solution_strategy")
+    if not solution:
+        solution = routing.SolveWithParameters(search_parameters)
 
     if solution:
         logger.info("[google_or] Solution found, processing results")
-        reachable_location = print_solution(data, manager, routing, solution)
+        routes = print_solution(data, manager, routing, solution)
+        reachable_location = [node for route in routes for node in route]
         unreachable_location = []
         for location_idx in range(1, len(data['time_windows'])):
             if routing.IsStart(manager.NodeToIndex(location_idx)) or routing.IsEnd(manager.NodeToIndex(location_idx)):
@@ -89,10 +233,14 @@ def google_or(data):
         
         result = {
             "reachable": reachable_location,
+            "routes": routes,
             "unreachable": unreachable_location
         }
         logger.info(f"[google_or] COMPLETE - {len(reachable_location)} reachable, {len(unreachable_location)} unreachable")
         return result
+    elif NN_FALLBACK_ENABLED:
+        logger.warning("[google_or] No solution within the search budget, returning nearest-neighbor routes")
+        return nearest_neighbor_result(data)
     else:
         logger.error("[google_or] No solution found")
         return "No solution found."
\ No newline at end of file
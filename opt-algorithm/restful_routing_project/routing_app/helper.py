@@ -1,83 +1,183 @@
 import os
-import googlemaps
 import gmaps
-from scipy.spatial.distance import cdist
 import numpy as np
 from geopy.distance import geodesic
-from sklearn.cluster import DBSCAN, KMeans
-from sklearn.metrics import silhouette_score as ss
-from skopt import gp_minimize
-from skopt.space import Real, Integer
-from skopt.utils import use_named_args
+from sklearn.cluster import KMeans
 from datetime import datetime
-from .logger_utils import get_logger, log_step, log_external_call
+from .logger_utils import get_logger, log_step
+from .dbscan_tuning import dbscan_parameters, tune_dbscan
+from .distance_matrix import distance_matrix, distances_from
+from .emission_cache import geohash
+from .spatial_index import GeoIndex, NearestDistances
 
 # Support reading API key only from environment
 API_KEY = os.getenv('GOOGLE_MAPS_API_KEY') or os.getenv('API_KEY')
 
+# 'haversine' (fast path) or 'vincenty' (geodesic accuracy), see distance_matrix.py
+DISTANCE_METHOD = os.getenv('DISTANCE_METHOD', 'haversine')
+
 # Initialize logger
 logger = get_logger(__name__)
 
+# Candidates per batch of travel times when growing a DBSCAN cluster
+LEG_BLOCK = 32
+# Noise-to-member distances per batch when averaging distances to clusters
+NOISE_BLOCK_PAIRS = 1_000_000
+
 def calculate_gamma1(visited_nodes, all_nodes, df):
-    total_demand_visited = sum(df.at[node, 'demand'] for node in visited_nodes)
-    total_demand_all = sum(df.at[node, 'demand'] for node in all_nodes)
+    demand = df['demand'].to_numpy()
+    total_demand_visited = sum(demand[node] for node in visited_nodes)
+    total_demand_all = sum(demand[node] for node in all_nodes)
     return total_demand_visited / total_demand_all if total_demand_all > 0 else 1
 
-def calculate_gamma2(noise_nodes, df, clusters):
+class NoiseDistances:
+    """
+    Sum of the distances (m) from each noise node to the members of each cluster.
+
+    Built from batched distance matrices and updated by one row of distances when
+    a node joins a cluster, so mean distances never rescan the clusters.
+    """
+
+    def __init__(self, coords, noise_nodes, clusters):
+        self.coords = coords
+        self.noise_nodes = list(noise_nodes)
+        self.rows = {node: i for i, node in enumerate(self.noise_nodes)}
+        sizes = np.array([len(cluster) for cluster in clusters])
+        self.counts = sizes.astype(np.float64)
+        self.sums = np.zeros((len(self.noise_nodes), len(clusters)))
+
+        members = [node for cluster in clusters for node in cluster]
+        if not self.noise_nodes or not members:
+            return
+        # Empty clusters have no segment; their sums stay 0 and their means NaN
+        filled = sizes > 0
+        starts = (np.cumsum(sizes) - sizes)[filled]
+        block = max(1, NOISE_BLOCK_PAIRS // len(members))
+        for first in range(0, len(self.noise_nodes), block):
+            rows = self.noise_nodes[first:first + block]
+            distances = distance_matrix(coords[rows], coords[members], method='vincenty', dtype=np.float64)
+            self.sums[first:first + len(rows), filled] = np.add.reduceat(distances, starts, axis=1)
+
+    def means(self, node=None):
+        """Mean distance to each cluster, of ``node`` or of every noise node."""
+        sums = self.sums if node is None else self.sums[self.rows[node]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / self.counts
+
+    def add(self, cluster_index, node):
+        self.sums[:, cluster_index] += distance_matrix(
+            self.coords[self.noise_nodes], self.coords[[node]], method='vincenty', dtype=np.float64)[:, 0]
+        self.counts[cluster_index] += 1
+
+def calculate_gamma2(noise_nodes, df, clusters, distances=None):
+    if len(clusters) < 2 or not noise_nodes:
+        return 1
+    if distances is None:
+        distances = NoiseDistances(df[['latitude', 'longitude']].to_numpy(np.float64), noise_nodes, clusters)
+    means = distances.means()[[distances.rows[noise] for noise in noise_nodes]]
+    if np.isnan(means).any():
+        # Empty clusters: keep the comparison order of min() and sorted() on NaN
+        lowest = [(min(row), sorted(row)[1]) for row in means.tolist()]
+    else:
+        lowest = np.partition(means, 1, axis=1)[:, :2].tolist()
     dist_min_sum, dist_2ndmin_sum = 0, 0
-    for noise in noise_nodes:
-        distances = [np.mean([geodesic_distance(df.loc[noise, ['latitude', 'longitude']], df.loc[node, ['latitude', 'longitude']])
-                     for node in cluster]) for cluster in clusters]
-        if len(distances) >= 2:
-            dist_min_sum += min(distances)
-            dist_2ndmin_sum += sorted(distances)[1]
+    for dist_min, dist_2ndmin in lowest:
+        dist_min_sum += dist_min
+        dist_2ndmin_sum += dist_2ndmin
     return dist_2ndmin_sum / dist_min_sum if dist_min_sum > 0 else 1
 
-def procenoiseP1(clusters, noise_nodes, df, Cnum, capacity, gamma1, gamma2, data):
+def procenoiseP1(clusters, noise_nodes, df, Cnum, capacity, gamma1, gamma2, data, totals=None, distances=None):
+    if totals is None:
+        totals = [ClusterTotals.of(cluster, data, df) for cluster in clusters]
+    if distances is None:
+        distances = NoiseDistances(data[:, :2].astype(np.float64), noise_nodes, clusters)
+    # gamma2 is NaN only when empty clusters left NaN means; then no distance passes avg < gamma2 * min_dist
+    if not clusters or not gamma2 >= 1:
+        return
+    service_times = df['service_time'].to_numpy()
+    available_times = available_delivery_times(df)
+    demands = df['demand'].to_numpy()
+    loads = np.array([cluster_totals.demand for cluster_totals in totals], dtype=np.float64)
+    served = np.array([cluster_totals.service_time for cluster_totals in totals], dtype=np.float64)
+    routed = np.array([cluster_totals.route_time for cluster_totals in totals], dtype=np.float64)
     for X in noise_nodes[:]:
-        min_dist, min_cluster = float('inf'), None
-        for cluster in clusters:
-            avg_distance = np.mean([geodesic_distance(df.loc[X, ['latitude', 'longitude']], df.loc[node, ['latitude', 'longitude']])
-                                    for node in cluster])
-            cluster_load = sum(df.at[node, 'demand'] for node in cluster)
-            if avg_distance < min_dist and cluster_load + df.at[X, 'demand'] <= capacity * gamma1 and avg_distance < gamma2 * min_dist:
-                if can_add_to_cluster(cluster, X, df, data):
-                    min_dist, min_cluster = avg_distance, cluster
-        if min_cluster:
-            min_cluster.append(X)
-            df.at[X, 'cluster'] = Cnum
-            noise_nodes.remove(X)
+        # With gamma2 >= 1 the scan keeps the closest cluster that passes the load and
+        # time checks, ties to the first one, so try them by distance and stop at the first.
+        # Travel time only adds to a cluster's time, so clusters already past X's window are skipped
+        avg_distances = distances.means(X)
+        fits = (~np.isnan(avg_distances) & (loads + demands[X] <= capacity * gamma1)
+                & ((served + service_times[X]) + routed <= available_times[X]))
+        candidates = np.flatnonzero(fits)
+        found = first_addable(candidates[np.argsort(avg_distances[candidates], kind='stable')],
+                              X, totals, data, service_times, available_times)
+        if found is None:
+            continue
+        c, leg_time = found
+        cluster_totals = totals[c]
+        clusters[c].append(X)
+        cluster_totals.add(X, leg_time, service_times, data)
+        loads[c], served[c], routed[c] = cluster_totals.demand, cluster_totals.service_time, cluster_totals.route_time
+        distances.add(c, X)
+        df.at[X, 'cluster'] = Cnum
+        noise_nodes.remove(X)
+
+def first_addable(order, node, totals, data, service_times, available_times):
+    """(cluster index, leg time) of the first cluster in ``order`` that can take ``node``, or None."""
+    for start in range(0, len(order), LEG_BLOCK):
+        block = order[start:start + LEG_BLOCK]
+        lasts = [node if totals[c].last is None else totals[c].last for c in block]
+        legs = travel_time_matrix(data[lasts, :2].astype(np.float64), data[[node], :2].astype(np.float64))[:, 0]
+        for c, leg_time in zip(block, legs.tolist()):
+            if totals[c].can_add(node, leg_time, service_times, available_times):
+                return int(c), leg_time
+    return None
+
+def cluster_centroids(clusters, data):
+    """(latitude, longitude) centroid of every cluster, as calculate_centroid computes it."""
+    centroids = np.full((len(clusters), 2), np.nan)
+    for i, cluster in enumerate(clusters):
+        if cluster:
+            centroids[i] = data[cluster, 0].mean(), data[cluster, 1].mean()
+    return centroids
 
 def microcluster_fusion(clusters, data, capacity, max_distance):
+    # Every cluster fuses with at most one later cluster: the first one within
+    # max_distance of its centroid and within capacity, as in the pairwise scan
+    demands = [sum(data[node][2] for node in cluster) for cluster in clusters]
+    centroids = cluster_centroids(clusters, data)
+    remaining = list(range(len(clusters)))
     fused_clusters = []
-    while clusters:
-        base_cluster = clusters.pop(0)
-        base_demand = sum(data[node][2] for node in base_cluster)
-        base_centroid = calculate_centroid(base_cluster, data)
-        for i, other_cluster in enumerate(clusters):
-            other_demand = sum(data[node][2] for node in other_cluster)
-            other_centroid = calculate_centroid(other_cluster, data)
-            if geodesic_distance(base_centroid, other_centroid) <= max_distance and base_demand + other_demand <= capacity:
-                base_cluster += clusters.pop(i)
-                base_demand += other_demand
-                break
+    while remaining:
+        base = remaining.pop(0)
+        base_cluster = clusters[base]
+        if remaining and not np.isnan(centroids[base, 0]):
+            others = np.array(remaining)
+            distances = distance_matrix(centroids[[base]], centroids[others], method='vincenty', dtype=np.float64)[0]
+            fits = (distances <= max_distance) & (demands[base] + np.array([demands[i] for i in remaining]) <= capacity)
+            if fits.any():
+                base_cluster += clusters[remaining.pop(int(np.argmax(fits)))]
         fused_clusters.append(base_cluster)
+    clusters.clear()
     return fused_clusters
 
 def procenoiseP2(fused_clusters, noise_nodes, df, capacity, max_distance, data):
+    if not fused_clusters:
+        return
+    demands = df['demand'].to_numpy()
+    loads = np.array([sum(demands[node] for node in cluster) for cluster in fused_clusters], dtype=np.float64)
+    centroids = cluster_centroids(fused_clusters, data)
     for noise in noise_nodes[:]:
-        min_dist, best_cluster = float('inf'), None
-        for cluster in fused_clusters:
-            centroid = calculate_centroid(cluster, data)
-            noise_coord = data[noise][:2]
-            distance_to_centroid = geodesic_distance(centroid, noise_coord)
-            if distance_to_centroid <= max_distance and sum(df.at[node, 'demand'] for node in cluster) + df.at[noise, 'demand'] <= capacity:
-                if distance_to_centroid < min_dist:
-                    min_dist, best_cluster = distance_to_centroid, cluster
-        if best_cluster:
-            best_cluster.append(noise)
-            df.at[noise, 'cluster'] = fused_clusters.index(best_cluster) + 1
-            noise_nodes.remove(noise)
+        distances = distance_matrix(data[[noise], :2].astype(np.float64), centroids, method='vincenty', dtype=np.float64)[0]
+        fits = (distances <= max_distance) & (loads + demands[noise] <= capacity)
+        if not fits.any():
+            continue
+        best = int(np.flatnonzero(fits)[np.argmin(distances[fits])])
+        best_cluster = fused_clusters[best]
+        best_cluster.append(noise)
+        loads[best] += demands[noise]
+        centroids[best] = data[best_cluster, 0].mean(), data[best_cluster, 1].mean()
+        df.at[noise, 'cluster'] = best + 1
+        noise_nodes.remove(noise)
 
 def calculate_centroid(cluster, data):
     latitudes = [data[node][0] for node in cluster]
@@ -88,102 +188,132 @@ def geodesic_distance(coords1, coords2):
     return geodesic(coords1, coords2).meters
 
 def vincenty_batch_vectorized(origin_coords, destination_coords):
-    dists = cdist(origin_coords, destination_coords, 
-                  lambda u, v: geodesic_distance(u, v))
-    return dists
+    return distance_matrix(origin_coords, destination_coords, method='vincenty', dtype=np.float64)
     
-from .airflow_client import trigger_inference, poll_dag_run
-from .minio_client import get_inference_result
+from .emission_service import compute_emissions
+from .matrix_cache import get_matrix_cache
+from .route_service import get_route_service
 
 def get_distance_runner(bin_cluster_data, priority='time'):
     logger.info(f"[get_distance_runner] START - Processing {len(bin_cluster_data)} locations, priority={priority}")
-    distances, times, emissions = get_distance_time_matrices(bin_cluster_data, priority=priority)
-    logger.info(f"[get_distance_runner] COMPLETE - Generated matrices: {len(distances)}x{len(distances[0]) if distances else 0}")
+    cache = get_matrix_cache()
+    if cache is not None:
+        distances, times, emissions = get_cached_distance_time_matrices(bin_cluster_data, cache, priority=priority)
+        logger.info(f"[get_distance_runner] Matrix cache stats: {cache.stats()}")
+    else:
+        distances, times, emissions = get_distance_time_matrices(bin_cluster_data, priority=priority)
+    logger.info(f"[get_distance_runner] COMPLETE - Generated matrices: {distances.shape[0]}x{distances.shape[1]}")
     return distances, times, emissions
 
-def get_distance_time_matrices(locations, batch_size=10, priority='time'):
-    logger.info(f"[get_distance_time_matrices] START - {len(locations)} locations, batch_size={batch_size}, priority={priority}")
-    
-    def chunks(lst, n):
-        for i in range(0, len(lst), n):
-            yield lst[i:i + n]
-
-    location_batches = list(chunks(locations, batch_size))
-    num_locations = len(locations)
-    logger.info(f"[get_distance_time_matrices] Created {len(location_batches)} batches")
-    
-    distance_matrix = np.zeros((num_locations, num_locations))
-    time_matrix = np.zeros((num_locations, num_locations))
-    emission_matrix = np.zeros((num_locations, num_locations))
-
-    for i, origin_batch in enumerate(location_batches):
-        for j, destination_batch in enumerate(location_batches):
-            origin_coords = np.array(origin_batch[['latitude', 'longitude']])
-            destination_coords = np.array(destination_batch[['latitude', 'longitude']])
-
-            dists = vincenty_batch_vectorized(origin_coords, destination_coords)
-                    
-            average_speed = 60
-            dists_km = dists / 1000
-            times = (dists_km / average_speed) * 3600
-            
-            # Calculate emissions using Airflow/MinIO ONLY if priority is 'emission'
-            emissions = np.zeros(dists.shape)
-            if priority == 'emission':
-                logger.info(f"[Emission] Priority is 'emission', calculating emission matrix via Airflow")
-                # Note: This is N^2 and will be slow.
-                for r in range(len(origin_coords)):
-                    for c in range(len(destination_coords)):
-                        origin_str = f"{origin_coords[r][0]},{origin_coords[r][1]}"
-                        dest_str = f"{destination_coords[c][0]},{destination_coords[c][1]}"
-                        
-                        if origin_str == dest_str:
-                            continue
-
-                        log_external_call(logger, "Airflow", "trigger_inference", {"origin": origin_str, "dest": dest_str})
-                        dag_run_id = trigger_inference(origin_str, dest_str)
-                        
-                        if dag_run_id:
-                            logger.info(f"[Emission] DAG run triggered: {dag_run_id}")
-                            status = poll_dag_run(dag_run_id)
-                            if status == 'success':
-                                result = get_inference_result(dag_run_id)
-                                # New JSON structure:
-                                # {
-                                #   "Emission Rate": {
-                                #     "CO(g)": ..., "HC(g)": ..., "NOx(g)": ...,
-                                #     "PM2.5_Ele(g)": ..., "PM2.5_Org(g)": ...,
-                                #     "Energy(KJ)": ..., "CO2(g)": ..., "Fuel(g)": ..., "TT(s)": ...
-                                #   },
-                                #   "Emission Factor": { ... }
-                                # }
-                                if result and 'Emission Rate' in result:
-                                    emission_rate = result['Emission Rate']
-                                    # Use CO2 as the primary emission metric (in grams)
-                                    # You can also create a weighted sum of multiple pollutants if needed
-                                    co2_emission = float(emission_rate.get('CO2(g)', 0))
-                                    emissions[r][c] = co2_emission
-                                    logger.info(f"[Emission] Retrieved CO2 emission: {co2_emission}g for {origin_str} -> {dest_str}")
-                                else:
-                                    logger.warning(f"[Emission] Result missing 'Emission Rate': {result}")
-                            else:
-                                logger.warning(f"[Emission] DAG run failed or timed out: {status}")
-                        else:
-                            logger.error("[Emission] Failed to trigger DAG")
-            else:
-                logger.info(f"[Emission] Priority is '{priority}', skipping emission calculation (using zero matrix)")
-
-            start_row = i * batch_size
-            start_col = j * batch_size
-            end_row = min(start_row + len(origin_coords), num_locations)
-            end_col = min(start_col + len(destination_coords), num_locations)
-            
-            distance_matrix[start_row:end_row, start_col:end_col] = dists[:end_row - start_row, :end_col - start_col]
-            time_matrix[start_row:end_row, start_col:end_col] = times[:end_row - start_row, :end_col - start_col]
-            emission_matrix[start_row:end_row, start_col:end_col] = emissions[:end_row - start_row, :end_col - start_col]
+def get_distance_time_matrices(locations, priority='time', method=None):
+    """
+    Build distance (m), time (s) and emission (g CO2) matrices for ``locations``.
+    Returns three float32 numpy arrays of shape (n, n).
+    """
+    method = method or DISTANCE_METHOD
+    logger.info(f"[get_distance_time_matrices] START - {len(locations)} locations, method={method}, priority={priority}")
+
+    coords = np.array(locations[['latitude', 'longitude']], dtype=np.float64)
+    distance_matrix_m = distance_matrix(coords, method=method)
+    time_matrix = distance_to_time(distance_matrix_m)
+
+    # Calculate emissions using Airflow/MinIO ONLY if priority is 'emission'
+    if priority == 'emission':
+        emission_matrix, _ = compute_emission_matrix(coords)
+    else:
+        logger.info(f"[Emission] Priority is '{priority}', skipping emission calculation (using zero matrix)")
+        emission_matrix = np.zeros((len(coords), len(coords)), dtype=np.float32)
 
     logger.info(f"[get_distance_time_matrices] COMPLETE - Matrices generated successfully")
-    return distance_matrix.tolist(), time_matrix.tolist(), emission_matrix.tolist()
+    return distance_matrix_m, time_matrix, emission_matrix
+
+def get_cached_distance_time_matrices(locations, cache, priority='time', method=None):
+    """
+    Same result as get_distance_time_matrices, but only pairs missing from ``cache``
+    are computed. Rows sharing a loc_dest_id (several orders to one location) are
+    computed once.
+    """
+    method = method or DISTANCE_METHOD
+    need_emission = priority == 'emission'
+    ids = [str(i) for i in locations['loc_dest_id']]
+    coords = np.array(locations[['latitude', 'longitude']], dtype=np.float64)
+
+    # Distinct (id, coordinate) locations, rows map back through `inverse`
+    unique_keys = {}
+    inverse = np.array([unique_keys.setdefault((i, c[0], c[1]), len(unique_keys)) for i, c in zip(ids, coords)], dtype=int)
+    unique_ids = [k[0] for k in unique_keys]
+    unique_coords = np.array([k[1:] for k in unique_keys], dtype=np.float64).reshape(-1, 2)
+
+    distance, time_matrix, emission, missing = cache.lookup(unique_ids, unique_coords, method, need_emission)
+    if missing.any():
+        rows = np.flatnonzero(missing.any(axis=1))
+        cols = np.flatnonzero(missing.any(axis=0))
+        logger.info(f"[get_cached_distance_time_matrices] {int(missing.sum())} of {missing.size} pairs missing, "
+                    f"computing {len(rows)} rows / {len(cols)} columns")
+        row_dist = distance_matrix(unique_coords[rows], unique_coords, method=method)
+        col_dist = distance_matrix(unique_coords, unique_coords[cols], method=method)
+        computed = np.zeros_like(distance)
+        computed[:, cols] = col_dist
+        computed[rows, :] = row_dist
+        distance[missing] = computed[missing]
+        time_matrix[missing] = distance_to_time(computed)[missing]
+
+        emission_resolved = None
+        if need_emission:
+            new_emission, emission_resolved = compute_emission_matrix(unique_coords, pairs=missing)
+            emission[missing] = new_emission[missing]
+        cache.save(unique_ids, unique_coords, method, distance, time_matrix, emission, missing, emission_resolved)
+
+    index = np.ix_(inverse, inverse)
+    return distance[index], time_matrix[index], emission[index]
+
+def distance_to_time(distance_m, average_speed=60):
+    """Travel time in seconds for distances in meters at ``average_speed`` km/h."""
+    return ((distance_m / 1000) / average_speed * 3600).astype(np.float32)
+
+def compute_emission_matrix(coords, pairs=None):
+    """
+    CO2 (g) for every origin/destination pair via the Airflow inference DAG.
+
+    Args:
+        coords: (n, 2) array of (latitude, longitude)
+        pairs: optional (n, n) bool mask, only these pairs are computed
+    Returns:
+        (emission_matrix, resolved) where ``resolved`` marks the pairs that got a result
+    """
+    num_locations = len(coords)
+    emission_matrix = np.zeros((num_locations, num_locations), dtype=np.float32)
+    resolved = np.zeros((num_locations, num_locations), dtype=bool)
+    logger.info(f"[Emission] Priority is 'emission', calculating emission matrix via Airflow")
+    od_index = []
+    od_pairs = []
+    for r in range(num_locations):
+        for c in range(num_locations):
+            if pairs is not None and not pairs[r][c]:
+                continue
+            origin_str = f"{coords[r][0]},{coords[r][1]}"
+            dest_str = f"{coords[c][0]},{coords[c][1]}"
+
+            if origin_str == dest_str:
+                resolved[r][c] = True
+                continue
+            od_index.append((r, c))
+            od_pairs.append((origin_str, dest_str))
+
+    # Each result is the "Emission Rate" part of the DAG output:
+    # {
+    #   "CO(g)": ..., "HC(g)": ..., "NOx(g)": ...,
+    #   "PM2.5_Ele(g)": ..., "PM2.5_Org(g)": ...,
+    #   "Energy(KJ)": ..., "CO2(g)": ..., "Fuel(g)": ..., "TT(s)": ...
+    # }
+    emission_rates = compute_emissions(od_pairs)
+    for (r, c), emission_rate in zip(od_index, emission_rates):
+        if emission_rate is None:
+            continue
+        # Use CO2 as the primary emission metric (in grams)
+        emission_matrix[r][c] = float(emission_rate.get('CO2(g)', 0))
+        resolved[r][c] = True
+    return emission_matrix, resolved
 
 def validate_distance(locations, distances):
     for i, row in enumerate(distances):
@@ -196,41 +326,8 @@ def validate_distance(locations, distances):
                     print(result)
 
 def get_directions(origin, destination):
-    # Try Google Directions if key is available; otherwise or on failure, fallback to geodesic-based estimate
-    if API_KEY:
-        try:
-            gmaps_client = googlemaps.Client(key=API_KEY)
-            log_external_call(logger, "GoogleMaps", "directions", {"origin": str(origin)[:50], "dest": str(destination)[:50]})
-            return gmaps_client.directions(origin, destination, mode="driving")
-        except Exception as e:
-            logger.warning(f"[get_directions] Google Directions failed; using fallback: {e}")
-    # Fallback: compute straight-line distance and estimate duration using heuristic speeds
-    try:
-        distance_m = geodesic_distance(origin, destination)
-        distance_km = distance_m / 1000.0
-        if distance_km < 10:
-            speed_kmh = 15
-        elif distance_km < 50:
-            speed_kmh = 30
-        else:
-            speed_kmh = 40
-        duration_minutes = (distance_km / max(speed_kmh, 1)) * 60.0
-        duration_seconds = int(duration_minutes * 60)
-        return [{
-            'legs': [{
-                'duration': {'value': duration_seconds},
-                'distance': {'value': int(distance_m)}
-            }]
-        }]
-    except Exception as e:
-        print("[dbg] Fallback directions computation failed:", str(e))
-        # Last-resort constant values to avoid crashing
-        return [{
-            'legs': [{
-                'duration': {'value': 0},
-                'distance': {'value': 0}
-            }]
-        }]
+    # Google Directions when a key is available, geodesic-based estimate otherwise (see route_service)
+    return get_route_service().leg(origin, destination).as_directions()
 
 
 def handle_noise_with_kmeans(df):
@@ -267,67 +364,74 @@ def handle_noise_with_kmeans(df):
 
     return df
 
-def dbscan_cluster(df, warehouse_loc):
+def density_clusters(coords, data, dist_to_warehouse, eps, min_samples, service_times, available_times):
+    """
+    The clustering pass of dbscan_cluster.
+
+    Each cluster starts at the unvisited node farthest from the previous cluster
+    (from the warehouse for the first one) that has at least ``min_samples``
+    unvisited nodes within ``eps`` meters. It takes that node and those neighbors,
+    in index order, while they fit the delivery time (see grow_cluster).
+    Returns (clusters, totals, noise_nodes, visited_nodes).
+    """
+    unvisited = np.ones(len(coords), dtype=bool)
+    clusters, totals, noise_nodes, visited_nodes = [], [], [], set()
+    index = GeoIndex(coords)
+    dist_to_core = None
+
+    while unvisited.any():
+        if dist_to_core is None:
+            candidates = np.flatnonzero(unvisited)
+            X1 = int(candidates[np.argmax(dist_to_warehouse[candidates])])
+        else:
+            X1 = dist_to_core.farthest(unvisited)
+
+        neighbors = [int(i) for i in index.within(coords[X1], eps, unvisited) if i != X1]
+
+        if len(neighbors) >= min_samples:
+            visited_nodes.add(X1)
+            unvisited[X1] = False
+            current_cluster, cluster_totals = grow_cluster([X1] + neighbors, coords, data, service_times, available_times)
+            visited_nodes.update(current_cluster)
+            unvisited[current_cluster] = False
+            clusters.append(current_cluster)
+            totals.append(cluster_totals)
+            if current_cluster:
+                dist_to_core = NearestDistances(GeoIndex(coords[current_cluster]), coords)
+        else:
+            noise_nodes.append(X1)
+            unvisited[X1] = False
+    return clusters, totals, noise_nodes, visited_nodes
+
+def dbscan_cluster(df, warehouse_loc, dc_id=None):
     logger.info(f"[dbscan_cluster] START - Clustering {len(df)} locations")
     df['demand'] = df['quantity'] * df['volume']
     data = df[['latitude', 'longitude', 'demand']].to_numpy()
     capacity = 1000000
+    coords = data[:, :2].astype(np.float64)
 
-    # best_eps, best_min_samples = get_eps_and_min_samples(data)
-    best_eps, best_min_samples = 25000, 5
+    # Tuned per DC when DBSCAN_TUNING_ENABLED, a DC without an id is keyed by its location (~150 m cell)
+    dc_key = dc_id or geohash(*warehouse_loc, precision=7)
+    best_eps, best_min_samples = dbscan_parameters(coords, dc_key)
     logger.info(f"[dbscan_cluster] Using eps={best_eps}, min_samples={best_min_samples}")
-    Cnum = 1
-    unvisited_nodes = set(range(len(data)))
-    clusters = []
     warehouse = np.array([warehouse_loc])
-    noise_nodes = []
-    visited_nodes = set()
     all_nodes = set(range(len(data)))
-    core_points = []
-
-    def get_neighbors(node_index, eps):
-        neighbors = []
-        for i in unvisited_nodes:
-            if i != node_index and geodesic_distance(data[node_index][:2], data[i][:2]) <= eps:
-                neighbors.append(i)
-        return neighbors
-    
-    while unvisited_nodes:
-        if Cnum == 1:
-            X1 = max(unvisited_nodes, key=lambda i: geodesic_distance(warehouse, data[i][:2]))
-        else:
-            X1 = max(unvisited_nodes, key=lambda i: min([geodesic_distance(data[i][:2], data[c][:2]) for c in core_points]))
-
-        neighbors = get_neighbors(X1, best_eps)
-
-        if len(neighbors) >= best_min_samples:
-            current_cluster = []
-            visited_nodes.add(X1)
-            unvisited_nodes.remove(X1)
-
-            if can_add_to_cluster(current_cluster, X1, df, data):
-                current_cluster.append(X1)
+    dist_to_warehouse = distances_from(warehouse, coords)
+    service_times = df['service_time'].to_numpy()
+    available_times = available_delivery_times(df)
 
-            for node in neighbors:
-                if can_add_to_cluster(current_cluster, node, df, data):
-                    visited_nodes.add(node)
-                    current_cluster.append(node)
-                    unvisited_nodes.remove(node)
-
-            clusters.append(current_cluster)
-            for node in current_cluster:
-                df.at[node, 'cluster'] = Cnum
-
-            core_points = current_cluster
-            Cnum += 1
-        else:
-            noise_nodes.append(X1)
-            unvisited_nodes.remove(X1)        
+    clusters, totals, noise_nodes, visited_nodes = density_clusters(
+        coords, data, dist_to_warehouse, best_eps, best_min_samples, service_times, available_times)
+    for Cnum, cluster in enumerate(clusters, start=1):
+        for node in cluster:
+            df.at[node, 'cluster'] = Cnum
+    Cnum = len(clusters) + 1
 
     gamma1 = calculate_gamma1(visited_nodes, all_nodes, df)
-    gamma2 = calculate_gamma2(noise_nodes, df, clusters)
+    noise_distances = NoiseDistances(coords, noise_nodes, clusters)
+    gamma2 = calculate_gamma2(noise_nodes, df, clusters, noise_distances)
 
-    procenoiseP1(clusters, noise_nodes, df, Cnum, capacity, gamma1, gamma2, data)
+    procenoiseP1(clusters, noise_nodes, df, Cnum, capacity, gamma1, gamma2, data, totals, noise_distances)
     fused_clusters = microcluster_fusion(clusters, data, capacity, 35000)
     procenoiseP2(fused_clusters, noise_nodes, df, capacity, 35000, data)
 
@@ -339,38 +443,18 @@ def dbscan_cluster(df, warehouse_loc):
     return df
 
 def get_eps_and_min_samples(data):
-    space  = [
-        Real(500, 25000, name='eps'),
-        Integer(1, 40, name='min_samples')
-    ]
-
-    @use_named_args(space)
-    def objective(eps, min_samples):
-        dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-        labels = dbscan.fit_predict(data)
-
-        if len(set(labels)) < 2 or (len(set(labels)) <= 1 and -1 in labels):
-            return 1
-
-        score = -ss(data, labels)
-        return score
-
-    res = gp_minimize(objective, space, n_calls=60, random_state=0)
-
-    best_eps, best_min_samples = res.x
+    best_eps, best_min_samples, _ = tune_dbscan(data[:, :2])
     return best_eps, best_min_samples
 
 
 def travel_time(data, node1, node2):
-    distance = geodesic((data[node1][0], data[node1][1]), (data[node2][0], data[node2][1])).kilometers
-    if distance < 10:
-        speed = 15
-    elif distance < 50:
-        speed = 30
-    else:
-        speed = 40
-    time = (distance / speed) * 60
-    return time
+    return float(travel_time_matrix(data[node1][:2], data[node2][:2])[0, 0])
+
+def travel_time_matrix(origins, destinations):
+    """Travel time in minutes from every origin to every destination, speed by distance band."""
+    distance = distance_matrix(origins, destinations, method='vincenty', dtype=np.float64) / 1000
+    speed = np.select([distance < 10, distance < 50], [15, 30], 40)
+    return (distance / speed) * 60
 
 def can_add_to_cluster(cluster, new_order_index, df, data):
     total_service_time = sum(df.at[node, 'service_time'] for node in cluster) + df.at[new_order_index, 'service_time']
@@ -384,6 +468,82 @@ def can_add_to_cluster(cluster, new_order_index, df, data):
     available_time = available_delivery_time(df.at[new_order_index, 'open_hour'], df.at[new_order_index, 'close_hour'])
     return total_required_time <= available_time
 
+class ClusterTotals:
+    """
+    Demand, service time and route time of a cluster, kept up to date as nodes
+    are added so that can_add does the same check as can_add_to_cluster without
+    summing over the whole cluster. Sums run in insertion order, like the rescans.
+    """
+
+    def __init__(self):
+        self.demand = 0
+        self.service_time = 0
+        self.route_time = 0
+        self.last = None
+
+    @classmethod
+    def of(cls, cluster, data, df):
+        totals = cls()
+        service_times = df['service_time'].to_numpy()
+        for node in cluster:
+            totals.add(node, totals.leg_time(node, data), service_times, data)
+        return totals
+
+    def leg_time(self, node, data):
+        return 0 if self.last is None else travel_time(data, self.last, node)
+
+    def can_add(self, node, leg_time, service_times, available_times):
+        """``leg_time``: travel time from the last node to ``node``, ignored for an empty cluster."""
+        total_service_time = self.service_time + service_times[node]
+        total_delivery_time = 0 if self.last is None else self.route_time + leg_time
+        return total_service_time + total_delivery_time <= available_times[node]
+
+    def add(self, node, leg_time, service_times, data):
+        if self.last is not None:
+            self.route_time += leg_time
+        self.demand += data[node][2]
+        self.service_time += service_times[node]
+        self.last = node
+
+def grow_cluster(candidates, coords, data, service_times, available_times):
+    """
+    Members and ClusterTotals of a cluster built by trying ``candidates`` in order,
+    each added when can_add_to_cluster would accept it.
+    """
+    totals = ClusterTotals()
+    members = []
+    candidates = np.asarray(candidates, dtype=int)
+    service = service_times[candidates]
+    available = np.asarray(available_times)[candidates]
+    k = 0
+    while k < len(candidates) and totals.last is None:
+        if totals.can_add(int(candidates[k]), 0, service_times, available_times):
+            members.append(int(candidates[k]))
+            totals.add(int(candidates[k]), 0, service_times, data)
+        k += 1
+    while k < len(candidates):
+        # A candidate that does not fit even with a zero-length leg is skipped without computing
+        # its leg, it cannot fit later either since the totals only grow
+        rest = np.arange(k, len(candidates))
+        block = rest[(totals.service_time + service[rest]) + totals.route_time <= available[rest]][:LEG_BLOCK]
+        if len(block) == 0:
+            break
+        # Legs from the last node (row 0) and from each block member (rows 1..) to the block
+        legs = travel_time_matrix(coords[np.concatenate(([totals.last], candidates[block]))], coords[candidates[block]])
+        row = 0
+        for i, j in enumerate(block):
+            node = int(candidates[j])
+            if totals.can_add(node, legs[row, i], service_times, available_times):
+                members.append(node)
+                totals.add(node, legs[row, i], service_times, data)
+                row = i + 1
+        k = block[-1] + 1
+    return members, totals
+
+def available_delivery_times(df):
+    """available_delivery_time of every row of ``df``."""
+    return [available_delivery_time(open_hour, close_hour) for open_hour, close_hour in zip(df['open_hour'], df['close_hour'])]
+
 def available_delivery_time(open_hour, close_hour, truck_start_hour='08:00', truck_end_hour='17:00'):
     truck_start_time = datetime.strptime(truck_start_hour, "%H:%M").time()
     truck_end_time = datetime.strptime(truck_end_hour, "%H:%M").time()
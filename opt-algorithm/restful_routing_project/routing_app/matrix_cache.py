@@ -0,0 +1,103 @@
+"""
+Persistent distance/time/emission matrix cache keyed by ordered location id pairs.
+
+A distribution center re-optimizes the same ``loc_dest_id`` set many times a day,
+so only pairs involving newly seen (or moved) locations need to be computed.
+"""
+
+import os
+
+import numpy as np
+
+from .cache_store import CACHE_DIR, SqliteCache, env_flag, env_number
+from .logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+MATRIX_CACHE_ENABLED = env_flag('MATRIX_CACHE_ENABLED', True)
+MATRIX_CACHE_PATH = os.getenv('MATRIX_CACHE_PATH', str(CACHE_DIR / 'routing_cache.sqlite3'))
+MATRIX_CACHE_TTL_SECONDS = env_number('MATRIX_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+MATRIX_CACHE_MAX_ENTRIES = env_number('MATRIX_CACHE_MAX_ENTRIES', 2_000_000)
+
+# Cached coordinates must match the request to this precision (~1 cm), otherwise
+# the location has moved and the pair is recomputed.
+COORD_TOLERANCE = 1e-7
+
+_matrix_cache = None
+
+
+class MatrixCache:
+    def __init__(self, store):
+        self.store = store
+        self.pairs_computed = 0
+
+    @staticmethod
+    def key(method, origin_id, dest_id):
+        return f"{method}:{origin_id}:{dest_id}"
+
+    def lookup(self, ids, coords, method, need_emission=False):
+        """
+        Fill matrices for ``ids`` from the cache.
+
+        Returns (distance, time, emission, missing) where ``missing`` is an (n, n)
+        bool mask of the pairs that still have to be computed.
+        """
+        n = len(ids)
+        distance = np.zeros((n, n), dtype=np.float32)
+        time = np.zeros((n, n), dtype=np.float32)
+        emission = np.zeros((n, n), dtype=np.float32)
+        missing = np.ones((n, n), dtype=bool)
+
+        # self.key of every pair, row by row
+        prefixes = [self.key(method, a, '') for a in ids]
+        suffixes = [str(b) for b in ids]
+        keys = [prefix + suffix for prefix in prefixes for suffix in suffixes]
+        found = list(map(self.store.get_many(keys).get, keys))
+        present = np.fromiter((entry is not None for entry in found), dtype=bool, count=n * n)
+        if not present.any():
+            return distance, time, emission, missing
+
+        # (lat1, lon1, lat2, lon2, distance, time, emission) rows, a missing emission becomes NaN
+        entries = np.array([entry for entry in found if entry is not None], dtype=np.float64)
+        rows, cols = np.divmod(np.flatnonzero(present), n)
+        coords = np.asarray(coords, dtype=np.float64)
+        usable = ((np.abs(entries[:, 0:2] - coords[rows]) <= COORD_TOLERANCE).all(axis=1)
+                  & (np.abs(entries[:, 2:4] - coords[cols]) <= COORD_TOLERANCE).all(axis=1))
+        if need_emission:
+            usable &= ~np.isnan(entries[:, 6])
+        rows, cols, entries = rows[usable], cols[usable], entries[usable]
+        distance[rows, cols] = entries[:, 4]
+        time[rows, cols] = entries[:, 5]
+        emission[rows, cols] = np.nan_to_num(entries[:, 6], nan=0.0)
+        missing[rows, cols] = False
+        return distance, time, emission, missing
+
+    def save(self, ids, coords, method, distance, time, emission, pairs, emission_resolved=None):
+        """Store the ``pairs`` mask of the matrices, emission is stored only where resolved."""
+        items = {}
+        for r, c in zip(*np.nonzero(pairs)):
+            em = None
+            if emission_resolved is not None and emission_resolved[r][c]:
+                em = float(emission[r][c])
+            items[self.key(method, ids[r], ids[c])] = [
+                float(coords[r][0]), float(coords[r][1]), float(coords[c][0]), float(coords[c][1]),
+                float(distance[r][c]), float(time[r][c]), em,
+            ]
+        self.store.set_many(items)
+        self.pairs_computed += len(items)
+
+    def stats(self):
+        return {**self.store.stats(), 'pairs_computed': self.pairs_computed}
+
+
+def get_matrix_cache():
+    """Process-wide matrix cache, or None when disabled with MATRIX_CACHE_ENABLED=false."""
+    global _matrix_cache
+    if not MATRIX_CACHE_ENABLED:
+        return None
+    if _matrix_cache is None:
+        store = SqliteCache(MATRIX_CACHE_PATH, 'matrix_pairs',
+                            ttl_seconds=MATRIX_CACHE_TTL_SECONDS, max_entries=MATRIX_CACHE_MAX_ENTRIES)
+        _matrix_cache = MatrixCache(store)
+        logger.info(f"[MatrixCache] Using {MATRIX_CACHE_PATH} (ttl={MATRIX_CACHE_TTL_SECONDS}s, max_entries={MATRIX_CACHE_MAX_ENTRIES})")
+    return _matrix_cache
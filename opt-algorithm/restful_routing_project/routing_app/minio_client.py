@@ -12,6 +12,8 @@ MINIO_ACCESS_KEY = os.getenv('MINIO_ACCESS_KEY', 'minioadmin')
 MINIO_SECRET_KEY = os.getenv('MINIO_SECRET_KEY', 'minioadmin')
 MINIO_BUCKET = os.getenv('MINIO_BUCKET', 'runs')
 SECURE = os.getenv('MINIO_SECURE', 'False').lower() == 'true'
+RESULT_FILE = 'emissions.json'
+BATCH_RESULT_FILE = 'emissions_batch.json'
 
 def get_client():
     return Minio(
@@ -21,15 +23,19 @@ def get_client():
         secure=SECURE
     )
 
-def get_inference_result(dag_run_id):
+def get_inference_result(dag_run_id, filename=RESULT_FILE):
     """
     Retrieves the inference result from MinIO based on the dag_run_id.
     Path: s3://runs/{dag_run_id}/emissions.json
+
+    Batched runs write {dag_run_id}/emissions_batch.json (BATCH_RESULT_FILE) with
+    {"results": [{"origin": ..., "dest": ..., "Emission Rate": {...}}, ...]}
+    in the same order as the pairs in the DAG run conf.
     """
     logger.info(f"[get_inference_result] Retrieving result for dag_run_id: {dag_run_id}")
     client = get_client()
     # Bucket is defined in MINIO_BUCKET (default 'runs')
-    object_name = f"{dag_run_id}/emissions.json"
+    object_name = f"{dag_run_id}/{filename}"
     
     try:
         response = client.get_object(bucket_name=MINIO_BUCKET, object_name=object_name)
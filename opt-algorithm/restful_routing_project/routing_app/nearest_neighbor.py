@@ -1,8 +1,10 @@
 from datetime import datetime, time, timedelta
 import os
 import googlemaps
+import numpy as np
 import polyline
 from .logger_utils import get_logger
+from .route_service import get_route_service
 
 # Read API key from container environment (set via docker-compose)
 API_KEY = os.getenv('GOOGLE_MAPS_API_KEY') or os.getenv('API_KEY')
@@ -32,103 +34,131 @@ def nearest_neighbor_runner(bin_cluster_data, distances, times, distance_from_DC
     logger.info(f"[nearest_neighbor_runner] COMPLETE - total_time={total_time}, total_distance={total_distance}m")
     return NN_all_coords, NN_directions_results, NN_route_loc_dest_ids, NN_unreachable_loc_dest_ids, total_time, total_time_with_waiting, total_distance, location_dest_info
 
+def microseconds(values, unit_us):
+    """
+    Whole microseconds of timedelta(<unit>=value) for every value, ``unit_us``
+    microseconds per unit: the whole units are exact and the fraction is rounded
+    half to even, as timedelta does.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    fraction, whole = np.modf(values)
+    scaled = fraction * unit_us
+    floor = np.floor(scaled)
+    base = whole.astype(np.int64) * unit_us + floor.astype(np.int64)
+    rest = scaled - floor
+    return base + ((rest > 0.5) | ((rest == 0.5) & (base % 2 == 1)))
+
+def clock_microseconds(times):
+    """Microseconds since midnight of datetime.time values."""
+    return np.array([((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond for t in times], dtype=np.int64)
+
+def clock_string(us):
+    seconds = (int(us) // 1_000_000) % (24 * 3600)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def nearest_feasible(costs, feasible):
+    """Position of the lowest cost where ``feasible``, the first one on ties, or None when none is finite."""
+    costs = np.where(feasible, costs, np.inf)
+    if not len(costs):
+        return None
+    pick = int(np.argmin(costs))
+    return pick if costs[pick] < np.inf else None
+
 def nearest_neighbor_vrptw(locations, distance_matrix, time_matrix, initial_distance, initial_duration):
+    """
+    Route from location 0 to the nearest (by ``distance_matrix``) location that can
+    still be reached before it closes, until none can. Clock times are int64
+    microseconds since midnight (the route starts at 08:00), travel times come
+    from ``time_matrix`` in seconds and service times from 'service_time' in minutes.
+    Returns (route, unreachable, total_time, total_time_with_waiting, total_distance, location_dest_info).
+    """
     logger.info(f"[nearest_neighbor_vrptw] START - Processing {len(locations)} locations")
     location_dest_info = []
 
     num_locations = len(locations)
-    unvisited = set(range(num_locations))   
-    route = []   
-    unreachable = []   
-    total_time = timedelta(seconds=initial_duration)   
-    total_time_waiting = total_time
-    total_distance = initial_distance   
-     
-    start_time = time(8, 0)
-    current_time = datetime.combine(datetime.today(), start_time)
-    service_time = timedelta(minutes=locations.iloc[0]['service_time'])  # 15 minutes service time
-    logger.info(f"[nearest_neighbor_vrptw] Starting at {current_time.strftime('%H:%M:%S')} from DC")
-     
-
-    first_location_index = 0   
-    first_location = locations.iloc[first_location_index]
-
+    distances = np.asarray(distance_matrix, dtype=np.float64)
+    travel_us = microseconds(time_matrix, 1_000_000)
+    service_us = microseconds(locations['service_time'].to_numpy(dtype=np.float64), 60_000_000)
+    open_us = clock_microseconds(locations['open_hour'])
+    close_us = clock_microseconds(locations['close_hour'])
+
+    unvisited = np.ones(num_locations, dtype=bool)
+    route = []
+    unreachable = []
+    total_us = microseconds(initial_duration, 1_000_000).item()
+    waiting_total_us = total_us
+    total_distance = initial_distance
+
+    current_us = clock_microseconds([time(8, 0)])[0].item()
+    logger.info(f"[nearest_neighbor_vrptw] Starting at {clock_string(current_us)} from DC")
+
+    first_location_index = 0
     route.append(first_location_index)
-    unvisited.remove(first_location_index)
-    current_time += timedelta(seconds=initial_duration)
-    open_time = datetime.combine(datetime.today(), locations.iloc[first_location_index]['open_hour'])
-    if current_time < open_time:
-        waiting_duration = open_time - current_time
-        total_time_waiting += waiting_duration
-        current_time += waiting_duration
-        print(f"Arrived early at {locations.iloc[first_location_index]['address']}. Waiting for {waiting_duration} until it opens at {open_time.strftime('%H:%M:%S')}")
-
-    print(f"First stop: {first_location['address']} at {current_time.strftime('%H:%M:%S')}, travel time: {initial_duration/60} minutes, travel distance: {initial_distance} meters")
+    unvisited[first_location_index] = False
+    current_us += total_us
+    if current_us < open_us[first_location_index]:
+        waiting_total_us += int(open_us[first_location_index]) - current_us
+        current_us = int(open_us[first_location_index])
+
+    logger.debug(f"[nearest_neighbor_vrptw] First stop: {first_location_index} at {clock_string(current_us)}, "
+                 f"travel time: {initial_duration/60} minutes, travel distance: {initial_distance} meters")
     location_dest_info.append({
-        "loc_dest_id" : first_location['loc_dest_id'],
+        "loc_dest_id" : locations.iloc[first_location_index]['loc_dest_id'],
         "queue": 1,
-        "eta": current_time.strftime('%H:%M:%S'),
+        "eta": clock_string(current_us),
         "travel_time" : initial_duration/60,
         "travel_distance" :initial_distance
     })
     # service time first location
-    current_time += service_time
-    total_time += service_time
-    
-    while unvisited:
-        current_index = route[-1] if route else -1   
-        next_index = None
-        min_distance = float('inf')
-        
-        for loc_index in unvisited:
-            travel_distance = distance_matrix[current_index][loc_index]
-            travel_time_seconds = time_matrix[current_index][loc_index]
-            travel_time = timedelta(seconds=travel_time_seconds)
-            arrival_time = current_time + travel_time
-            open_time = datetime.combine(datetime.today(), locations.iloc[loc_index]['open_hour'])
-            close_time = datetime.combine(datetime.today(), locations.iloc[loc_index]['close_hour'])
-            
-            if arrival_time <= close_time and travel_distance < min_distance:
-                if arrival_time < open_time:
-                    waiting_duration = open_time - arrival_time
-                    total_time_waiting += waiting_duration
-                    arrival_time = open_time
-                    print(f"Arrived early at {locations.iloc[loc_index]['address']}. Waiting for {waiting_duration} until it opens at {open_time.strftime('%H:%M:%S')}")
-                    next_index = loc_index
-                    min_time = arrival_time
-                    min_travel_time = travel_time
-                    min_distance = travel_distance
-                if open_time <= arrival_time <= close_time:
-                    next_index = loc_index
-                    min_time = arrival_time
-                    min_travel_time = travel_time
-                    min_distance = travel_distance
-
-        if next_index is None:
-            unreachable.extend(unvisited)
+    current_us += int(service_us[first_location_index])
+    total_us += int(service_us[first_location_index])
+
+    while unvisited.any():
+        current_index = route[-1]
+        candidates = np.flatnonzero(unvisited)
+        arrival = current_us + travel_us[current_index, candidates]
+        feasible = arrival <= close_us[candidates]
+        candidate_distances = distances[current_index, candidates]
+        next_pick = nearest_feasible(candidate_distances, feasible)
+        # Candidates are scanned in index order and every one that became the nearest
+        # so far waited for its opening, chosen or not; that waiting is kept in the total
+        reached = candidates[feasible]
+        reached_distances = candidate_distances[feasible]
+        nearest_so_far = reached_distances < np.minimum.accumulate(np.concatenate(([np.inf], reached_distances[:-1])))
+        early = nearest_so_far & (arrival[feasible] < open_us[reached])
+        waiting_total_us += int((open_us[reached][early] - arrival[feasible][early]).sum())
+
+        if next_pick is None:
+            unreachable.extend(candidates.tolist())
             break
 
-        total_time += min_travel_time
-        total_time_waiting += min_travel_time
+        next_index = int(candidates[next_pick])
+        leg_us = int(travel_us[current_index, next_index])
+        min_distance = distance_matrix[current_index][next_index]
+        arrival_us = max(int(arrival[next_pick]), int(open_us[next_index]))
+
+        total_us += leg_us
+        waiting_total_us += leg_us
         total_distance += min_distance
-        print(f"Next stop: {locations.iloc[next_index]['address']} at {min_time.strftime('%H:%M:%S')}, travel time: {min_travel_time}, travel distance: {min_distance} meters")
+        logger.debug(f"[nearest_neighbor_vrptw] Next stop: {next_index} at {clock_string(arrival_us)}, "
+                     f"travel time: {timedelta(microseconds=leg_us)}, travel distance: {min_distance} meters")
         location_dest_info.append({
             "loc_dest_id" : locations.iloc[next_index]['loc_dest_id'],
             "queue": len(location_dest_info) + 1,
-            "eta": min_time.strftime('%H:%M:%S'),
-            "travel_time" : min_travel_time.total_seconds() / 60,
+            "eta": clock_string(arrival_us),
+            "travel_time" : timedelta(microseconds=leg_us).total_seconds() / 60,
             "travel_distance" :min_distance
         })
 
-        current_time = min_time
-
         # service time each location
-        current_time += timedelta(minutes=locations.iloc[next_index]['service_time']) 
-        total_time += timedelta(minutes=locations.iloc[next_index]['service_time']) 
-        
+        current_us = arrival_us + int(service_us[next_index])
+        total_us += int(service_us[next_index])
+
         route.append(next_index)
-        unvisited.remove(next_index)
-    
+        unvisited[next_index] = False
+
+    total_time = timedelta(microseconds=total_us)
+    total_time_waiting = timedelta(microseconds=waiting_total_us)
     logger.info(f"[nearest_neighbor_vrptw] Route: {route}")
     logger.info(f"[nearest_neighbor_vrptw] Total travel time: {total_time}")
     logger.info(f"[nearest_neighbor_vrptw] Total travel time with waiting: {total_time_waiting}")
@@ -143,25 +173,8 @@ def calculate_total_distance(route_indices, distance_matrix, distance_from_DC):
     return total_distance + distance_from_DC
 
 def fetch_concatenate_route(latitude, longitude, ori_lat, ori_long):
-    all_coords = []   
-    first_location_coords = (latitude, longitude)  # Use a tuple for coordinates
-    gmaps = googlemaps.Client(key=API_KEY)  # Initialize the client outside of the directions call
-    
-    # Fetch directions
-    first_segment_result = gmaps.directions(
-        origin=(ori_lat, ori_long),
-        destination=first_location_coords,
-        mode="driving",
-        departure_time=datetime.now()
-    )
-    
-    # Check if there is a result and extract polyline
-    if first_segment_result:
-        first_polyline_encoded = first_segment_result[0]['overview_polyline']['points']
-        first_polyline_decoded = polyline.decode(first_polyline_encoded)
-        all_coords.extend(first_polyline_decoded)
-        
-    return all_coords
+    # Decoded overview polyline of the leg, through the cached route service
+    return get_route_service().leg((ori_lat, ori_long), (latitude, longitude)).coords()
 
 
 def fetch_concatenate_routes(route_indices, location_data, google_maps_client, dc_banten_coords):
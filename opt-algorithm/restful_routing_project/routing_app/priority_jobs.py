@@ -0,0 +1,227 @@
+"""
+Asynchronous /api/priority jobs.
+
+POST /api/priority/jobs validates the request, queues it and returns a job id
+straight away; the pipeline runs in a bounded process pool so a long OR-Tools or
+matrix run neither blocks a server thread nor competes for the GIL. Workers are
+spawned (not forked) and set up Django themselves.
+
+Job state, per-truck progress and the result live in a SQLite table shared by the
+server and the workers. Cancellation is cooperative: a cancelled job stops at its
+next progress report (between trucks), a queued one never starts. Jobs expire
+PRIORITY_JOB_TTL_SECONDS after their last update, and the table keeps at most
+PRIORITY_JOB_MAX_ENTRIES rows.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache_store import CACHE_DIR, SqliteCache, env_number
+from .logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+PRIORITY_JOB_WORKERS = env_number('PRIORITY_JOB_WORKERS', 2)
+# Jobs waiting for a worker beyond this are rejected with 503
+PRIORITY_JOB_MAX_PENDING = env_number('PRIORITY_JOB_MAX_PENDING', 16)
+PRIORITY_JOB_TTL_SECONDS = env_number('PRIORITY_JOB_TTL_SECONDS', 24 * 3600)
+# Expired jobs are only dropped when read again, so the table is also bounded;
+# the least recently updated jobs and cancel flags are evicted first
+PRIORITY_JOB_MAX_ENTRIES = env_number('PRIORITY_JOB_MAX_ENTRIES', 10_000)
+PRIORITY_JOB_STORE_PATH = os.getenv('PRIORITY_JOB_STORE_PATH', str(CACHE_DIR / 'priority_jobs.sqlite3'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+_job_manager = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobStore:
+    """
+    Job records keyed by job id, readable from any process.
+
+    The cancel flag is a separate key so a worker writing progress never
+    overwrites a cancellation from the server. Pickles as its path, so it can be
+    handed to pool workers.
+    """
+
+    def __init__(self, path=PRIORITY_JOB_STORE_PATH, ttl_seconds=PRIORITY_JOB_TTL_SECONDS,
+                 max_entries=PRIORITY_JOB_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cache = SqliteCache(path, 'priority_jobs', ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+    def __getstate__(self):
+        return {'path': self.path, 'ttl_seconds': self.ttl_seconds, 'max_entries': self.max_entries}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def get(self, job_id):
+        return self.cache.get(job_id)
+
+    def put(self, job):
+        self.cache.set(job['job_id'], job)
+
+    def update(self, job_id, **fields):
+        job = self.get(job_id)
+        if job is not None:
+            job.update(fields)
+            self.put(job)
+        return job
+
+    def request_cancel(self, job_id):
+        self.cache.set(f'{job_id}:cancel', True)
+
+    def cancel_requested(self, job_id):
+        return bool(self.cache.get(f'{job_id}:cancel'))
+
+
+def run_job(job_id, data, store, target):
+    """Worker side: run ``target(data, progress)`` and record progress and outcome in ``store``."""
+    if store.cancel_requested(job_id):
+        store.update(job_id, status=CANCELLED, finished_at=time.time())
+        return CANCELLED
+    store.update(job_id, status=RUNNING, started_at=time.time())
+
+    def progress(stage, **details):
+        if store.cancel_requested(job_id):
+            raise JobCancelled()
+        store.update(job_id, progress={'stage': stage, **details})
+        logger.info(f"[PriorityJob {job_id}] {stage} {details}")
+
+    try:
+        # Round trip through JSON like the synchronous Response does, numpy values included
+        result = json.loads(json.dumps(target(data, progress=progress), cls=JSONEncoder))
+    except JobCancelled:
+        logger.info(f"[PriorityJob {job_id}] Cancelled")
+        store.update(job_id, status=CANCELLED, finished_at=time.time())
+        return CANCELLED
+    except Exception as e:
+        logger.exception(f"[PriorityJob {job_id}] Failed: {e}")
+        store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+        return FAILED
+    store.update(job_id, status=SUCCEEDED, result=result, finished_at=time.time())
+    logger.info(f"[PriorityJob {job_id}] Succeeded")
+    return SUCCEEDED
+
+
+def _init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restful_routing_project.settings')
+    import django
+    django.setup()
+
+
+class JobManager:
+    """
+    Args:
+        store: JobStore shared with the workers
+        target: the pipeline, ``target(data, progress=...)`` returning the shipment
+        executor: pool the jobs run in, a spawned process pool by default
+        max_pending: queued jobs allowed on top of the busy workers
+    """
+
+    def __init__(self, store, target, executor=None, max_workers=PRIORITY_JOB_WORKERS,
+                 max_pending=PRIORITY_JOB_MAX_PENDING):
+        self.store = store
+        self.target = target
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._owns_executor = executor is None
+        self.executor = executor or self._process_pool()
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _process_pool(self):
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker)
+
+    def submit(self, data):
+        with self._lock:
+            active = sum(not future.done() for future in self._futures.values())
+            if active >= self.max_workers + self.max_pending:
+                raise JobQueueFull(f"{active} jobs are queued or running, try again later")
+            job_id = uuid.uuid4().hex
+            job = {'job_id': job_id, 'status': QUEUED, 'submitted_at': time.time(), 'started_at': None,
+                   'finished_at': None, 'progress': None, 'error': None}
+            self.store.put(job)
+            try:
+                future = self.executor.submit(run_job, job_id, data, self.store, self.target)
+            except BrokenExecutor:
+                if not self._owns_executor:
+                    raise
+                # A worker died (e.g. killed by the OOM killer), start a fresh pool
+                logger.warning("[PriorityJob] Process pool is broken, starting a new one")
+                self.executor = self._process_pool()
+                future = self.executor.submit(run_job, job_id, data, self.store, self.target)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda future: self._done(job_id, future))
+        logger.info(f"[PriorityJob {job_id}] Queued, {active + 1} jobs queued or running")
+        return job
+
+    def _done(self, job_id, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            # The worker died before it could record the outcome (e.g. a broken pool)
+            logger.error(f"[PriorityJob {job_id}] Worker failed: {error!r}")
+            self.store.update(job_id, status=FAILED, error=repr(error), finished_at=time.time())
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def status(self, job_id):
+        """The job record without its result."""
+        job = self.get(job_id)
+        if job is not None:
+            job.pop('result', None)
+        return job
+
+    def cancel(self, job_id):
+        job = self.status(job_id)
+        if job is None or job['status'] in FINISHED:
+            return job
+        self.store.request_cancel(job_id)
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            return self.store.update(job_id, status=CANCELLED, finished_at=time.time())
+        logger.info(f"[PriorityJob {job_id}] Cancel requested while {job['status']}")
+        return {**job, 'cancel_requested': True}
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def get_job_manager():
+    """Process-wide job manager running the /api/priority pipeline."""
+    global _job_manager
+    if _job_manager is None:
+        from .views import optimize_priority
+        _job_manager = JobManager(JobStore(), optimize_priority)
+        logger.info(f"[PriorityJob] store={PRIORITY_JOB_STORE_PATH}, workers={PRIORITY_JOB_WORKERS}, "
+                    f"max_pending={PRIORITY_JOB_MAX_PENDING}, ttl={PRIORITY_JOB_TTL_SECONDS}s")
+    return _job_manager
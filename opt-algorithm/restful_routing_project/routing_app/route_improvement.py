@@ -0,0 +1,244 @@
+"""
+Local search on one vehicle's google_or route: 2-opt and Or-opt moves under the
+routing model's time windows.
+
+google_or with the default PATH_CHEAPEST_ARC and no metaheuristic, and its
+nearest-neighbor fallback, return routes as they were first built. improve_route
+takes one route and, until no move lowers its arc cost or the time limit runs
+out, applies the best feasible move of:
+- 2-opt: reverse the stops between two positions;
+- Or-opt: move 1 to OR_OPT_MAX_SEGMENT consecutive stops to another position.
+
+The cost change of every candidate is computed at once with arrays over the
+route positions. Candidates that lower the cost are then checked, best first,
+against the model google_or solves (transit in whole seconds, windows, at most
+MAX_WAIT slack per leg, HORIZON). The times a vehicle can be at a stop form an
+interval, so the route keeps forward arrays of the earliest and latest time at
+every position given the stops before it, and backward arrays of the times from
+which the stops after it can still be served. A check only walks the stops the
+move changes and intersects the result with the backward arrays where the
+unchanged rest of the route starts.
+
+Moves only reorder a route, so vehicle capacities still hold.
+"""
+
+import time
+
+import numpy as np
+
+from .cache_store import env_flag, env_number
+from .google_or import HORIZON, MAX_WAIT, TIME_SCALE, arc_costs, transit_seconds
+from .logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+ROUTE_IMPROVEMENT_ENABLED = env_flag('ROUTE_IMPROVEMENT_ENABLED', True)
+# Budget of each truck's route
+ROUTE_IMPROVEMENT_TIME_LIMIT_SECONDS = env_number('ROUTE_IMPROVEMENT_TIME_LIMIT_SECONDS', 0.5, cast=float)
+OR_OPT_MAX_SEGMENT = 3
+# Candidates checked between two looks at the clock
+CHECK_BATCH = 64
+
+
+class RouteLocalSearch:
+    """
+    Route over local node ids, 0 the depot and 1..n the stops: ``order`` holds the
+    node at every position, position 0 leaving the depot and n+1 returning to it.
+    """
+
+    def __init__(self, transit, costs, windows):
+        self.transit = transit
+        self.costs = costs
+        self.transit_rows = transit.tolist()
+        self.opens = windows[:, 0].tolist()
+        self.closes = np.minimum(windows[:, 1], HORIZON).tolist()
+        self.order = np.append(np.arange(len(windows)), 0)
+        self.update()
+
+    def update(self):
+        """Forward and backward time intervals of the current order."""
+        order = self.order.tolist()
+        last = len(order) - 1
+        # The vehicle leaves within the depot's window and may return any time before HORIZON
+        opens = [self.opens[node] for node in order]
+        closes = [self.closes[node] for node in order]
+        opens[last], closes[last] = 0, HORIZON
+        legs = self.transit[self.order[:-1], self.order[1:]].tolist()
+
+        # Times the vehicle can be at each position given the route before it...
+        earliest, latest = opens[:], closes[:]
+        for k in range(1, len(order)):
+            earliest[k] = max(earliest[k - 1] + legs[k - 1], opens[k])
+            latest[k] = min(latest[k - 1] + legs[k - 1] + MAX_WAIT, closes[k])
+        # ...and the times from which it can still serve the route after it
+        earliest_rest, latest_rest = opens[:], closes[:]
+        for k in range(last - 1, -1, -1):
+            earliest_rest[k] = max(opens[k], earliest_rest[k + 1] - legs[k] - MAX_WAIT)
+            latest_rest[k] = min(closes[k], latest_rest[k + 1] - legs[k])
+        self.position_windows = list(zip(opens, closes))
+        self.earliest, self.latest = earliest, latest
+        self.earliest_rest, self.latest_rest = earliest_rest, latest_rest
+
+    def feasible(self):
+        return all(low <= high for low, high in zip(self.earliest, self.latest))
+
+    def fits(self, prefix_end, middle, suffix_start):
+        """Whether the route stays feasible with ``middle`` between positions prefix_end and suffix_start."""
+        node = int(self.order[prefix_end])
+        earliest, latest = self.earliest[prefix_end], self.latest[prefix_end]
+        for following in middle:
+            transit = self.transit_rows[node][following]
+            earliest = max(earliest + transit, self.opens[following])
+            latest = min(latest + transit + MAX_WAIT, self.closes[following])
+            if earliest > latest:
+                return False
+            node = following
+        transit = self.transit_rows[node][int(self.order[suffix_start])]
+        opens, closes = self.position_windows[suffix_start]
+        earliest = max(earliest + transit, opens, self.earliest_rest[suffix_start])
+        latest = min(latest + transit + MAX_WAIT, closes, self.latest_rest[suffix_start])
+        return earliest <= latest
+
+    def candidates(self):
+        """
+        (cost delta, length, first, second) arrays of every move that lowers the
+        cost, cheapest first: 2-opt moves have length 0 and reverse positions
+        first..second, Or-opt moves put the ``length`` stops from position first
+        after position second.
+        """
+        order, costs = self.order, self.costs
+        n = len(order) - 2
+        forward = costs[order[:-1], order[1:]]
+        backward = costs[order[1:], order[:-1]]
+        forward_sums = np.concatenate(([0], np.cumsum(forward)))
+        backward_sums = np.concatenate(([0], np.cumsum(backward)))
+        deltas, lengths, firsts, seconds = [], [], [], []
+
+        # 2-opt: reverse positions i..j, which also reverses the arcs between them
+        i, j = np.triu_indices(n, k=1)
+        i, j = i + 1, j + 1
+        delta = (costs[order[i - 1], order[j]] + costs[order[i], order[j + 1]] - forward[i - 1] - forward[j]
+                 + (backward_sums[j] - backward_sums[i]) - (forward_sums[j] - forward_sums[i]))
+        improving = delta < 0
+        deltas.append(delta[improving])
+        lengths.append(np.zeros(improving.sum(), dtype=np.int64))
+        firsts.append(i[improving])
+        seconds.append(j[improving])
+
+        # Or-opt: move positions i..i+length-1 after position p
+        for length in range(1, min(OR_OPT_MAX_SEGMENT, n) + 1):
+            i = np.arange(1, n - length + 2)[:, None]
+            end = i + length - 1
+            p = np.arange(0, n + 1)[None, :]
+            removed = costs[order[i - 1], order[i]] + costs[order[end], order[end + 1]] - costs[order[i - 1], order[end + 1]]
+            delta = costs[order[p], order[i]] + costs[order[end], order[p + 1]] - costs[order[p], order[p + 1]] - removed
+            improving = ((p < i - 1) | (p > end)) & (delta < 0)
+            rows, cols = np.nonzero(improving)
+            deltas.append(delta[rows, cols])
+            lengths.append(np.full(len(rows), length))
+            firsts.append(rows + 1)
+            seconds.append(cols)
+
+        deltas = np.concatenate(deltas)
+        ranked = np.argsort(deltas, kind='stable')
+        return deltas[ranked], np.concatenate(lengths)[ranked], np.concatenate(firsts)[ranked], np.concatenate(seconds)[ranked]
+
+    def move(self, length, first, second):
+        """(prefix end, middle local nodes, suffix start) of a candidate move."""
+        order = self.order.tolist()
+        if length == 0:
+            return first - 1, order[first:second + 1][::-1], second + 1
+        end = first + length - 1
+        segment = order[first:end + 1]
+        if second < first:
+            return second, segment + order[second + 1:first], end + 1
+        return first - 1, order[end + 1:second + 1] + segment, second + 1
+
+    def improve(self, deadline):
+        """Apply the best feasible move until none lowers the cost, returns the (2-opt, Or-opt) moves applied."""
+        applied = [0, 0]
+        while time.perf_counter() < deadline:
+            _, lengths, firsts, seconds = self.candidates()
+            found = False
+            for checked, (length, first, second) in enumerate(zip(lengths.tolist(), firsts.tolist(), seconds.tolist())):
+                if checked % CHECK_BATCH == CHECK_BATCH - 1 and time.perf_counter() >= deadline:
+                    break
+                prefix_end, middle, suffix_start = self.move(length, first, second)
+                if self.fits(prefix_end, middle, suffix_start):
+                    self.order = np.concatenate((self.order[:prefix_end + 1], middle, self.order[suffix_start:]))
+                    self.update()
+                    applied[length > 0] += 1
+                    found = True
+                    break
+            if not found:
+                break
+        return applied
+
+    def cost(self):
+        return int(self.costs[self.order[:-1], self.order[1:]].sum())
+
+    def duration(self):
+        """Minutes from leaving the depot to the earliest return, waiting included."""
+        return (self.earliest[-1] - self.earliest[0]) / TIME_SCALE
+
+
+def route_data(data, nodes):
+    """The parts of google_or's ``data`` restricted to ``nodes``, in that order."""
+    rows = np.ix_(nodes, nodes)
+    local = {
+        'time_matrix': np.asarray(data['time_matrix'], dtype=np.float64)[rows],
+        'service_times': np.asarray(data['service_times'], dtype=np.float64)[nodes],
+        'objective_type': data.get('objective_type'),
+    }
+    if 'emission_matrix' in data:
+        local['emission_matrix'] = np.asarray(data['emission_matrix'], dtype=np.float64)[rows]
+    return local
+
+
+def route_distance(data, nodes, order):
+    if data.get('distance_matrix') is None:
+        return None
+    route = nodes[order]
+    return float(np.asarray(data['distance_matrix'], dtype=np.float64)[route[:-1], route[1:]].sum())
+
+
+def improve_route(data, route, time_limit=None):
+    """
+    Improve one vehicle's route of google_or ``data`` (its stops in order, ending
+    with the depot like google_or's routes) with 2-opt and Or-opt moves within
+    ``time_limit`` seconds (ROUTE_IMPROVEMENT_TIME_LIMIT_SECONDS by default).
+    Returns (route in the same form, report): the report has the moves applied,
+    the route's time (min, waiting and service included) and distance (m, when
+    ``data`` has a distance_matrix) before the search, and their deltas after it.
+    """
+    started = time.perf_counter()
+    time_limit = ROUTE_IMPROVEMENT_TIME_LIMIT_SECONDS if time_limit is None else time_limit
+    depot = data['depot']
+    nodes = np.array([depot] + [node for node in route if node != depot], dtype=np.int64)
+    local = route_data(data, nodes)
+    transit = transit_seconds(local)
+    windows = np.array([(int(data['time_windows'][node][0] * TIME_SCALE), int(data['time_windows'][node][1] * TIME_SCALE))
+                        for node in nodes.tolist()], dtype=np.int64).reshape(-1, 2)
+    search = RouteLocalSearch(transit, arc_costs(local, transit), windows)
+
+    cost, duration, distance = search.cost(), search.duration(), route_distance(data, nodes, search.order)
+    if search.feasible():
+        two_opt, or_opt = search.improve(started + time_limit)
+    else:
+        logger.warning(f"[RouteImprovement] Route {list(route)} misses its time windows, left unchanged")
+        two_opt, or_opt = 0, 0
+    new_distance = route_distance(data, nodes, search.order)
+    report = {
+        "two_opt_moves": two_opt,
+        "or_opt_moves": or_opt,
+        "cost_delta": search.cost() - cost,
+        "time_before": duration,
+        "time_delta": search.duration() - duration,
+        "distance_before": distance,
+        "distance_delta": None if distance is None else new_distance - distance,
+        "seconds": time.perf_counter() - started,
+    }
+    improved = nodes[search.order[1:-1]].tolist() + [depot]
+    logger.info(f"[RouteImprovement] {len(nodes) - 1} stops: {two_opt} 2-opt + {or_opt} Or-opt moves, "
+                f"cost {report['cost_delta']:+d}, time {report['time_delta']:+.1f} min in {report['seconds'] * 1000:.1f} ms")
+    return improved, report
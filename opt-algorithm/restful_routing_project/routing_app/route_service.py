@@ -0,0 +1,182 @@
+"""
+Route geometry (duration, distance, encoded polyline) for individual legs.
+
+One Directions call per leg serves both the ETA validation and the polyline of the
+shipment output. Legs are cached persistently by origin, destination and a
+time-of-day bucket of the departure, and the legs of a truck route are fetched
+concurrently over a single reused googlemaps client.
+
+Without GOOGLE_MAPS_API_KEY, and whenever Google fails, legs come from
+OfflineDirectionsProvider: a straight line with a distance-based speed heuristic.
+"""
+
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import googlemaps
+import polyline
+from geopy.distance import geodesic
+
+from .cache_store import CACHE_DIR, SqliteCache, env_flag, env_number
+from .logger_utils import get_logger, log_external_call
+
+logger = get_logger(__name__)
+
+API_KEY = os.getenv('GOOGLE_MAPS_API_KEY') or os.getenv('API_KEY')
+
+ROUTE_CACHE_ENABLED = env_flag('ROUTE_CACHE_ENABLED', True)
+ROUTE_CACHE_PATH = os.getenv('ROUTE_CACHE_PATH', str(CACHE_DIR / 'routing_cache.sqlite3'))
+ROUTE_CACHE_TTL_SECONDS = env_number('ROUTE_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+ROUTE_CACHE_MAX_ENTRIES = env_number('ROUTE_CACHE_MAX_ENTRIES', 500_000)
+# Departures within the same slot of the day share a cached leg (traffic repeats daily)
+ROUTE_TIME_BUCKET_MINUTES = env_number('ROUTE_TIME_BUCKET_MINUTES', 60)
+ROUTE_MAX_WORKERS = env_number('ROUTE_MAX_WORKERS', 8)
+
+_route_service = None
+
+
+class Leg(namedtuple('Leg', ['duration', 'distance', 'polyline', 'source'])):
+    """Duration in seconds, distance in meters, encoded overview polyline."""
+
+    def as_directions(self):
+        """Shape of a googlemaps ``directions`` result, for callers that index into it."""
+        return [{
+            'legs': [{
+                'duration': {'value': self.duration},
+                'distance': {'value': self.distance}
+            }],
+            'overview_polyline': {'points': self.polyline},
+        }]
+
+    def coords(self):
+        return polyline.decode(self.polyline) if self.polyline else []
+
+
+class GoogleDirectionsProvider:
+    name = 'google'
+
+    def __init__(self, api_key=API_KEY):
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = googlemaps.Client(key=self.api_key)
+            return self._client
+
+    def fetch(self, origin, dest, departure_time):
+        log_external_call(logger, "GoogleMaps", "directions", {"origin": str(origin)[:50], "dest": str(dest)[:50]})
+        result = self.client.directions(origin, dest, mode="driving", departure_time=departure_time)
+        if not result:
+            raise ValueError(f"no route from {origin} to {dest}")
+        leg = result[0]['legs'][0]
+        return Leg(leg['duration']['value'], leg['distance']['value'], result[0]['overview_polyline']['points'], self.name)
+
+
+class OfflineDirectionsProvider:
+    """Straight-line legs with heuristic speeds, used offline and in tests."""
+    name = 'offline'
+
+    def fetch(self, origin, dest, departure_time=None):
+        distance_m = geodesic(origin, dest).meters
+        distance_km = distance_m / 1000.0
+        if distance_km < 10:
+            speed_kmh = 15
+        elif distance_km < 50:
+            speed_kmh = 30
+        else:
+            speed_kmh = 40
+        duration_seconds = int(distance_km / speed_kmh * 3600)
+        return Leg(duration_seconds, int(distance_m), polyline.encode([tuple(origin), tuple(dest)]), self.name)
+
+
+class RouteService:
+    """
+    Args:
+        provider: primary directions provider
+        fallback: provider used when the primary one fails (its legs are not cached)
+        cache: SqliteCache for legs, None to disable
+        max_workers: concurrent Directions requests in ``legs``
+    """
+
+    def __init__(self, provider, fallback=None, cache=None, max_workers=ROUTE_MAX_WORKERS,
+                 bucket_minutes=ROUTE_TIME_BUCKET_MINUTES):
+        self.provider = provider
+        self.fallback = fallback
+        self.cache = cache
+        self.max_workers = max_workers
+        self.bucket_minutes = bucket_minutes
+        self.fetched = 0
+        self.fallbacks = 0
+
+    def key(self, origin, dest, departure_time):
+        bucket = (departure_time.hour * 60 + departure_time.minute) // self.bucket_minutes
+        return (f"{self.provider.name}:{float(origin[0]):.6f},{float(origin[1]):.6f}:"
+                f"{float(dest[0]):.6f},{float(dest[1]):.6f}:{bucket}")
+
+    def leg(self, origin, dest, departure_time=None):
+        return self.legs([(origin, dest)], departure_time)[0]
+
+    def legs(self, pairs, departure_time=None):
+        """Legs for a list of (origin, dest) (lat, lon) pairs, cache misses are fetched concurrently."""
+        departure_time = departure_time or datetime.now()
+        keys = [self.key(origin, dest, departure_time) for origin, dest in pairs]
+        found = self.cache.get_many(keys) if self.cache is not None else {}
+        results = [Leg(*found[key][:3], 'cache') if key in found else None for key in keys]
+
+        missing = {}
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                missing.setdefault(key, []).append(i)
+        if not missing:
+            return results
+
+        def fetch(key):
+            origin, dest = pairs[missing[key][0]]
+            try:
+                return self.provider.fetch(origin, dest, departure_time)
+            except Exception as e:
+                if self.fallback is None:
+                    raise
+                logger.warning(f"[RouteService] {self.provider.name} directions failed; using fallback: {e}")
+                return self.fallback.fetch(origin, dest, departure_time)
+
+        workers = max(1, min(self.max_workers, len(missing)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = dict(zip(missing, executor.map(fetch, missing)))
+        self.fetched += len(fetched)
+        self.fallbacks += sum(leg.source != self.provider.name for leg in fetched.values())
+
+        if self.cache is not None:
+            self.cache.set_many({key: list(leg) for key, leg in fetched.items() if leg.source == self.provider.name})
+        for key, indices in missing.items():
+            for i in indices:
+                results[i] = fetched[key]
+        logger.info(f"[RouteService] {len(pairs)} legs: {len(pairs) - sum(map(len, missing.values()))} cached, "
+                    f"{len(fetched)} fetched with {workers} workers")
+        return results
+
+    def stats(self):
+        stats = self.cache.stats() if self.cache is not None else {}
+        return {**stats, 'provider': self.provider.name, 'fetched': self.fetched, 'fallbacks': self.fallbacks}
+
+
+def get_route_service():
+    """Process-wide route service: Google when an API key is configured, offline otherwise."""
+    global _route_service
+    if _route_service is None:
+        cache = None
+        if ROUTE_CACHE_ENABLED:
+            cache = SqliteCache(ROUTE_CACHE_PATH, 'route_legs',
+                                ttl_seconds=ROUTE_CACHE_TTL_SECONDS, max_entries=ROUTE_CACHE_MAX_ENTRIES)
+        provider = GoogleDirectionsProvider() if API_KEY else OfflineDirectionsProvider()
+        _route_service = RouteService(provider, fallback=OfflineDirectionsProvider(), cache=cache)
+        logger.info(f"[RouteService] provider={provider.name}, cache={ROUTE_CACHE_PATH if cache else None}, "
+                    f"bucket={ROUTE_TIME_BUCKET_MINUTES}min, workers={ROUTE_MAX_WORKERS}")
+    return _route_service
@@ -0,0 +1,85 @@
+"""
+Radius and farthest-point queries on (latitude, longitude) points.
+
+A BallTree over radian coordinates answers haversine queries in O(log n). The
+haversine distance is within ~0.56% of the WGS-84 one (see distance_matrix), so
+each query widens its bound by HAVERSINE_MARGIN to collect every candidate and
+then decides on distance_matrix(method=...) distances to those candidates only.
+Results are the same as comparing against a full row of the distance matrix.
+"""
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from .distance_matrix import EARTH_RADIUS_M, as_coords, distance_matrix, haversine_matrix
+
+HAVERSINE_MARGIN = 0.01
+# Covers rounding between the BallTree's haversine and haversine_matrix
+BOUND_SLACK_M = 1.0
+
+
+class GeoIndex:
+    """BallTree over ``coords`` with exact distances by ``method``."""
+
+    def __init__(self, coords, method='vincenty'):
+        self.coords = as_coords(coords)
+        self.method = method
+        self.tree = BallTree(np.radians(self.coords), metric='haversine')
+
+    def within(self, point, radius_m, mask=None):
+        """Ascending indices of the points within ``radius_m`` of ``point``, limited to ``mask`` if given."""
+        bound = radius_m * (1 + HAVERSINE_MARGIN) / EARTH_RADIUS_M
+        candidates = self.tree.query_radius(np.radians(as_coords(point)), r=bound)[0]
+        if mask is not None:
+            candidates = candidates[mask[candidates]]
+        candidates = np.sort(candidates)
+        distances = distance_matrix(point, self.coords[candidates], method=self.method, dtype=np.float64)[0]
+        return candidates[distances <= radius_m]
+
+    def nearest_haversine(self, points):
+        """Haversine distance in meters from each of ``points`` to its nearest indexed point."""
+        points = as_coords(points)
+        if len(points) == 0:
+            return np.empty(0)
+        distances, _ = self.tree.query(np.radians(points), k=1)
+        return distances[:, 0] * EARTH_RADIUS_M
+
+
+class NearestDistances:
+    """
+    Distance from each of ``points`` to its nearest point of ``index``.
+
+    Every point is within (distance to the index's center) +- (index radius) of
+    its nearest indexed point, so farthest only queries the tree for points that
+    can beat the best lower bound, and computes exact distances only for those
+    that can be the farthest. Both are kept for later calls.
+    """
+
+    def __init__(self, index, points):
+        self.index = index
+        self.points = as_coords(points)
+        center = index.coords.mean(axis=0)
+        self.radius = haversine_matrix(center, index.coords, dtype=np.float64).max()
+        self.to_center = haversine_matrix(center, self.points, dtype=np.float64)[0]
+        self.approx = np.full(len(self.points), np.nan)
+        self.exact = np.full(len(self.points), np.nan)
+
+    def farthest(self, mask):
+        """Index of the point in ``mask`` farthest from the index, ties to the lowest index."""
+        candidates = np.flatnonzero(mask)
+        to_center = self.to_center[candidates]
+        # The bounds are haversine, the winner is decided on index.method distances
+        upper = (to_center + self.radius) * (1 + HAVERSINE_MARGIN) + BOUND_SLACK_M
+        lower = (to_center - self.radius) * (1 - HAVERSINE_MARGIN)
+        candidates = candidates[upper >= lower.max()]
+        missing = candidates[np.isnan(self.approx[candidates])]
+        if len(missing):
+            self.approx[missing] = self.index.nearest_haversine(self.points[missing])
+
+        approx = self.approx[candidates]
+        candidates = candidates[approx * (1 + HAVERSINE_MARGIN) >= approx.max() * (1 - HAVERSINE_MARGIN)]
+        missing = candidates[np.isnan(self.exact[candidates])]
+        if len(missing):
+            self.exact[missing] = distance_matrix(self.points[missing], self.index.coords,
+                                                  method=self.index.method, dtype=np.float64).min(axis=1)
+        return int(candidates[np.argmax(self.exact[candidates])])
@@ -1,3 +1,561 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from datetime import time as clock
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from geopy.distance import geodesic
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+from . import airflow_client
+from .cache_store import SqliteCache
+from .dbscan_tuning import DbscanParameterStore, dbscan_parameters, silhouette_objective, tune_dbscan
+from .distance_matrix import distance_matrix
+from .emission_cache import EmissionCache, geohash
+from .google_or import HORIZON, MAX_WAIT, TIME_SCALE, google_or, nearest_neighbor_routes, search_parameters_from, transit_seconds
+from .emission_service import AirflowEmissionBackend, LocalEmissionBackend, compute_emissions
+from .helper import (NoiseDistances, dbscan_cluster, get_cached_distance_time_matrices, get_distance_time_matrices,
+                     microcluster_fusion, procenoiseP2)
+from .matrix_cache import MatrixCache
+from .nearest_neighbor import microseconds, nearest_neighbor_vrptw
+from .priority_jobs import CANCELLED, SUCCEEDED, JobManager, JobQueueFull, JobStore
+from .route_improvement import improve_route
+from .route_service import Leg, OfflineDirectionsProvider, RouteService
+from .spatial_index import GeoIndex, NearestDistances
+from .views import greedy_capacity_fill
+
+
+class DistanceMatrixTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.coords = rng.uniform([-6.6, 106.4], [-5.9, 107.2], size=(12, 2))
+        self.reference = np.array([[geodesic(a, b).meters for b in self.coords] for a in self.coords])
+
+    def test_vincenty_matches_geodesic(self):
+        result = distance_matrix(self.coords, method='vincenty', dtype=np.float64)
+        np.testing.assert_allclose(result, self.reference, atol=1e-3)
+
+    def test_haversine_within_documented_bound(self):
+        result = distance_matrix(self.coords, method='haversine')
+        self.assertEqual(result.dtype, np.float32)
+        mask = self.reference > 0
+        rel_err = np.abs(result[mask] - self.reference[mask]) / self.reference[mask]
+        self.assertLess(rel_err.max(), 0.006)
+
+    def test_antipodal_pairs_fall_back_to_karney(self):
+        result = distance_matrix([[0.0, 0.0]], [[0.5, 179.7]], method='vincenty', dtype=np.float64)
+        self.assertAlmostEqual(result[0, 0], geodesic((0.0, 0.0), (0.5, 179.7)).meters, places=3)
+
+
+DBSCAN_CORPUS = Path(__file__).resolve().parent / 'testdata' / 'dbscan_corpus.json'
+NN_CORPUS = Path(__file__).resolve().parent / 'testdata' / 'nn_corpus.json'
+
+
+class SpatialIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.coords = np.column_stack([-6.2 + rng.normal(0, 0.2, 400), 106.8 + rng.normal(0, 0.2, 400)])
+        self.coords[10] = self.coords[3]
+
+    def test_within_matches_full_distance_row(self):
+        index = GeoIndex(self.coords)
+        mask = np.arange(400) % 3 != 0
+        for point in (0, 3, 77):
+            row = distance_matrix(self.coords[point], self.coords, method='vincenty', dtype=np.float64)[0]
+            expected = np.flatnonzero((row <= 15000) & mask)
+            np.testing.assert_array_equal(index.within(self.coords[point], 15000, mask), expected)
+
+    def test_farthest_matches_brute_force(self):
+        core = [5, 6, 7, 8]
+        nearest = NearestDistances(GeoIndex(self.coords[core]), self.coords)
+        full = distance_matrix(self.coords, self.coords[core], method='vincenty', dtype=np.float64).min(axis=1)
+        mask = np.ones(400, dtype=bool)
+        mask[core] = False
+        for _ in range(20):
+            farthest = nearest.farthest(mask)
+            self.assertEqual(farthest, int(np.flatnonzero(mask)[np.argmax(full[mask])]))
+            mask[farthest] = False
+
+        # 0 is farther by haversine, 1 by vincenty: the bounds need the haversine margin
+        points = [(-5.75, 106.8), (-6.2, 107.2505)]
+        nearest = NearestDistances(GeoIndex([(-6.2, 106.8)]), points)
+        full = distance_matrix(points, [(-6.2, 106.8)], method='vincenty', dtype=np.float64)[:, 0]
+        self.assertEqual(int(np.argmax(full)), 1)
+        self.assertEqual(nearest.farthest(np.ones(2, dtype=bool)), 1)
+
+
+class DbscanCorpusTests(SimpleTestCase):
+    def test_labels_match_corpus(self):
+        for case in json.loads(DBSCAN_CORPUS.read_text())['cases']:
+            df = pd.DataFrame(case['rows'])
+            for column in ('open_hour', 'close_hour'):
+                df[column] = df[column].apply(lambda s: clock(int(s[:2]), int(s[3:])))
+            labels = dbscan_cluster(df, case['warehouse'])['cluster'].tolist()
+            with self.subTest(seed=case['seed'], points=len(df)):
+                self.assertEqual([int(x) if x == x else None for x in labels], case['labels'])
+
+
+class NoiseStageTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.coords = np.column_stack([-6.2 + rng.normal(0, 0.2, 30), 106.8 + rng.normal(0, 0.2, 30)])
+
+    def test_noise_distances_match_geodesic_means(self):
+        noise, clusters = [0, 1, 2], [[3, 4, 5], [6], [], [7, 8]]
+        distances = NoiseDistances(self.coords, noise, clusters)
+        distances.add(1, 9)
+        clusters[1].append(9)
+        for node in noise:
+            expected = [np.mean([geodesic(self.coords[node], self.coords[m]).meters for m in cluster]) if cluster else np.nan
+                        for cluster in clusters]
+            np.testing.assert_allclose(distances.means(node), expected, rtol=1e-7)
+
+    def test_fusion_takes_first_cluster_in_reach(self):
+        data = np.array([[-6.20, 106.80, 5], [-6.90, 107.50, 5], [-6.30, 106.80, 5], [-6.21, 106.80, 5], [-6.22, 106.81, 9]])
+        clusters = [[0], [1], [2], [3], [4]]
+        fused = microcluster_fusion(clusters, data, capacity=10, max_distance=35000)
+        # 0 fuses with 2, the first cluster within 35 km, not the closer 3; 3 + 4 exceed capacity
+        self.assertEqual(fused, [[0, 2], [1], [3], [4]])
+        self.assertEqual(clusters, [])
+
+    def test_p2_assigns_nearest_centroid_with_room(self):
+        data = np.array([[-6.20, 106.80, 5], [-6.40, 106.80, 5], [-6.25, 106.80, 1], [-6.21, 106.80, 5]])
+        df = pd.DataFrame({'demand': data[:, 2], 'cluster': [1, 2, np.nan, np.nan]})
+        fused, noise = [[0], [1]], [2, 3]
+        procenoiseP2(fused, noise, df, capacity=10, max_distance=35000, data=data)
+        # 2 joins cluster 1; 3 is closer to it but only fits in cluster 2
+        self.assertEqual(fused, [[0, 2], [1, 3]])
+        self.assertEqual(df['cluster'].tolist(), [1, 2, 1, 2])
+        self.assertEqual(noise, [])
+
+
+class DbscanTuningTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        # Two delivery areas ~45 km apart
+        self.coords = np.vstack([rng.normal([-6.2, 106.6], 0.02, (40, 2)), rng.normal([-6.2, 107.0], 0.02, (40, 2))])
+        self.store = DbscanParameterStore(SqliteCache(':memory:', 'dbscan_parameters'), drift=0.2)
+
+    def test_tuning_separates_delivery_areas(self):
+        eps, min_samples, score = tune_dbscan(self.coords, n_calls=12, batch=4, workers=2)
+        distances = distance_matrix(self.coords, method='vincenty', dtype=np.float32)
+        self.assertLess(score, -0.5)
+        self.assertEqual(score, silhouette_objective(distances, eps, min_samples))
+
+    def test_stored_parameters_reused_until_locations_drift(self):
+        self.store.put('DC-1', self.coords, 3000.0, 4, -0.8)
+        with mock.patch('routing_app.dbscan_tuning.tune_dbscan', return_value=(1500.0, 6, -0.7)) as tune:
+            self.assertEqual(dbscan_parameters(self.coords[:75], 'DC-1', self.store), (3000.0, 4))
+            tune.assert_not_called()
+            moved = self.coords + [0.3, 0.0]
+            self.assertEqual(dbscan_parameters(moved, 'DC-1', self.store), (1500.0, 5))
+            self.assertEqual(dbscan_parameters(moved, 'DC-1', self.store), (1500.0, 5))
+            tune.assert_called_once()
+        self.assertEqual(self.store.retuned, 1)
+
+    def test_defaults_without_store(self):
+        self.assertEqual(dbscan_parameters(self.coords, 'DC-1'), (25000, 5))
+
+
+class MatrixCacheTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.locations = pd.DataFrame({
+            'loc_dest_id': [10, 11, 12, 12, 13],
+            'latitude': rng.uniform(-6.5, -6.0, 5),
+            'longitude': rng.uniform(106.5, 107.0, 5),
+        })
+        # Two orders delivered to the same location
+        self.locations.loc[3, ['latitude', 'longitude']] = self.locations.loc[2, ['latitude', 'longitude']]
+        self.cache = MatrixCache(SqliteCache(':memory:', 'matrix_pairs', ttl_seconds=3600, max_entries=100))
+
+    def test_cached_matrices_match_uncached(self):
+        expected = get_distance_time_matrices(self.locations)
+        for _ in range(2):
+            result = get_cached_distance_time_matrices(self.locations, self.cache)
+            for exp, res in zip(expected, result):
+                np.testing.assert_array_equal(exp, res)
+        self.assertEqual(self.cache.stats()['hits'], 16)
+
+    def test_only_new_locations_are_computed(self):
+        get_cached_distance_time_matrices(self.locations.iloc[:3], self.cache)
+        self.assertEqual(self.cache.pairs_computed, 9)
+        get_cached_distance_time_matrices(self.locations, self.cache)
+        self.assertEqual(self.cache.pairs_computed, 16)
+
+    def test_lru_eviction_and_ttl(self):
+        store = SqliteCache(':memory:', 'small', ttl_seconds=None, max_entries=2)
+        store.set_many({'a': 1, 'b': 2})
+        store.get('a')
+        store.set('c', 3)
+        self.assertEqual(store.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+        expiring = SqliteCache(':memory:', 'expiring', ttl_seconds=-1)
+        expiring.set('a', 1)
+        self.assertIsNone(expiring.get('a'))
+
+
+class EmissionServiceTests(SimpleTestCase):
+    def setUp(self):
+        coords = np.random.default_rng(1).uniform([-6.6, 106.4], [-5.9, 107.2], size=(6, 2))
+        self.pairs = [(f"{a[0]},{a[1]}", f"{b[0]},{b[1]}")
+                      for i, a in enumerate(coords) for j, b in enumerate(coords) if i != j]
+
+    def test_batch_and_pair_modes_agree(self):
+        batch_backend = LocalEmissionBackend()
+        batch = compute_emissions(self.pairs, backend=batch_backend, mode='batch', batch_size=8, cache=False)
+        pair = compute_emissions(self.pairs, backend=LocalEmissionBackend(), mode='pair', cache=False)
+        self.assertEqual(batch, pair)
+        self.assertEqual(batch_backend.runs_submitted, 4)
+        self.assertTrue(all(rate['CO2(g)'] > 0 for rate in batch))
+
+    def test_failed_batch_is_retried_per_pair(self):
+        backend = LocalEmissionBackend(fail_every=2)
+        rates = compute_emissions(self.pairs, backend=backend, mode='batch', batch_size=10, cache=False)
+        self.assertTrue(all(rate is not None for rate in rates[:10] + rates[20:]))
+        # The second batch run fails; its pairs get runs 4..13, of which the even ones fail again
+        self.assertEqual(backend.runs_submitted, 13)
+        self.assertEqual([rate is None for rate in rates[10:20]], [True, False] * 5)
+
+    def test_batch_mode_needs_a_batch_dag(self):
+        with mock.patch.object(airflow_client, 'BATCH_DAG_ID', None), \
+                mock.patch.object(airflow_client, 'trigger_inference', return_value=None) as trigger:
+            rates = compute_emissions(self.pairs[:3], backend=AirflowEmissionBackend(), mode='batch', cache=False)
+        self.assertEqual(rates, [None] * 3)
+        self.assertEqual(trigger.call_count, 3)
+
+    def test_cache_answers_repeat_and_reverse_pairs(self):
+        cache = EmissionCache(SqliteCache(':memory:', 'emission_pairs'), precision=8, symmetric=True)
+        backend = LocalEmissionBackend()
+        first = compute_emissions(self.pairs, backend=backend, mode='batch', cache=cache)
+        # A->B and B->A share an entry, so only half of the pairs needed a DAG request
+        self.assertEqual(cache.dag_pairs_saved, len(self.pairs) // 2)
+        self.assertEqual(len(cache.store), len(self.pairs) // 2)
+
+        again = compute_emissions(self.pairs, backend=backend, mode='batch', cache=cache)
+        self.assertEqual(again, first)
+        self.assertEqual(backend.runs_submitted, 1)
+
+    def test_failed_pairs_are_not_cached(self):
+        cache = EmissionCache(SqliteCache(':memory:', 'emission_pairs'), symmetric=False)
+        compute_emissions(self.pairs, backend=LocalEmissionBackend(fail_every=1), cache=cache)
+        self.assertEqual(len(cache.store), 0)
+
+    def test_geohash(self):
+        self.assertEqual(geohash(57.64911, 10.40744, precision=11), 'u4pruydqqvj')
+        self.assertEqual(geohash(-6.2, 106.8, precision=5), geohash(-6.2001, 106.8001, precision=5))
+
+
+class FailingDirectionsProvider:
+    name = 'google'
+
+    def fetch(self, origin, dest, departure_time):
+        raise ConnectionError("offline")
+
+
+class RouteServiceTests(SimpleTestCase):
+    def setUp(self):
+        coords = np.random.default_rng(2).uniform([-6.6, 106.4], [-5.9, 107.2], size=(5, 2))
+        self.route = [tuple(c) for c in coords]
+        self.pairs = list(zip(self.route, self.route[1:]))
+        self.departure = datetime(2024, 1, 1, 8, 10)
+
+    def test_legs_are_cached_per_time_bucket(self):
+        service = RouteService(OfflineDirectionsProvider(), cache=SqliteCache(':memory:', 'route_legs'))
+        first = service.legs(self.pairs, self.departure)
+        self.assertEqual(service.fetched, 4)
+        self.assertTrue(all(leg.source == 'offline' for leg in first))
+
+        again = service.legs(self.pairs, datetime(2024, 1, 2, 8, 50))
+        self.assertEqual(service.fetched, 4)
+        self.assertEqual([leg[:3] for leg in again], [leg[:3] for leg in first])
+        self.assertTrue(all(leg.source == 'cache' for leg in again))
+
+        service.legs(self.pairs, datetime(2024, 1, 2, 9, 0))
+        self.assertEqual(service.fetched, 8)
+
+    def test_leg_geometry(self):
+        leg = RouteService(OfflineDirectionsProvider()).leg(self.route[0], self.route[1], self.departure)
+        np.testing.assert_allclose(leg.coords(), [self.route[0], self.route[1]], atol=1e-5)
+        self.assertEqual(leg.as_directions()[0]['legs'][0]['distance']['value'], leg.distance)
+        self.assertIsInstance(leg, Leg)
+
+    def test_fallback_legs_are_not_cached(self):
+        cache = SqliteCache(':memory:', 'route_legs')
+        service = RouteService(FailingDirectionsProvider(), fallback=OfflineDirectionsProvider(), cache=cache)
+        legs = service.legs(self.pairs, self.departure)
+        self.assertTrue(all(leg.source == 'offline' for leg in legs))
+        self.assertEqual(service.fallbacks, 4)
+        self.assertEqual(len(cache), 0)
+
+
+class GreedyCapacityFillTests(SimpleTestCase):
+    def test_matches_sequential_first_fit(self):
+        rng = np.random.default_rng(3)
+        for _ in range(50):
+            demand = rng.uniform(0.0, 1.0, int(rng.integers(0, 60))) ** 3
+            current, max_capacity = float(rng.uniform(0, 1)), float(rng.uniform(1, 4))
+            expected_taken, load = [], current
+            for i, d in enumerate(demand.tolist()):
+                if d <= max_capacity - load:
+                    expected_taken.append(i)
+                    load += d
+            taken, final_load = greedy_capacity_fill(demand, current, max_capacity)
+            self.assertEqual(taken.tolist(), expected_taken)
+            self.assertEqual(final_load, load)
+
+
+class FleetRoutingTests(SimpleTestCase):
+    def test_capacity_dimension_splits_orders_between_trucks(self):
+        rng = np.random.default_rng(4)
+        n = 9
+        points = rng.uniform(0, 30, size=(n, 2))
+        demands = [0.0] + rng.uniform(0.4, 0.9, n - 1).tolist()
+        data = {
+            'time_matrix': np.rint(np.linalg.norm(points[:, None] - points[None], axis=2)).astype(int).tolist(),
+            'time_windows': [(480, 480)] + [(480, 1200)] * (n - 1),
+            'service_times': [0] + [5] * (n - 1),
+            'depot': 0,
+            'num_vehicles': 3,
+            'demands': demands,
+            'vehicle_capacities': [2.5, 2.5, 2.5],
+        }
+        result = google_or(data)
+        self.assertEqual(len(result['routes']), 3)
+        visited = [node for route in result['routes'] for node in route if node != 0]
+        self.assertEqual(sorted(visited + result['unreachable']), list(range(1, n)))
+        for route in result['routes']:
+            self.assertLessEqual(sum(demands[node] for node in route), 2.5)
+
+    def test_fractional_travel_times_enforce_time_windows(self):
+        # Travel times under a minute counted as zero before transit times were in
+        # seconds, so every window looked reachable. Stop 1 closes before anything
+        # can reach it.
+        data = {
+            'time_matrix': [[0, 1.5, 0.9], [1.5, 0, 0.7], [0.9, 0.7, 0]],
+            'time_windows': [(480, 480), (480, 481), (480, 600)],
+            'service_times': [0, 0, 0],
+            'depot': 0,
+            'num_vehicles': 1,
+        }
+        result = google_or(data)
+        self.assertEqual(result['unreachable'], [1])
+        self.assertEqual(result['routes'][0], [2, 0])
+
+    def test_search_budget(self):
+        parameters = search_parameters_from({'time_limit_seconds': 1.5, 'solution_limit': 3,
+                                             'first_solution_strategy': 'SAVINGS'})
+        self.assertEqual(parameters.time_limit.ToMilliseconds(), 1500)
+        self.assertEqual(parameters.solution_limit, 3)
+        self.assertEqual(parameters.first_solution_strategy, routing_enums_pb2.FirstSolutionStrategy.SAVINGS)
+        parameters = search_parameters_from({'guided_local_search': True})
+        self.assertEqual(parameters.local_search_metaheuristic,
+                         routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH)
+        self.assertGreater(parameters.time_limit.ToMilliseconds(), 0)
+        for search in ({'first_solution_strategy': 'FASTEST'}, {'time_limit_seconds': 0}, {'budget': 1}):
+            with self.assertRaises(ValueError):
+                search_parameters_from(search)
+
+
+class NearestNeighborTests(SimpleTestCase):
+    def test_routes_and_etas_match_corpus(self):
+        for case in json.loads(NN_CORPUS.read_text())['cases']:
+            df = pd.DataFrame(case['rows'])
+            for column in ('open_hour', 'close_hour'):
+                df[column] = df[column].apply(lambda s: clock(int(s[:2]), int(s[3:])))
+            route, unreachable, total_time, total_time_waiting, total_distance, info = nearest_neighbor_vrptw(
+                df, case['distance_matrix'], case['time_matrix'], case['initial_distance'], case['initial_duration'])
+            expected = case['expected']
+            with self.subTest(seed=case['seed'], locations=len(df)):
+                self.assertEqual(route, expected['route'])
+                self.assertEqual(unreachable, expected['unreachable'])
+                self.assertEqual(total_time, timedelta(microseconds=expected['total_time_us']))
+                self.assertEqual(total_time_waiting, timedelta(microseconds=expected['total_time_waiting_us']))
+                self.assertEqual(total_distance, expected['total_distance'])
+                self.assertEqual(info, expected['info'])
+
+    def test_microseconds_round_like_timedelta(self):
+        rng = np.random.default_rng(5)
+        seconds = np.concatenate([rng.uniform(0, 1e5, 2000), np.arange(1, 200) * 2.0 ** -21, (np.arange(1, 200) + 0.5) / 1e6])
+        expected = [timedelta(seconds=value) // timedelta(microseconds=1) for value in seconds.tolist()]
+        self.assertEqual(microseconds(seconds, 1_000_000).tolist(), expected)
+
+    def test_routes_fit_the_routing_model(self):
+        data = {
+            'time_matrix': [[0, 20, 35, 50], [20, 0, 15, 30], [35, 15, 0, 15], [50, 30, 15, 0]],
+            'time_windows': [(480, 480), (480, 520), (560, 600), (490, 530)],
+            'service_times': [0, 10, 10, 10],
+            'depot': 0,
+            'num_vehicles': 2,
+            'demands': [0, 1.0, 1.0, 1.5],
+            'vehicle_capacities': [2.0, 2.0],
+        }
+        # Stop 2 opens more than MAX_WAIT after any arrival from the depot or stop 1,
+        # and exceeds the second truck's capacity after stop 3
+        routes, unreachable = nearest_neighbor_routes(data)
+        self.assertEqual(routes, [[1, 0], [3, 0]])
+        self.assertEqual(unreachable, [2])
+        seeded = google_or({**data, 'search': {'nearest_neighbor_start': True}})
+        self.assertEqual(seeded['unreachable'], google_or(data)['unreachable'])
+
+    def test_fallback_when_search_finds_nothing(self):
+        data = {
+            'time_matrix': [[0, 5, 9], [5, 0, 4], [9, 4, 0]],
+            'time_windows': [(480, 480), (480, 600), (480, 600)],
+            'service_times': [0, 5, 5],
+            'depot': 0,
+            'num_vehicles': 1,
+        }
+        with mock.patch.object(pywrapcp.RoutingModel, 'SolveWithParameters', return_value=None):
+            result = google_or(data)
+        self.assertEqual(result['solver'], 'nearest_neighbor')
+        self.assertEqual(result['routes'], [[1, 2, 0]])
+        self.assertEqual(result['unreachable'], [])
+
+
+def time_model_accepts(data, route):
+    """Whether google_or's time model (one vehicle, no capacities) accepts ``route``."""
+    manager = pywrapcp.RoutingIndexManager(len(data['time_matrix']), 1, data['depot'])
+    routing = pywrapcp.RoutingModel(manager)
+    transit = routing.RegisterTransitMatrix(transit_seconds(data).tolist())
+    routing.AddDimension(transit, MAX_WAIT, HORIZON, False, 'Time')
+    time_dimension = routing.GetDimensionOrDie('Time')
+    for node, (start, end) in enumerate(data['time_windows']):
+        index = routing.Start(0) if node == data['depot'] else manager.NodeToIndex(node)
+        time_dimension.CumulVar(index).SetRange(int(start * TIME_SCALE), int(end * TIME_SCALE))
+        if node != data['depot']:
+            routing.AddDisjunction([index], 10000000)
+    routing.CloseModel()
+    return routing.ReadAssignmentFromRoutes([[manager.NodeToIndex(node) for node in route[:-1]]], True) is not None
+
+
+class RouteImprovementTests(SimpleTestCase):
+    def line_data(self, windows):
+        # Stops 10, 20 and 30 minutes east of the depot
+        positions = np.array([0, 10, 20, 30])
+        return {
+            'time_matrix': np.abs(positions[:, None] - positions[None]).tolist(),
+            'time_windows': [(480, 480)] + windows,
+            'service_times': [0, 5, 5, 5],
+            'depot': 0,
+            'num_vehicles': 1,
+            'distance_matrix': (np.abs(positions[:, None] - positions[None]) * 500.0).tolist(),
+        }
+
+    def test_crossing_route_is_uncrossed(self):
+        # Depot and stops on the corners of a 10 minute square, the route crosses its diagonals
+        corners = np.array([(0, 0), (0, 10), (10, 10), (10, 0)])
+        times = np.linalg.norm(corners[:, None] - corners[None], axis=2)
+        data = {
+            'time_matrix': times.tolist(),
+            'time_windows': [(480, 480)] + [(480, 1200)] * 3,
+            'service_times': [0, 5, 5, 5],
+            'depot': 0,
+            'num_vehicles': 1,
+            'distance_matrix': (times * 500).tolist(),
+        }
+        route, report = improve_route(data, [1, 3, 2, 0])
+        self.assertIn(route, ([1, 2, 3, 0], [3, 2, 1, 0]))
+        self.assertEqual(report['two_opt_moves'] + report['or_opt_moves'], 1)
+        self.assertAlmostEqual(report['time_before'], 63.3, places=1)
+        self.assertAlmostEqual(report['time_delta'], -8.3, places=1)
+        self.assertAlmostEqual(report['distance_before'], 24142.1, places=1)
+        self.assertAlmostEqual(report['distance_delta'], -4142.1, places=1)
+
+    def test_moves_keep_time_windows(self):
+        # Stop 3 closes before it can be reached through stops 1 and 2, and stop 1
+        # opens more than MAX_WAIT after an arrival straight from the depot
+        data = self.line_data([(515, 1200), (480, 1200), (480, 515)])
+        self.assertTrue(time_model_accepts(data, [3, 1, 2, 0]))
+        route, report = improve_route(data, [3, 1, 2, 0])
+        self.assertEqual(route, [3, 2, 1, 0])
+        self.assertTrue(time_model_accepts(data, route))
+        self.assertEqual((report['two_opt_moves'] + report['or_opt_moves'], report['distance_delta']), (1, -10000))
+
+    def test_improved_nearest_neighbor_routes_fit_the_model(self):
+        for seed in range(4):
+            rng = np.random.default_rng(seed)
+            n = 40
+            points = rng.uniform(0, 60, size=(n, 2))
+            opens = rng.integers(480, 700, n)
+            data = {
+                'time_matrix': (np.linalg.norm(points[:, None] - points[None], axis=2) * rng.uniform(0.9, 1.3, (n, n))).tolist(),
+                'time_windows': [(480, 480)] + [(int(o), int(o) + int(w)) for o, w in zip(opens[1:], rng.integers(60, 600, n - 1))],
+                'service_times': [0] + rng.choice([2.0, 5.0, 10.0], n - 1).tolist(),
+                'depot': 0,
+                'num_vehicles': 1,
+            }
+            route = nearest_neighbor_routes(data)[0][0]
+            improved, report = improve_route(data, route, time_limit=5)
+            cost = lambda route: transit_seconds(data)[[0] + route[:-1], route].sum()
+            with self.subTest(seed=seed):
+                self.assertEqual(sorted(improved), sorted(route))
+                self.assertTrue(time_model_accepts(data, improved))
+                self.assertEqual(cost(improved) - cost(route), report['cost_delta'])
+                self.assertLess(report['cost_delta'], 0)
+                self.assertIsNone(report['distance_before'])
+
+
+def three_truck_job(data, progress):
+    for truck in range(3):
+        progress("routing", trucks_done=truck, trucks_total=3)
+        data['release'].wait(5)
+    return [{"id_truck": np.int64(7), "total_time": np.float32(1.5)}]
+
+
+class PriorityJobTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.manager = JobManager(JobStore(':memory:'), three_truck_job, executor=ThreadPoolExecutor(1),
+                                  max_workers=1, max_pending=1)
+
+    def tearDown(self):
+        self.release.set()
+        self.manager.shutdown()
+
+    def wait(self, job_id):
+        future = self.manager._futures.get(job_id)
+        if future is not None:
+            future.result(5)
+        return self.manager.get(job_id)
+
+    def test_progress_and_result(self):
+        self.release.set()
+        job_id = self.manager.submit({'release': self.release})['job_id']
+        job = self.wait(job_id)
+        self.assertEqual(job['status'], SUCCEEDED)
+        self.assertEqual(job['progress'], {'stage': 'routing', 'trucks_done': 2, 'trucks_total': 3})
+        self.assertEqual(job['result'], [{"id_truck": 7, "total_time": 1.5}])
+        self.assertNotIn('result', self.manager.status(job_id))
+
+    def test_cancel_running_and_queued_jobs(self):
+        running = self.manager.submit({'release': self.release})['job_id']
+        while self.manager.get(running)['progress'] is None:
+            time.sleep(0.01)
+        queued = self.manager.submit({'release': self.release})['job_id']
+        with self.assertRaises(JobQueueFull):
+            self.manager.submit({'release': self.release})
+        self.assertEqual(self.manager.cancel(queued)['status'], CANCELLED)
+        self.assertTrue(self.manager.cancel(running)['cancel_requested'])
+        self.release.set()
+        job = self.wait(running)
+        self.assertEqual(job['status'], CANCELLED)
+        self.assertEqual(job['progress']['trucks_done'], 0)
+        self.assertIsNone(self.manager.get('unknown'))
+
+    def test_finished_jobs_are_evicted_beyond_max_entries(self):
+        store = JobStore(':memory:', max_entries=3)
+        for job_id in ('a', 'b', 'c'):
+            store.put({'job_id': job_id, 'status': SUCCEEDED})
+            time.sleep(0.001)
+        store.update('a', status=SUCCEEDED)
+        store.request_cancel('d')
+        self.assertEqual(len(store.cache), 3)
+        self.assertIsNone(store.get('b'))
+        self.assertIsNotNone(store.get('a'))
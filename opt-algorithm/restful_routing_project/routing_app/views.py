@@ -2,9 +2,15 @@ from datetime import datetime, time, timedelta
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from sklearn.preprocessing import MinMaxScaler
-from .nearest_neighbor import fetch_concatenate_route
-from .helper import get_distance_runner, get_directions, dbscan_cluster, handle_noise_with_kmeans, geodesic_distance
-from .google_or import google_or
+from .cache_store import env_number
+from .helper import get_distance_runner, dbscan_cluster, handle_noise_with_kmeans, geodesic_distance
+from .matrix_cache import get_matrix_cache
+from .emission_cache import get_emission_cache
+from .dbscan_tuning import get_parameter_store
+from .route_service import get_route_service
+from .google_or import google_or, search_parameters_from
+from .route_improvement import ROUTE_IMPROVEMENT_ENABLED, improve_route
+from .priority_jobs import FAILED, SUCCEEDED, JobQueueFull, get_job_manager
 import json
 from .models import Truck
 import pandas as pd
@@ -17,6 +23,12 @@ from .logger_utils import get_logger, log_step, log_api_request, log_api_respons
 # Initialize logger for this module
 logger = get_logger(__name__)
 
+# "per_truck": fill trucks greedily by priority and route each one separately
+# "fleet": route all trucks together in one OR-Tools model with capacities
+OPTIMIZATION_MODES = ("per_truck", "fleet")
+# The fleet model is much larger than a single truck's, its local search is capped
+FLEET_TIME_LIMIT_SECONDS = env_number('FLEET_TIME_LIMIT_SECONDS', 30.0, cast=float)
+
 def get_delivery_orders_dataframe(delivery_orders):
     df_delivery_orders = {
         'id': [],
@@ -140,6 +152,18 @@ def get_trucks_model_sorted(trucks):
 def testing(request, format=None):
     return Response("Your django app is running.....")
 
+@api_view(["GET"])
+def cache_stats(request, format=None):
+    matrix_cache = get_matrix_cache()
+    emission_cache = get_emission_cache()
+    dbscan_store = get_parameter_store()
+    return Response({
+        "matrix": matrix_cache.stats() if matrix_cache is not None else None,
+        "emission": emission_cache.stats() if emission_cache is not None else None,
+        "dbscan": dbscan_store.stats() if dbscan_store is not None else None,
+        "route": get_route_service().stats(),
+    })
+
 @api_view(["POST"])
 def priority_optimization(request, format=None):
     start_time = time_module.time()
@@ -148,7 +172,79 @@ def priority_optimization(request, format=None):
     log_api_request(logger, "POST", "/api/priority")
     
     data = json.loads(request.body.decode('utf-8'))
+    error = validate_priority_request(data)
+    if error:
+        return Response({"error": error}, 400)
+
+    shipment = optimize_priority(data)
+
+    # Log final response
+    duration = time_module.time() - start_time
+    response_summary = {
+        "shipments_count": len([s for s in shipment if s.get('id_truck') != -1]),
+        "unassigned_orders_count": sum(len(s['delivery_orders']) for s in shipment if s.get('id_truck') == -1),
+        "total_trucks_used": len([s for s in shipment if s.get('id_truck') != -1]),
+    }
+    log_api_response(logger, "/api/priority", 200, duration, response_summary)
     
+    return Response(shipment, 200)
+
+@api_view(["POST"])
+def submit_priority_job(request, format=None):
+    """Queue an /api/priority request, the response carries the job id to poll."""
+    log_api_request(logger, "POST", "/api/priority/jobs")
+    data = json.loads(request.body.decode('utf-8'))
+    error = validate_priority_request(data)
+    if error:
+        return Response({"error": error}, 400)
+    try:
+        job = get_job_manager().submit(data)
+    except JobQueueFull as e:
+        return Response({"error": str(e)}, 503)
+    return Response(job, 202)
+
+@api_view(["GET", "DELETE"])
+def priority_job(request, job_id, format=None):
+    """Job status and per-truck progress; DELETE cancels the job."""
+    manager = get_job_manager()
+    job = manager.cancel(job_id) if request.method == "DELETE" else manager.status(job_id)
+    if job is None:
+        return Response({"error": f"Unknown or expired job '{job_id}'"}, 404)
+    return Response(job, 200)
+
+@api_view(["GET"])
+def priority_job_result(request, job_id, format=None):
+    """The shipment of a finished job, in the same shape as the /api/priority response."""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return Response({"error": f"Unknown or expired job '{job_id}'"}, 404)
+    if job['status'] == SUCCEEDED:
+        return Response(job['result'], 200)
+    if job['status'] == FAILED:
+        return Response({"error": job['error']}, 500)
+    return Response({"error": f"Job is {job['status']}", "status": job['status']}, 409)
+
+def validate_priority_request(data):
+    """Error message for an invalid /api/priority request body, None when it is valid."""
+    mode = data.get("mode", "per_truck")
+    if mode not in OPTIMIZATION_MODES:
+        return f"Unknown mode '{mode}', expected one of {list(OPTIMIZATION_MODES)}"
+    # Optional OR-Tools search budget, see google_or.search_parameters_from
+    try:
+        search_parameters_from(data.get("search") or {})
+    except (ValueError, TypeError) as e:
+        return f"Invalid search options: {e}"
+    return None
+
+def optimize_priority(data, progress=None):
+    """
+    The /api/priority pipeline for a validated request body, returns the shipment list.
+
+    ``progress(stage, **details)`` is called between stages and after every truck,
+    async jobs use it to report progress and to stop a cancelled job.
+    """
+    progress = progress or (lambda stage, **details: None)
+
     # Log input summary
     input_summary = {
         "trucks_count": len(data.get('trucks', [])) if isinstance(data.get('trucks'), list) else 0,
@@ -156,6 +252,8 @@ def priority_optimization(request, format=None):
         "origin_locations_count": len(data.get('ori_location', [])) if isinstance(data.get('ori_location'), list) else 0,
         "delivery_orders_count": len(data.get('delivery_orders', [])) if isinstance(data.get('delivery_orders'), list) else 0,
         "priority_mode": data.get('priority'),
+        "optimization_mode": data.get('mode', 'per_truck'),
+        "search": data.get('search'),
     }
     log_step(logger, "Received optimization request", input_summary)
     
@@ -177,6 +275,8 @@ def priority_optimization(request, format=None):
     warehouse = [origin_latitude, origin_longitude]
     delivery_orders = data["delivery_orders"]
     priority = data["priority"]
+    mode = data.get("mode", "per_truck")
+    search = data.get("search") or {}
 
     log_step(logger, "Calculating demand for delivery orders")
     zero_demand_orders = []
@@ -208,6 +308,7 @@ def priority_optimization(request, format=None):
     if zero_demand_orders:
         logger.warning(f"[PROCESSING] Found {len(zero_demand_orders)} orders with ZERO demand: {zero_demand_orders}")
     
+    progress("preparing")
     log_step(logger, "Building truck models and sorting by capacity")
     trucks_model = get_trucks_model_sorted(trucks)
     logger.info(f"[DATA] Created {len(trucks_model)} truck models")
@@ -231,29 +332,32 @@ def priority_optimization(request, format=None):
 
     log_step(logger, "Merging dataframes and calculating distances")
     df = pd.merge(df_delivery_orders, df_do_dest_location, on='loc_dest_id', how='left')  
-    df['distance_from_origin'] = df.apply(lambda row: geodesic_distance((row['latitude'], row['longitude']), warehouse), axis=1)
-    df['relative_position'] = df['longitude'].apply(lambda x: relative_position(x, warehouse[1]))
-    df['truck_id'] = -1
-    min_max_scaler = MinMaxScaler()
-    df[['distance_from_origin', 'demand_scaled']] = min_max_scaler.fit_transform(df[['distance_from_origin', 'demand']])   
-
     log_step(logger, f"Calculating priority using mode: {priority}")
-    if(priority=="balance"):
-        df['priority'] = df.apply(calculate_balance_priority, axis=1)
-    elif(priority=="distance"):
-        df['priority'] = df.apply(calculate_distance_priority, axis=1)
-    elif(priority=="load"):
-        df['priority'] = df.apply(calculate_load_priority, axis=1)
-    elif(priority=="emission"):
-        df['priority'] = df.apply(calculate_emission_priority, axis=1)
+    df_sorted = prioritize_orders(df, warehouse, priority)
+    positive_count = int((df_sorted['priority'] >= 0).sum())
+    logger.info(f"[DATA] Sorted {len(df_sorted)} orders by priority ({positive_count} positive, {len(df_sorted) - positive_count} negative)")
 
-    df_positive = df[df['priority'] >= 0].sort_values(by='priority', ascending=False)
-    df_negative = df[df['priority'] < 0].sort_values(by='priority', ascending=True)
+    log_step(logger, "Starting truck assignment and route optimization")
+    progress("routing", trucks_done=0, trucks_total=len(trucks_model))
+    if mode == "fleet":
+        shipment, unassigned_orders = fleet_optimization(df_sorted, trucks_model, df_do_origin_location, priority, search, progress)
+    else:
+        shipment, unassigned_orders = per_truck_optimization(df_sorted, trucks_model, df_do_origin_location, priority, search, progress)
+    
+    unassigned_orders.extend([{'delivery_order_id': do_id} for do_id in df_sorted.loc[df_sorted['truck_id'] == -1, 'id'].tolist()])
+
+    if unassigned_orders:
+        logger.warning(f"[RESULT] {len(unassigned_orders)} orders could not be assigned to any truck")
+        shipment.append({
+            "id_truck": -1,
+            "delivery_orders": unassigned_orders
+    })
 
-    df_sorted = pd.concat([df_positive, df_negative])
-    logger.info(f"[DATA] Sorted {len(df_sorted)} orders by priority ({len(df_positive)} positive, {len(df_negative)} negative)")
+    return shipment
 
-    log_step(logger, "Starting truck assignment and route optimization")
+def per_truck_optimization(df_sorted, trucks_model, df_do_origin_location, priority, search=None, progress=None):
+    """Fill the trucks one at a time in priority order and route each truck on its own."""
+    progress = progress or (lambda stage, **details: None)
     shipment = []
     unassigned_orders = []
     truck_counter = 0
@@ -262,14 +366,8 @@ def priority_optimization(request, format=None):
         truck_counter += 1
         logger.info(f"[TRUCK {truck_counter}/{len(trucks_model)}] Processing truck_id={truck.get_id()}, capacity={truck.get_max_capacity()}")
         
-        if len(df_sorted[df_sorted['truck_id'] == -1]) > 0:
-            assigned_count = 0
-            for _, order_location in df_sorted[df_sorted['truck_id'] == -1].iterrows():
-                order_total_volume = float(order_location['demand'])
-                if order_total_volume <= truck.get_avaiable_capacity():
-                    df_sorted.loc[(df_sorted['id'] == order_location['id']), 'truck_id'] = truck.get_id()
-                    truck.add_new_order(order_total_volume)
-                    assigned_count += 1
+        if (df_sorted['truck_id'] == -1).any():
+            assigned_count = assign_orders_to_truck(df_sorted, truck)
             
             logger.info(f"[TRUCK {truck_counter}] Assigned {assigned_count} orders, current_capacity={truck.get_current_capacity()}/{truck.get_max_capacity()}")
                     
@@ -282,24 +380,9 @@ def priority_optimization(request, format=None):
                 filtered_origin_loc = pd.concat([pd.DataFrame(df_do_origin_location), filtered_loc]).drop_duplicates().reset_index(drop=True)
                 
                 log_step(logger, f"[TRUCK {truck_counter}] Calculating distance/time/emission matrices")
-                _, times, emissions = get_distance_runner(filtered_origin_loc, priority=priority)
-                
-                times = [[t / 60.0 for t in row] for row in times]
-                time_windows = list(zip(
-                    filtered_origin_loc['open_hour'].apply(lambda x: x.hour * 60 + x.minute),
-                    filtered_origin_loc['close_hour'].apply(lambda x: x.hour * 60 + x.minute)
-                ))
-                services_time = list(filtered_origin_loc['service_time'])
-                data = {}
-                time_windows[0] = (480,480)
-                services_time[0] = 0
-                data['time_matrix'] = times
-                data['emission_matrix'] = emissions
-                data['time_windows'] = time_windows
-                data['service_times'] = services_time
+                data = build_routing_data(filtered_origin_loc, priority)
                 data['num_vehicles'] = 1
-                data['depot'] = 0
-                data['objective_type'] = 'emission' if priority == 'emission' else 'time'
+                data['search'] = search
                 
                 log_step(logger, f"[TRUCK {truck_counter}] Running Google OR-Tools optimization")
                 result = google_or(data=data)
@@ -308,196 +391,342 @@ def priority_optimization(request, format=None):
                     logger.info(f"[TRUCK {truck_counter}] OR-Tools result: {len(result.get('reachable', []))} reachable, {len(result.get('unreachable', []))} unreachable")
                 else:
                     logger.warning(f"[TRUCK {truck_counter}] OR-Tools returned: {result}")
-                       
-                reachable_locations_index = result['reachable']                
-                actual_reachable_locations_index = []
-                actual_unreachable_locations_index = []
-
-                actual_reachable_locations_id = []
-                actual_unreachable_locations_id = []
-                
-                arbitrary_date = datetime.today().date()
-                prev_loc_index = 0
-                prev_eta = datetime.combine(arbitrary_date, time(hour=8, minute=0))
-
-                loc_dest_info = []
-                total_time = 0
-                total_time_with_waiting = 0
-                total_distance = 0
-                
-                log_step(logger, f"[TRUCK {truck_counter}] Validating routes and calculating ETAs")
-                logger.info(f"[TRUCK {truck_counter}] reachable_locations_index from OR-Tools: {reachable_locations_index}")
-                
-                for index , loc_index in enumerate(reachable_locations_index):
-                    loc = filtered_origin_loc.iloc[loc_index]
-                    prev_loc = filtered_origin_loc.iloc[prev_loc_index]
-                    loc_lon_lat = (loc['latitude'], loc['longitude'])
-                    prev_loc_lon_lat = (prev_loc['latitude'], prev_loc['longitude'])
-                    
-                    logger.debug(f"[TRUCK {truck_counter}] Processing loc_index={loc_index}, loc_dest_id={loc.get('loc_dest_id', 'N/A')}")
-                    
-                    prev_to_loc = get_directions(prev_loc_lon_lat, loc_lon_lat)
-                    if loc_index == 0:
-                        # Skip depot (origin), don't process it as a delivery location
-                        logger.debug(f"[TRUCK {truck_counter}] Skipping depot (loc_index=0)")
-                        continue
-                    
-                    estimated_travel_time = ((prev_to_loc[0]['legs'][0]['duration']['value']) / 60 ) + prev_loc['service_time'] 
-
-                    eta = (prev_eta + timedelta(minutes=estimated_travel_time)).time()
-                    if(eta <loc['close_hour']):
-                        estimated_travel_distance = prev_to_loc[0]['legs'][0]['distance']['value']
-                
-                        actual_reachable_locations_index.append(loc_index)
-                        actual_reachable_locations_id.append(loc['loc_dest_id'])
-                        loc_dest_info.append({
-                            "loc_dest_id" : loc['loc_dest_id'],
-                            "queue": index + 1,
-                            "eta": eta.strftime('%H:%M:%S'),
-                            "travel_time" :estimated_travel_time,
-                            "travel_distance" :estimated_travel_distance
-                        })
-                        logger.info(f"[TRUCK {truck_counter}] Added to loc_dest_info: loc_dest_id={loc['loc_dest_id']}, eta={eta.strftime('%H:%M:%S')}")
-                        
-                        if (eta < loc['open_hour']):
-                            open_hour_dt = datetime.combine(arbitrary_date, loc['open_hour'])
-                            eta_dt = datetime.combine(arbitrary_date, eta)
-                            waiting_duration = open_hour_dt - eta_dt
-                            waiting_duration_minutes = waiting_duration.total_seconds() / 60.0
-                            total_time_with_waiting += (waiting_duration_minutes + estimated_travel_time)
-                            logger.debug(f"[TRUCK {truck_counter}] Location {loc['loc_dest_id']}: arrived early, waiting {waiting_duration_minutes:.1f} min")
-
-                            eta_with_waiting = prev_eta + timedelta(minutes=(waiting_duration_minutes + estimated_travel_time))
-                            prev_eta = eta_with_waiting
-                        else:
-                            prev_eta = datetime.combine(arbitrary_date, eta)
-                            total_time_with_waiting += estimated_travel_time
-                        total_time += estimated_travel_time
-                        total_distance += estimated_travel_distance
-                        prev_loc_index = loc_index
-                    else:
-                        actual_unreachable_locations_index.append(loc_index)
-                        actual_unreachable_locations_id.append(loc['loc_dest_id'])
-                        logger.warning(f"[TRUCK {truck_counter}] Location {loc['loc_dest_id']} unreachable: ETA {eta} after close_hour {loc['close_hour']}")
-                
-                logger.info(f"[TRUCK {truck_counter}] loc_dest_info built with {len(loc_dest_info)} entries: {loc_dest_info}")
-                
-                actual_reachable_locations = filtered_origin_loc.iloc[actual_reachable_locations_index]    
-                actual_unreachable_locations = filtered_origin_loc.iloc[actual_unreachable_locations_index]
-                
-                # Remove unreachable orders from truck
-                for _ , unreachable_order in df_sorted[(df_sorted['loc_dest_id'].isin(actual_unreachable_locations_id)) & (df_sorted['truck_id'] == truck.get_id())].iterrows():
-                    order_total_volume = float(unreachable_order['demand'])
-                    truck.drop_order(order_total_volume)
-
-                df_sorted.loc[
-                    (df_sorted['loc_dest_id'].isin(actual_unreachable_locations_id)) & 
-                    (df_sorted['truck_id'] == truck.get_id()), 
-                    'truck_id'
-                ] = -1
-
-                log_step(logger, f"[TRUCK {truck_counter}] Fetching route coordinates")
-                list_of_location_routes = []
-                all_cords = []
-                prev_locaction = filtered_origin_loc.iloc[0]
-                for index, location in actual_reachable_locations.iterrows():
-                    list_of_location_routes.append({'location_id': location['loc_dest_id']})
-                    for cord in fetch_concatenate_route(location['latitude'], location['longitude'], prev_locaction['latitude'], prev_locaction['longitude']):
-                        all_cords.append(list(cord))
-                    prev_locaction = location
-        
 
+                improvement = None
+                if ROUTE_IMPROVEMENT_ENABLED and isinstance(result, dict):
+                    log_step(logger, f"[TRUCK {truck_counter}] Improving the route with 2-opt/Or-opt")
+                    result['reachable'], improvement = improve_route(data, result['routes'][0])
 
-                reachable_loc_dest_ids = set(actual_reachable_locations_id)
-                logger.info(f"[TRUCK {truck_counter}] reachable_loc_dest_ids: {reachable_loc_dest_ids}")
-                
-                valid_dos = df_sorted[
-                    (df_sorted['truck_id'] == truck.get_id()) &
-                    (df_sorted['loc_dest_id'].isin(reachable_loc_dest_ids))
-                ]
-                
-                logger.info(f"[TRUCK {truck_counter}] valid_dos count: {len(valid_dos)}, ids: {valid_dos['id'].tolist() if len(valid_dos) > 0 else []}")
-                
-                # Create a mapping of loc_dest_id to ETA from loc_dest_info
-                loc_dest_eta_map = {info['loc_dest_id']: info['eta'] for info in loc_dest_info}
-                logger.info(f"[TRUCK {truck_counter}] loc_dest_eta_map: {loc_dest_eta_map}")
-                
-                # Build delivery_orders with ETA included
-                delivery_orders_with_eta = []
-                for do_id, loc_dest_id in zip(valid_dos["id"].tolist(), valid_dos["loc_dest_id"].tolist()):
-                    eta_value = loc_dest_eta_map.get(loc_dest_id, None)
-                    delivery_orders_with_eta.append({
-                        "delivery_order_id": do_id,
-                        "eta": eta_value
-                    })
-                    logger.info(f"[TRUCK {truck_counter}] Added delivery_order: do_id={do_id}, loc_dest_id={loc_dest_id}, eta={eta_value}")
-                
-                logger.info(f"[TRUCK {truck_counter}] Final delivery_orders_with_eta count: {len(delivery_orders_with_eta)}")
-                
-                shipment_entry = {
-                        "id_truck": truck.get_id(),
-                        "delivery_orders": delivery_orders_with_eta,
-                        "location_routes": list_of_location_routes,  
-                        "all_coords": all_cords,
-                        "total_time": total_time,       
-                        "total_time_with_waiting": total_time_with_waiting,
-                        "total_dist": total_distance,
-                        "additional_info" : loc_dest_info,
-                        "current_capacity": truck.get_current_capacity(),
-                        "max_capacity": truck.get_max_capacity(),   
-                }
-                shipment.append(shipment_entry)
-                
-                logger.info(f"[TRUCK {truck_counter}] COMPLETED - {len(valid_dos)} orders, {len(list_of_location_routes)} locations, distance={total_distance}m, time={total_time:.1f}min")
+                shipment.append(finalize_truck_route(truck, truck_counter, filtered_origin_loc, result['reachable'], df_sorted,
+                                                     improvement))
             else:
                 logger.warning(f"[TRUCK {truck_counter}] SKIPPED - Truck has zero capacity despite {assigned_count} assigned orders. Orders likely have zero demand.")
                
     
+        progress("routing", trucks_done=truck_counter, trucks_total=len(trucks_model), truck_id=truck.get_id())
         all_trucks_full = all(truck.get_avaiable_capacity() == 0 for truck in trucks_model)
         if all_trucks_full: 
             logger.warning("All trucks are full. Remaining orders will be unassigned.")
             unassigned_orders.extend(
-                [{"delivery_order_id": row['id']} for _, row in df_sorted.iterrows()]
+                [{"delivery_order_id": do_id} for do_id in df_sorted['id'].tolist()]
             )
-            continue 
-    
-    unassigned_orders.extend([{'delivery_order_id': row['id']} for _, row in df_sorted[df_sorted['truck_id'] == -1].iterrows()])
+            continue
 
-    if unassigned_orders:
-        logger.warning(f"[RESULT] {len(unassigned_orders)} orders could not be assigned to any truck")
-        shipment.append({
-            "id_truck": -1,
-            "delivery_orders": unassigned_orders
-    })
+    return shipment, unassigned_orders
 
-    # Log final response
-    duration = time_module.time() - start_time
-    response_summary = {
-        "shipments_count": len([s for s in shipment if s.get('id_truck') != -1]),
-        "unassigned_orders_count": len(unassigned_orders),
-        "total_trucks_used": len([s for s in shipment if s.get('id_truck') != -1]),
+def fleet_optimization(df_sorted, trucks_model, df_do_origin_location, priority, search=None, progress=None):
+    """
+    Route all unassigned orders over the whole fleet in one OR-Tools model: every
+    truck is a vehicle with its available volume as capacity, so stops can move
+    between trucks. Each truck's route is then validated like in per-truck mode.
+    """
+    progress = progress or (lambda stage, **details: None)
+    shipment = []
+    trucks = [truck for truck in trucks_model if truck.get_avaiable_capacity() > 0]
+    orders = df_sorted[df_sorted['truck_id'] == -1]
+    if not trucks or orders.empty:
+        logger.warning(f"[FLEET] Nothing to route: {len(trucks)} trucks with capacity, {len(orders)} orders")
+        return shipment, []
+
+    # One node per order like in per-truck mode, the depot is node 0
+    nodes = pd.concat([pd.DataFrame(df_do_origin_location), orders]).drop_duplicates().reset_index(drop=True)
+    logger.info(f"[FLEET] Routing {len(nodes) - 1} orders over {len(trucks)} trucks")
+
+    log_step(logger, "[FLEET] Calculating distance/time/emission matrices")
+    data = build_routing_data(nodes, priority)
+    data['num_vehicles'] = len(trucks)
+    data['demands'] = [0.0] + nodes['demand'].iloc[1:].astype(float).tolist()
+    data['vehicle_capacities'] = [float(truck.get_avaiable_capacity()) for truck in trucks]
+    data['search'] = {'time_limit_seconds': FLEET_TIME_LIMIT_SECONDS, **(search or {})}
+
+    progress("solving", trucks_done=0, trucks_total=len(trucks))
+    log_step(logger, "[FLEET] Running Google OR-Tools optimization")
+    result = google_or(data=data)
+    if not isinstance(result, dict):
+        logger.warning(f"[FLEET] OR-Tools returned: {result}")
+        return shipment, []
+    logger.info(f"[FLEET] OR-Tools result: {len(result['reachable'])} reachable, {len(result['unreachable'])} unreachable")
+
+    for truck_counter, (truck, route) in enumerate(zip(trucks, result['routes']), start=1):
+        stops = [node for node in route if node != data['depot']]
+        if not stops:
+            logger.info(f"[TRUCK {truck_counter}] Not used by the fleet solution")
+            continue
+        improvement = None
+        if ROUTE_IMPROVEMENT_ENABLED:
+            route, improvement = improve_route(data, route)
+            stops = [node for node in route if node != data['depot']]
+        route_orders = nodes.iloc[stops]
+        for order_total_volume in route_orders['demand'].tolist():
+            truck.add_new_order(float(order_total_volume))
+        df_sorted.loc[df_sorted['id'].isin(route_orders['id']), 'truck_id'] = truck.get_id()
+        logger.info(f"[TRUCK {truck_counter}] Assigned {len(stops)} orders, current_capacity={truck.get_current_capacity()}/{truck.get_max_capacity()}")
+
+        truck_origin_loc = pd.concat([nodes.iloc[[0]], route_orders]).reset_index(drop=True)
+        route_index = list(range(1, len(stops) + 1)) + [0]
+        shipment.append(finalize_truck_route(truck, truck_counter, truck_origin_loc, route_index, df_sorted, improvement))
+        progress("routing", trucks_done=truck_counter, trucks_total=len(trucks), truck_id=truck.get_id())
+
+    return shipment, []
+
+def build_routing_data(filtered_origin_loc, priority):
+    """OR-Tools input for a depot + orders frame (depot in row 0): matrices in minutes, windows, service times."""
+    distances, times, emissions = get_distance_runner(filtered_origin_loc, priority=priority)
+
+    times = times / 60.0
+    time_windows = list(zip(
+        filtered_origin_loc['open_hour'].apply(lambda x: x.hour * 60 + x.minute),
+        filtered_origin_loc['close_hour'].apply(lambda x: x.hour * 60 + x.minute)
+    ))
+    services_time = list(filtered_origin_loc['service_time'])
+    data = {}
+    time_windows[0] = (480,480)
+    services_time[0] = 0
+    data['time_matrix'] = times
+    data['emission_matrix'] = emissions
+    # Only used to report distance changes of route_improvement
+    data['distance_matrix'] = distances
+    data['time_windows'] = time_windows
+    data['service_times'] = services_time
+    data['depot'] = 0
+    data['objective_type'] = 'emission' if priority == 'emission' else 'time'
+    return data
+
+def finalize_truck_route(truck, truck_counter, filtered_origin_loc, reachable_locations_index, df_sorted,
+                         improvement=None):
+    """
+    Validate the OR-Tools route of ``truck`` against real travel times, drop the stops
+    whose ETA misses the close hour and build the truck's shipment entry.
+    ``improvement`` is the route_improvement report of the route, if it ran.
+    """
+    actual_reachable_locations_index = []
+    actual_unreachable_locations_index = []
+
+    actual_reachable_locations_id = []
+    actual_unreachable_locations_id = []
+
+    arbitrary_date = datetime.today().date()
+    prev_loc_index = 0
+    prev_eta = datetime.combine(arbitrary_date, time(hour=8, minute=0))
+
+    loc_dest_info = []
+    total_time = 0
+    total_time_with_waiting = 0
+    total_distance = 0
+
+    log_step(logger, f"[TRUCK {truck_counter}] Validating routes and calculating ETAs")
+    logger.info(f"[TRUCK {truck_counter}] reachable_locations_index from OR-Tools: {reachable_locations_index}")
+
+    # Fetch every leg of the planned route at once; legs around a stop that
+    # turns out unreachable are fetched on demand below
+    route_coords = list(zip(filtered_origin_loc['latitude'], filtered_origin_loc['longitude']))
+    planned_stops = [0] + [loc_index for loc_index in reachable_locations_index if loc_index != 0]
+    planned_legs = list(zip(planned_stops, planned_stops[1:]))
+    departure_time = datetime.now()
+    route_service = get_route_service()
+    legs = dict(zip(planned_legs, route_service.legs(
+        [(route_coords[a], route_coords[b]) for a, b in planned_legs], departure_time)))
+    route_legs = []
+
+    for index , loc_index in enumerate(reachable_locations_index):
+        loc = filtered_origin_loc.iloc[loc_index]
+        prev_loc = filtered_origin_loc.iloc[prev_loc_index]
+        loc_lon_lat = (loc['latitude'], loc['longitude'])
+        prev_loc_lon_lat = (prev_loc['latitude'], prev_loc['longitude'])
+
+        logger.debug(f"[TRUCK {truck_counter}] Processing loc_index={loc_index}, loc_dest_id={loc.get('loc_dest_id', 'N/A')}")
+
+        if loc_index == 0:
+            # Skip depot (origin), don't process it as a delivery location
+            logger.debug(f"[TRUCK {truck_counter}] Skipping depot (loc_index=0)")
+            continue
+        prev_to_loc = legs.get((prev_loc_index, loc_index))
+        if prev_to_loc is None:
+            prev_to_loc = route_service.leg(prev_loc_lon_lat, loc_lon_lat, departure_time)
+
+        estimated_travel_time = (prev_to_loc.duration / 60 ) + prev_loc['service_time'] 
+
+        eta = (prev_eta + timedelta(minutes=estimated_travel_time)).time()
+        if(eta <loc['close_hour']):
+            estimated_travel_distance = prev_to_loc.distance
+            route_legs.append(prev_to_loc)
+
+            actual_reachable_locations_index.append(loc_index)
+            actual_reachable_locations_id.append(loc['loc_dest_id'])
+            loc_dest_info.append({
+                "loc_dest_id" : loc['loc_dest_id'],
+                "queue": index + 1,
+                "eta": eta.strftime('%H:%M:%S'),
+                "travel_time" :estimated_travel_time,
+                "travel_distance" :estimated_travel_distance
+            })
+            logger.info(f"[TRUCK {truck_counter}] Added to loc_dest_info: loc_dest_id={loc['loc_dest_id']}, eta={eta.strftime('%H:%M:%S')}")
+
+            if (eta < loc['open_hour']):
+                open_hour_dt = datetime.combine(arbitrary_date, loc['open_hour'])
+                eta_dt = datetime.combine(arbitrary_date, eta)
+                waiting_duration = open_hour_dt - eta_dt
+                waiting_duration_minutes = waiting_duration.total_seconds() / 60.0
+                total_time_with_waiting += (waiting_duration_minutes + estimated_travel_time)
+                logger.debug(f"[TRUCK {truck_counter}] Location {loc['loc_dest_id']}: arrived early, waiting {waiting_duration_minutes:.1f} min")
+
+                eta_with_waiting = prev_eta + timedelta(minutes=(waiting_duration_minutes + estimated_travel_time))
+                prev_eta = eta_with_waiting
+            else:
+                prev_eta = datetime.combine(arbitrary_date, eta)
+                total_time_with_waiting += estimated_travel_time
+            total_time += estimated_travel_time
+            total_distance += estimated_travel_distance
+            prev_loc_index = loc_index
+        else:
+            actual_unreachable_locations_index.append(loc_index)
+            actual_unreachable_locations_id.append(loc['loc_dest_id'])
+            logger.warning(f"[TRUCK {truck_counter}] Location {loc['loc_dest_id']} unreachable: ETA {eta} after close_hour {loc['close_hour']}")
+
+    logger.info(f"[TRUCK {truck_counter}] loc_dest_info built with {len(loc_dest_info)} entries: {loc_dest_info}")
+
+    actual_reachable_locations = filtered_origin_loc.iloc[actual_reachable_locations_index]    
+    actual_unreachable_locations = filtered_origin_loc.iloc[actual_unreachable_locations_index]
+
+    # Remove unreachable orders from truck
+    unreachable_orders = (df_sorted['loc_dest_id'].isin(actual_unreachable_locations_id)) & (df_sorted['truck_id'] == truck.get_id())
+    for order_total_volume in df_sorted.loc[unreachable_orders, 'demand'].tolist():
+        truck.drop_order(float(order_total_volume))
+
+    df_sorted.loc[unreachable_orders, 'truck_id'] = -1
+
+    log_step(logger, f"[TRUCK {truck_counter}] Fetching route coordinates")
+    list_of_location_routes = []
+    all_cords = []
+    # The legs accepted above run depot -> first stop -> ... in route order
+    for (index, location), leg in zip(actual_reachable_locations.iterrows(), route_legs):
+        list_of_location_routes.append({'location_id': location['loc_dest_id']})
+        for cord in leg.coords():
+            all_cords.append(list(cord))
+
+
+
+    reachable_loc_dest_ids = set(actual_reachable_locations_id)
+    logger.info(f"[TRUCK {truck_counter}] reachable_loc_dest_ids: {reachable_loc_dest_ids}")
+
+    valid_dos = df_sorted[
+        (df_sorted['truck_id'] == truck.get_id()) &
+        (df_sorted['loc_dest_id'].isin(reachable_loc_dest_ids))
+    ]
+
+    logger.info(f"[TRUCK {truck_counter}] valid_dos count: {len(valid_dos)}, ids: {valid_dos['id'].tolist() if len(valid_dos) > 0 else []}")
+
+    # Create a mapping of loc_dest_id to ETA from loc_dest_info
+    loc_dest_eta_map = {info['loc_dest_id']: info['eta'] for info in loc_dest_info}
+    logger.info(f"[TRUCK {truck_counter}] loc_dest_eta_map: {loc_dest_eta_map}")
+
+    # Build delivery_orders with ETA included
+    delivery_orders_with_eta = []
+    for do_id, loc_dest_id in zip(valid_dos["id"].tolist(), valid_dos["loc_dest_id"].tolist()):
+        eta_value = loc_dest_eta_map.get(loc_dest_id, None)
+        delivery_orders_with_eta.append({
+            "delivery_order_id": do_id,
+            "eta": eta_value
+        })
+        logger.info(f"[TRUCK {truck_counter}] Added delivery_order: do_id={do_id}, loc_dest_id={loc_dest_id}, eta={eta_value}")
+
+    logger.info(f"[TRUCK {truck_counter}] Final delivery_orders_with_eta count: {len(delivery_orders_with_eta)}")
+
+    shipment_entry = {
+            "id_truck": truck.get_id(),
+            "delivery_orders": delivery_orders_with_eta,
+            "location_routes": list_of_location_routes,  
+            "all_coords": all_cords,
+            "total_time": total_time,       
+            "total_time_with_waiting": total_time_with_waiting,
+            "total_dist": total_distance,
+            "additional_info" : loc_dest_info,
+            "current_capacity": truck.get_current_capacity(),
+            "max_capacity": truck.get_max_capacity(),   
     }
-    log_api_response(logger, "/api/priority", 200, duration, response_summary)
-    
-    return Response(shipment, 200)
-
-def relative_position(longitude, reference_longitude):
-    return '+' if longitude > reference_longitude else '-'
-
-def calculate_balance_priority(row):
-    priority_value = 0.5 * row['demand_scaled'] + 0.5 * row['distance_from_origin']
-    return priority_value if row['relative_position'] == '+' else -priority_value
+    if improvement is not None:
+        shipment_entry["route_improvement"] = improvement
+
+    logger.info(f"[TRUCK {truck_counter}] COMPLETED - {len(valid_dos)} orders, {len(list_of_location_routes)} locations, distance={total_distance}m, time={total_time:.1f}min")
+    return shipment_entry
+
+
+# (demand, distance) weights of each priority mode
+PRIORITY_WEIGHTS = {
+    "balance": (0.5, 0.5),
+    "distance": (0.1, 0.9),
+    "load": (0.9, 0.1),
+}
+
+def prioritize_orders(df, warehouse, priority):
+    """
+    Score the orders for ``priority`` and sort them: orders east of the warehouse
+    (positive priority) first from highest, then the western ones from lowest.
+    """
+    coords = df[['latitude', 'longitude']].to_numpy()
+    # Orders share destinations, so the geodesic is computed once per location
+    unique_coords, inverse = np.unique(coords, axis=0, return_inverse=True)
+    distances = np.array([geodesic_distance((lat, lon), warehouse) for lat, lon in unique_coords.tolist()])
+    df['distance_from_origin'] = distances[inverse.reshape(-1)]
+    df['relative_position'] = np.where(df['longitude'].to_numpy() > warehouse[1], '+', '-')
+    df['truck_id'] = -1
+    min_max_scaler = MinMaxScaler()
+    df[['distance_from_origin', 'demand_scaled']] = min_max_scaler.fit_transform(df[['distance_from_origin', 'demand']])   
 
-def calculate_distance_priority(row):
-    priority_value = 0.1 * row['demand_scaled'] + 0.9 * row['distance_from_origin']
-    return priority_value if row['relative_position'] == '+' else -priority_value
+    if priority == "emission":
+        # Prioritize closer locations (lower distance) to minimize emissions
+        # We invert distance_from_origin because we want smaller distances to have higher priority
+        priority_value = 1.0 * (1.0 - df['distance_from_origin'].to_numpy())
+    else:
+        demand_weight, distance_weight = PRIORITY_WEIGHTS[priority]
+        priority_value = demand_weight * df['demand_scaled'].to_numpy() + distance_weight * df['distance_from_origin'].to_numpy()
+    df['priority'] = np.where(df['relative_position'].to_numpy() == '+', priority_value, -priority_value)
 
-def calculate_load_priority(row):
-    priority_value = 0.9 * row['demand_scaled'] + 0.1 * row['distance_from_origin']
-    return priority_value if row['relative_position'] == '+' else -priority_value
+    df_positive = df[df['priority'] >= 0].sort_values(by='priority', ascending=False)
+    df_negative = df[df['priority'] < 0].sort_values(by='priority', ascending=True)
 
-def calculate_emission_priority(row):
-    # Prioritize closer locations (lower distance) to minimize emissions
-    # We invert distance_from_origin because we want smaller distances to have higher priority
-    priority_value = 1.0 * (1.0 - row['distance_from_origin']) 
-    return priority_value if row['relative_position'] == '+' else -priority_value
+    return pd.concat([df_positive, df_negative])
+
+def greedy_capacity_fill(demand, current, max_capacity):
+    """
+    First-fit pass over ``demand`` in order: an order is taken when it fits in the
+    capacity left, and later orders are still tried after one does not fit.
+
+    Runs of consecutive orders that fit are found with one cumulative sum instead of
+    a Python step per order. The load is accumulated left to right, so it is
+    bit-for-bit the same as repeated ``current += d``.
+    Returns (taken positions, final load).
+    """
+    taken = []
+    start = 0
+    n = len(demand)
+    while start < n:
+        loads = np.cumsum(np.concatenate(([current], demand[start:])))
+        misfits = np.flatnonzero(demand[start:] > max_capacity - loads[:-1])
+        stop = start + misfits[0] if len(misfits) else n
+        taken.append(np.arange(start, stop))
+        current = float(loads[stop - start])
+        if stop == n:
+            break
+        # Skip ahead to the next order that fits in what is left
+        fitting = np.flatnonzero(demand[stop + 1:] <= max_capacity - current)
+        if not len(fitting):
+            break
+        start = stop + 1 + fitting[0]
+    return (np.concatenate(taken) if taken else np.empty(0, dtype=int)), current
+
+def assign_orders_to_truck(df_sorted, truck):
+    """Assign unassigned orders to ``truck`` in priority order while they fit, returns the count."""
+    truck_ids = df_sorted['truck_id'].to_numpy().copy()
+    order_ids = df_sorted['id'].to_numpy()
+    demand = df_sorted['demand'].to_numpy(dtype=np.float64)
+
+    unassigned = np.flatnonzero(truck_ids == -1)
+    taken, _ = greedy_capacity_fill(demand[unassigned], truck.get_current_capacity(), truck.get_max_capacity())
+    taken = unassigned[taken]
+    for order_total_volume in demand[taken].tolist():
+        truck.add_new_order(order_total_volume)
+    # Orders are assigned by id, every row of a taken order moves to this truck
+    truck_ids[np.isin(order_ids, order_ids[taken])] = truck.get_id()
+    df_sorted['truck_id'] = truck_ids
+    return len(taken)